@@ -1,3 +1,3 @@
-from .main import Neuron
+from .main import Neuron, Engine, Context
 
 __version__ = '2.3.1'
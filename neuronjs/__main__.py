@@ -0,0 +1,41 @@
+# Command line tools
+#
+# Usage:
+#   python -m neuronjs precompile --tree dependency.json --pages pages.json \
+#     --output manifest.json --resolve myapp.assets:resolve
+#   python -m neuronjs hash --directory build/mod --tree dependency.json \
+#     --output hashes.json
+
+
+import sys
+import argparse
+
+from . import assets
+from . import precompile
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m neuronjs')
+    commands = parser.add_subparsers(dest='command')
+
+    precompile.add_arguments(commands.add_parser(
+        'precompile',
+        help='prerenders the outputs of pages into a manifest'))
+
+    assets.add_arguments(commands.add_parser(
+        'hash',
+        help='hashes the built module files into a manifest'))
+
+    args = parser.parse_args(argv)
+    if args.command == 'precompile':
+        return precompile.main(args)
+
+    if args.command == 'hash':
+        return assets.main(args)
+
+    parser.print_help()
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+# asyncio support, python 3.5+
+
+
+import asyncio
+
+from . import tools
+from .main import Neuron, _check_resolver
+
+
+async def _default_resolver(pathname):
+    return Neuron._default_resolver(pathname)
+
+
+class AsyncNeuron(Neuron):
+    '''
+    Neuron with a coroutine function `resolve`, and optionally a coroutine
+    function `resolve_many`.
+
+    `src()`, `output_scripts()` and `output_css()` are coroutines, which
+    resolve all ids concurrently. Resolved urls are cached by the tree,
+    so that following requests never wait for the resolver.
+
+    The generator outputs, such as `iter_scripts()`, could be used after
+    `await neuron.prepare()`.
+    '''
+
+    def __init__(self, resolve=None, **options):
+        _check_resolver(
+            resolve, options.get('resolve_many'), options.get('planner'))
+        if not resolve:
+            resolve = _default_resolver
+
+        Neuron.__init__(self, resolve=resolve, **options)
+
+    # Urls could not be resolved synchronously
+    def _resolve_ids(self, ids):
+        missing = self._get_missing(ids)
+        if missing:
+            raise RuntimeError(
+                '"%s" is not resolved, `await neuron.prepare()` first'
+                % list(missing.values())[0])
+
+    async def _resolve_all(self, ids):
+        missing = self._get_missing(ids)
+        if not missing:
+            return
+
+        keys = list(missing)
+        ids = [missing[key] for key in keys]
+        if self.instrument is not None:
+            start = tools.timer()
+
+        if self.resolve_many is not None:
+            urls = await self.resolve_many(ids)
+        else:
+            urls = await asyncio.gather(*[
+                self.resolve(id)
+                for id in ids
+            ])
+
+        self._set_resolved(keys, urls)
+
+        if self.instrument is not None:
+            self._report('resolve', {'time': tools.timer() - start}, keys)
+
+    # Resolves all ids which will be output by the next `iter_scripts()`
+    # and `iter_css()`
+    async def prepare(self):
+        await self._resolve_all(self._pending_ids())
+        return ''
+
+    async def src(self, module_id):
+        id = self._src_id(module_id)
+        await self._resolve_all([id])
+        return self._resolve(id)
+
+    async def output_scripts(self):
+        await self.prepare()
+        return Neuron.output_scripts(self)
+
+    async def output_css(self):
+        await self.prepare()
+        return Neuron.output_css(self)
@@ -0,0 +1,98 @@
+# ASGI middleware, see `neuronjs.middleware`
+#
+# Requires python 3.5+
+
+
+from .main import Context
+from .middleware import Injector, CONTEXT_KEY, parse_content_type
+
+
+class ASGIMiddleware(object):
+    '''
+    ASGI middleware, which creates a context of `engine` for each http
+    request as `scope['neuronjs.context']`, and replaces the placeholders in
+    the bodies of html responses, see `neuronjs.middleware`:
+
+        app = ASGIMiddleware(app, engine)
+
+    If `resolve` is a coroutine function, pass
+    `create_context=lambda engine: AsyncNeuron(engine=engine)`, and then
+    the urls are resolved by `await n.prepare()` before the placeholders
+    are replaced.
+    '''
+
+    def __init__(self, app, engine, create_context=Context):
+        self.app = app
+        self.engine = engine
+        self.create_context = create_context
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        n = self.create_context(self.engine)
+        scope = dict(scope)
+        scope[CONTEXT_KEY] = n
+
+        # list.<Injector>, empty if the response is not html
+        injectors = []
+
+        async def _send(message):
+            if message['type'] == 'http.response.start':
+                message = self._start(n, message, injectors)
+
+            elif message['type'] == 'http.response.body' and injectors:
+                message = await self._body(n, message, injectors[0])
+                if message is None:
+                    return
+
+            await send(message)
+
+        await self.app(scope, receive, _send)
+
+    def _start(self, n, message, injectors):
+        headers = message.get('headers', [])
+
+        is_html = False
+        for key, value in headers:
+            if key.lower() == b'content-type':
+                is_html, encoding = parse_content_type(value.decode('latin-1'))
+
+        if not is_html:
+            return message
+
+        injectors.append(Injector(n, encoding))
+        message = dict(message)
+        message['headers'] = [
+            (key, value)
+            for key, value in headers
+            if key.lower() != b'content-length'
+        ]
+        return message
+
+    # Returns the message to send, or `None` if nothing to send
+    async def _body(self, n, message, injector):
+        more_body = message.get('more_body', False)
+        body = message.get('body', b'')
+
+        # the urls of the outputs should be resolved before replaced
+        if not more_body or injector.will_render(body):
+            await self._prepare(n)
+        chunks = injector.feed(body)
+
+        if not more_body:
+            chunks.extend(injector.close())
+
+        elif not chunks:
+            return
+
+        message = dict(message)
+        message['body'] = b''.join(chunks)
+        return message
+
+    @staticmethod
+    async def _prepare(n):
+        prepare = getattr(n, 'prepare', None)
+        if prepare is not None:
+            await prepare()
@@ -0,0 +1,237 @@
+# Content hashes of the built module files, for long-term caching
+#
+# The hash manifest:
+# {
+#   "manifest_version": 1,
+#   "algorithm": "sha1",
+#   "files": {
+#     "<path relative to the directory>": {
+#       "hash": "<hex digest>",
+#       "mtime": <mtime>,
+#       "size": <size>
+#     }
+#   }
+# }
+
+
+import io
+import os
+import hashlib
+import multiprocessing
+
+from .files import MANIFEST_VERSION, read_json, write_json, load_manifest
+from .tree import compile_tree
+
+
+# Files are hashed in parallel only if there are more of them
+PARALLEL_THRESHOLD = 64
+
+CHUNK_SIZE = 1 << 16
+
+
+# The path of a module id relative to the directory of built files:
+# 'a@1.0.0/a.js' -> 'a/1.0.0/a.js', 'neuron.js' -> 'neuron.js'
+def module_path(id):
+    return id.replace('@', '/', 1)
+
+
+def _hash_file(args):
+    filename, algorithm = args
+    m = hashlib.new(algorithm)
+    with io.open(filename, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            m.update(chunk)
+    return m.hexdigest()
+
+
+def _list_files(directory, dependency_tree=None):
+    if dependency_tree is None:
+        roots = [directory]
+    else:
+        compiled = compile_tree(dependency_tree)
+        roots = [
+            os.path.join(directory, name, version)
+            for name in sorted(compiled.packages)
+            for version in sorted(compiled.packages[name])
+        ]
+
+        # files in the root directory, such as neuron.js
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            if os.path.isfile(path):
+                yield path
+
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                yield os.path.join(dirpath, filename)
+
+
+# Hashes the files in `directory` and returns the hash manifest.
+# @param {dict=} dependency_tree if specified, only hashes the files of the
+#   packages of the tree, in `<directory>/<name>/<version>/`, and the files
+#   in `directory` itself
+# @param {dict=} previous the previous manifest, whose hashes are reused
+#   for the files of which the mtime and size are not changed
+# @param {int=} processes the number of processes to hash files,
+#   `None` for the number of cpus
+def build_manifest(directory, dependency_tree=None, previous=None,
+                   processes=None, algorithm='sha1'):
+    reusable = {}
+    if previous and previous.get('algorithm') == algorithm:
+        reusable = previous.get('files', {})
+
+    files = {}
+    # list.<(relative path, filename)>
+    to_hash = []
+
+    for filename in _list_files(directory, dependency_tree):
+        path = os.path.relpath(filename, directory).replace(os.sep, '/')
+        stat = os.stat(filename)
+        entry = {
+            'mtime': stat.st_mtime,
+            'size': stat.st_size
+        }
+
+        cached = reusable.get(path)
+        if cached and cached.get('mtime') == entry['mtime'] \
+                and cached.get('size') == entry['size']:
+            entry['hash'] = cached['hash']
+        else:
+            to_hash.append((path, filename))
+        files[path] = entry
+
+    args = [(filename, algorithm) for path, filename in to_hash]
+    if len(args) >= PARALLEL_THRESHOLD and processes != 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            hashes = pool.map(_hash_file, args, chunksize=16)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        hashes = [_hash_file(arg) for arg in args]
+
+    for (path, filename), hash_ in zip(to_hash, hashes):
+        files[path]['hash'] = hash_
+
+    return {
+        'manifest_version': MANIFEST_VERSION,
+        'algorithm': algorithm,
+        'files': files
+    }
+
+
+class HashResolver(object):
+    '''
+    A `resolve` function for `Neuron`, which resolves module ids and combos
+    to content-addressed urls by the hash manifest, so that the urls change
+    only if the contents of the files change.
+
+    - `template` formats the url of a module with `base`, `path` and `hash`
+    - `combo_template` formats the url of a combo with `base`, `paths`,
+      which are joined by commas, and `hash`, which is the hash of the
+      hashes of the files
+    - `fallback(id)` resolves the ids of which the files are not in the
+      manifest. By default, the url has no hash.
+    '''
+
+    def __init__(self, manifest,
+                 base='/',
+                 template='%(base)s%(path)s?v=%(hash)s',
+                 combo_template='%(base)s??%(paths)s?v=%(hash)s',
+                 length=12,
+                 fallback=None):
+        self.files = manifest['files']
+        self.base = base
+        self.template = template
+        self.combo_template = combo_template
+        self.length = length
+        self.fallback = fallback
+
+    def __call__(self, id):
+        if type(id) is list:
+            return self.resolve_combo(id)
+        return self.resolve_module(id)
+
+    def _get_hash(self, path):
+        entry = self.files.get(path)
+        return entry['hash'] if entry else None
+
+    def resolve_module(self, id):
+        path = module_path(id)
+        hash_ = self._get_hash(path)
+        if hash_ is None:
+            return self._fallback(id, path)
+
+        return self.template % {
+            'base': self.base,
+            'path': path,
+            'hash': hash_[:self.length]
+        }
+
+    def resolve_combo(self, ids):
+        paths = [module_path(id) for id in ids]
+        hashes = [self._get_hash(path) for path in paths]
+        if None in hashes:
+            return self._fallback(ids, ','.join(paths))
+
+        m = hashlib.sha1()
+        m.update(','.join(hashes).encode('utf-8'))
+        return self.combo_template % {
+            'base': self.base,
+            'paths': ','.join(paths),
+            'hash': m.hexdigest()[:self.length]
+        }
+
+    def _fallback(self, id, path):
+        if self.fallback is not None:
+            return self.fallback(id)
+
+        if type(id) is list:
+            return self.base + '??' + path
+        return self.base + path
+
+
+def main(args):
+    tree = None
+    if args.tree:
+        tree = read_json(args.tree)
+
+    # The previous output makes the build incremental
+    previous = None
+    if os.path.isfile(args.output):
+        try:
+            previous = load_manifest(args.output)
+        except ValueError:
+            pass
+
+    manifest = build_manifest(
+        args.directory, tree, previous, args.processes, args.algorithm)
+
+    # The manifest might be saved in the directory
+    output = os.path.relpath(args.output, args.directory).replace(os.sep, '/')
+    manifest['files'].pop(output, None)
+
+    write_json(manifest, args.output)
+    return 0
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        '--directory', required=True,
+        help='the directory of the built module files')
+    parser.add_argument(
+        '--tree', help='only hashes the packages of the dependency tree')
+    parser.add_argument(
+        '--output', required=True,
+        help='the manifest file to write, which is also read to skip '
+             'the files not changed')
+    parser.add_argument(
+        '--processes', type=int, default=None,
+        help='the number of processes, the number of cpus by default')
+    parser.add_argument('--algorithm', default='sha1')
@@ -0,0 +1,301 @@
+# Benchmarks with synthetic dependency trees
+#
+# Usage:
+#   python -m neuronjs.bench --packages 10000 --save baseline.json
+#   python -m neuronjs.bench --packages 10000 --compare baseline.json
+
+
+from __future__ import print_function
+
+import sys
+import json
+import random
+import argparse
+
+from . import module
+from .tools import timer
+from .main import Neuron
+from .walker import Walker
+from .tree import CompiledTree
+
+try:
+    import tracemalloc
+except ImportError:
+    # python 2
+    tracemalloc = None
+
+# Generates a dependency tree, in which each package only depends on
+# the packages of the deeper levels, so the tree has no cycles.
+# @param {int} packages the number of packages
+# @param {int} fanout the number of dependencies of each package version
+# @param {int} depth the number of levels
+# @param {int} versions the number of versions of each package
+def generate_tree(packages=1000, fanout=4, depth=8, versions=2, seed=0):
+    rand = random.Random(seed)
+
+    # level -> list.<name>
+    levels = [[] for i in range(depth)]
+    for i in range(packages):
+        levels[i * depth // packages].append('pkg-%d' % i)
+
+    tree = {
+        '_version': 'bench-%d-%d-%d-%d-%d' % (
+            packages, fanout, depth, versions, seed)
+    }
+
+    for level in range(depth):
+        # packages of the deeper levels
+        deeper = [name for names in levels[level + 1:] for name in names]
+
+        for name in levels[level]:
+            tree[name] = {}
+            for minor in range(versions):
+                dependencies = {}
+                for dep in rand.sample(deeper, min(fanout, len(deeper))):
+                    dep_minor = rand.randrange(versions)
+                    range_ = '^1.%d.0' % dep_minor
+                    dependencies[module.package_id(dep, range_)] = \
+                        '1.%d.0' % (versions - 1)
+
+                tree[name]['1.%d.0' % minor] = {
+                    'dependencies': dependencies
+                }
+
+    return tree
+
+
+# Returns the facades of a page, which are packages of the first level
+def generate_facades(tree, count=5, seed=0):
+    rand = random.Random(seed)
+
+    # packages of the first levels have the smallest indexes
+    names = sorted(
+        (name for name in tree if name != '_version'),
+        key=lambda name: int(name.split('-')[1])
+    )[:count * 4]
+    return rand.sample(names, min(count, len(names)))
+
+
+def _percentile(sorted_values, percent):
+    index = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+# Times `fn` for `iterations` times, `setup` is called before each call
+# and is not timed, whose return value is passed to `fn`
+def measure(fn, setup=None, iterations=100):
+    timings = []
+    for i in range(iterations):
+        arg = setup() if setup else None
+        start = timer()
+        fn(arg)
+        timings.append(timer() - start)
+
+    peak = None
+    if tracemalloc is not None:
+        arg = setup() if setup else None
+        tracemalloc.start()
+        try:
+            fn(arg)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    timings.sort()
+    total = sum(timings)
+
+    # time in milliseconds
+    return {
+        'iterations': iterations,
+        'ops': iterations / total if total else None,
+        'mean': total / iterations * 1000,
+        'p50': _percentile(timings, 50) * 1000,
+        'p90': _percentile(timings, 90) * 1000,
+        'p99': _percentile(timings, 99) * 1000,
+        'max': timings[-1] * 1000,
+        'peak_memory': peak
+    }
+
+
+def _resolve(id):
+    if type(id) is list:
+        return '/concat/' + ','.join(id)
+    return '/mod/' + id
+
+
+# Runs all benchmarks, and returns the results
+def run(packages=1000, fanout=4, depth=8, versions=2, facades=5,
+        iterations=100, seed=0):
+    tree = generate_tree(packages, fanout, depth, versions, seed)
+    facade_ids = generate_facades(tree, facades, seed)
+    compiled = CompiledTree(tree)
+
+    def create(**options):
+        options.setdefault('analysis_cache', False)
+        options.setdefault('url_cache', False)
+        nr = Neuron(dependency_tree=compiled, resolve=_resolve, **options)
+        for id in facade_ids:
+            nr.facade(id)
+        nr.css(facade_ids[0] + '/index.css')
+        return nr
+
+    def analyzed():
+        nr = create()
+        nr.analyze()
+        return nr
+
+    walker = Walker(compiled)
+    results = {
+        'compile': measure(
+            lambda arg: CompiledTree(tree),
+            iterations=max(iterations // 10, 1)),
+        'walker.look_up': measure(
+            lambda arg: walker.look_up(facade_ids),
+            iterations=iterations),
+        'neuron.analyze': measure(
+            lambda nr: nr.analyze(), create, iterations),
+        'neuron.analyze:cached': measure(
+            lambda nr: nr.analyze(),
+            lambda: create(analysis_cache=True), iterations),
+        'neuron.src': measure(
+            lambda nr: nr.src(facade_ids[0] + '/index.js'),
+            create, iterations)
+    }
+
+    for method in (
+        'output_scripts', 'output_config', 'output_facades', 'output_css'
+    ):
+        results['neuron.' + method] = measure(
+            lambda nr, method=method: getattr(nr, method)(),
+            analyzed, iterations)
+
+    return {
+        'config': {
+            'packages': packages,
+            'fanout': fanout,
+            'depth': depth,
+            'versions': versions,
+            'facades': facades,
+            'iterations': iterations,
+            'seed': seed,
+            'nodes': len(compiled),
+            'walked': walker.stats['nodes']
+        },
+        'results': results
+    }
+
+
+# The options of `run()` with which the results are comparable
+COMPARED_CONFIG = (
+    'packages', 'fanout', 'depth', 'versions', 'facades', 'seed'
+)
+
+
+# Compares the results with the baseline, and returns the list of
+# `(benchmark, baseline ms, current ms)` which are slower than
+# `threshold` times of the baseline, by the median.
+# Raises `ValueError` if the baseline is run with a different tree.
+def compare(report, baseline, threshold=1.2):
+    different = [
+        key for key in COMPARED_CONFIG
+        if baseline['config'].get(key) != report['config'].get(key)
+    ]
+    if different:
+        raise ValueError(
+            'the baseline is run with different options: ' + ', '.join([
+                '--%s %s (%s now)' % (
+                    key,
+                    baseline['config'].get(key),
+                    report['config'].get(key))
+                for key in different
+            ]))
+
+    regressions = []
+    for name in sorted(baseline['results']):
+        current = report['results'].get(name)
+        if current is None:
+            continue
+
+        expected = baseline['results'][name]['p50']
+        if current['p50'] > expected * threshold:
+            regressions.append((name, expected, current['p50']))
+    return regressions
+
+
+def format_report(report):
+    lines = [
+        '%-24s %10s %10s %10s %10s %12s' % (
+            'benchmark', 'ops/s', 'p50 ms', 'p90 ms', 'p99 ms', 'peak KiB')
+    ]
+
+    results = report['results']
+    for name in sorted(results):
+        result = results[name]
+        peak = result['peak_memory']
+        lines.append('%-24s %10.1f %10.3f %10.3f %10.3f %12s' % (
+            name,
+            result['ops'] or 0,
+            result['p50'],
+            result['p90'],
+            result['p99'],
+            '-' if peak is None else '%.1f' % (peak / 1024.0)
+        ))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m neuronjs.bench',
+        description='Benchmarks neuronjs with a synthetic dependency tree')
+    parser.add_argument('--packages', type=int, default=1000)
+    parser.add_argument('--fanout', type=int, default=4)
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--versions', type=int, default=2)
+    parser.add_argument('--facades', type=int, default=5)
+    parser.add_argument('--iterations', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument(
+        '--save', metavar='FILE', help='saves the results as the baseline')
+    parser.add_argument(
+        '--compare', metavar='FILE',
+        help='fails if slower than the baseline')
+    parser.add_argument(
+        '--threshold', type=float, default=1.2,
+        help='the max ratio to the baseline, 1.2 by default')
+    args = parser.parse_args(argv)
+
+    report = run(
+        packages=args.packages,
+        fanout=args.fanout,
+        depth=args.depth,
+        versions=args.versions,
+        facades=args.facades,
+        iterations=args.iterations,
+        seed=args.seed)
+
+    print(format_report(report))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+        try:
+            regressions = compare(report, baseline, args.threshold)
+        except ValueError as e:
+            print('error: %s' % e, file=sys.stderr)
+            return 2
+
+        for name, expected, actual in regressions:
+            print('regression: %s %.3fms -> %.3fms' % (name, expected, actual))
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# Caches
+
+
+import io
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from .files import write_atomic
+
+
+class LRUCache(object):
+    '''
+    A thread-safe in-memory cache with a size limit, which evicts the least
+    recently used item when full.
+
+    It implements the cache interface of `Neuron(cache=...)`:
+    `has(key)`, `get(key)` and `set(key, value)`
+    '''
+
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def has(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+
+            # move to the most recently used end
+            self._data[key] = value
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            self._evict()
+
+    # Sets `value` only if `key` is not cached, and returns the cached value
+    def setdefault(self, key, value):
+        with self._lock:
+            if key in self._data:
+                value = self._data.pop(key)
+
+            self._data[key] = value
+            self._evict()
+            return value
+
+    # Evicts the least recently used items, with the lock held
+    def _evict(self):
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'maxsize': self.maxsize
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class FileCache(object):
+    '''
+    A cache which saves each value as a file in the local `directory`, so that
+    the cache could be shared by the processes of the same machine.
+    '''
+
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def _filename(self, key):
+        return os.path.join(
+            self.directory,
+            hashlib.sha1(key.encode('utf-8')).hexdigest()
+        )
+
+    def has(self, key):
+        return os.path.isfile(self._filename(key))
+
+    def get(self, key, default=None):
+        try:
+            with io.open(self._filename(key), encoding='utf-8') as f:
+                return f.read()
+        except (IOError, OSError):
+            return default
+
+    def set(self, key, value):
+        write_atomic(self._filename(key), value)
+
+
+class KeyLocks(object):
+    '''
+    Locks by key, so that concurrent misses of a single key could wait for
+    the first one instead of doing the same work.
+    '''
+
+    def __init__(self):
+        # key -> [lock, number of holders]
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def hold(self, key):
+        with self._lock:
+            entry = self._locks.get(key)
+            if entry is None:
+                entry = self._locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+
+        entry[0].acquire()
+        try:
+            yield
+        finally:
+            entry[0].release()
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[key]
@@ -0,0 +1,55 @@
+# Reads and writes the files of neuronjs, such as manifests and snapshots
+
+
+import io
+import os
+import json
+import tempfile
+
+try:
+    # python 2
+    text_type = unicode
+except NameError:
+    text_type = str
+
+
+# The version of the manifests of `neuronjs.precompile` and `neuronjs.assets`
+MANIFEST_VERSION = 1
+
+
+# Writes `data`, either bytes or text in utf-8, to a temp file and then
+# renames it, so that readers never get a partially written file, and
+# readers and mmaps of the old file are never affected
+def write_atomic(filename, data):
+    if isinstance(data, text_type):
+        data = data.encode('utf-8')
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    try:
+        with io.open(fd, 'wb') as f:
+            f.write(data)
+        os.rename(tmp, filename)
+    except Exception:
+        os.remove(tmp)
+        raise
+
+
+def read_json(filename):
+    with io.open(filename, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_json(obj, filename):
+    write_atomic(filename, json.dumps(obj, indent=2, sort_keys=True))
+
+
+# Reads a manifest, and raises `ValueError` if the version is not supported
+def load_manifest(filename):
+    manifest = read_json(filename)
+
+    if manifest.get('manifest_version') != MANIFEST_VERSION:
+        raise ValueError(
+            'unsupported manifest version %s'
+            % manifest.get('manifest_version'))
+    return manifest
@@ -0,0 +1,110 @@
+# Compact encoding of `neuron.config.graph`
+#
+# The graph of `Walker.look_up()`:
+# {
+#   '_': {'a@^1.0.0': 0},
+#   0: ['1.0.0', {'b@~2.0.0': 1, 'c@*': 2}],
+#   1: ['2.0.1', {'c@*': 2}],
+#   2: ['1.0.0']
+# }
+#
+# is encoded as `[strings, maps, nodes]`:
+# [
+#   ['a@^1.0.0', '1.0.0', 'b@~2.0.0', 'c@*', '2.0.1'],
+#   [[0, 0], [2, 1, 3, -2], [3, -2]],
+#   [[1, 1], [4, 2]]
+# ]
+#
+# - `strings` is the table of the package range ids and the versions, which
+#   are referred to by their indexes.
+# - `maps` are the distinct dependency maps, each of which is a flat list of
+#   `key, value` pairs. The key is the index of the package range id. If the
+#   value is not negative, it is the index of a node of `nodes`, otherwise
+#   the dependency has no dependencies of its own, whose version is
+#   `strings[-value - 1]`. `maps[0]` is the map of the facades, i.e. `'_'`.
+# - `nodes` are the packages which have dependencies, each of which is
+#   `[index of the version, index of the dependency map]`.
+#
+# See `decode_graph()` for the reference decoder.
+
+
+# Returns the compact encoding of the graph
+def encode_graph(graph):
+    strings = []
+    string_ids = {}
+
+    def string_id(s):
+        index = string_ids.get(s)
+        if index is None:
+            index = string_ids[s] = len(strings)
+            strings.append(s)
+        return index
+
+    # Leaves are inlined into the maps, so only the other nodes are indexed
+    node_ids = {}
+    for index in sorted([key for key in graph if key != '_']):
+        if len(graph[index]) > 1:
+            node_ids[index] = len(node_ids)
+
+    maps = []
+    map_ids = {}
+
+    def map_id(dependencies):
+        flat = []
+        for key in sorted(dependencies):
+            index = dependencies[key]
+            node = graph[index]
+            flat.append(string_id(key))
+            flat.append(
+                node_ids[index] if len(node) > 1
+                else -string_id(node[0]) - 1)
+
+        flat = tuple(flat)
+        index = map_ids.get(flat)
+        if index is None:
+            index = map_ids[flat] = len(maps)
+            maps.append(list(flat))
+        return index
+
+    map_id(graph['_'])
+
+    nodes = [None] * len(node_ids)
+    for index in node_ids:
+        version, dependencies = graph[index]
+        nodes[node_ids[index]] = [string_id(version), map_id(dependencies)]
+
+    return [strings, maps, nodes]
+
+
+# Decodes the compact encoding into the graph, in which nodes might be
+# numbered differently from the original one
+def decode_graph(encoded):
+    strings, maps, nodes = encoded
+    graph = {}
+
+    # version -> the index of the leaf node
+    leaves = {}
+    decoded_maps = [None] * len(maps)
+
+    def decode_map(index):
+        decoded = decoded_maps[index]
+        if decoded is not None:
+            return decoded
+
+        flat = maps[index]
+        decoded = decoded_maps[index] = {}
+        for i in range(0, len(flat), 2):
+            value = flat[i + 1]
+            if value < 0:
+                version = strings[-value - 1]
+                value = leaves.get(version)
+                if value is None:
+                    value = leaves[version] = len(nodes) + len(leaves)
+                    graph[value] = [version]
+            decoded[strings[flat[i]]] = value
+        return decoded
+
+    graph['_'] = decode_map(0)
+    for index, (version, map_index) in enumerate(nodes):
+        graph[index] = [strings[version], decode_map(map_index)]
+    return graph
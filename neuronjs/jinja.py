@@ -0,0 +1,322 @@
+# Jinja2 extension which compiles the registrations of pages
+#
+# Requires jinja2, which is not a dependency of neuronjs.
+
+
+import hashlib
+
+from jinja2.ext import Extension
+from jinja2.lexer import Token
+
+from .main import Context
+from .precompile import prerender
+
+
+# The global function which registers a compiled page
+REGISTER = '_neuron_register'
+
+# Tags with end tags, inside which the registrations are conditional
+BLOCK_TAGS = set([
+    'if', 'for', 'block', 'macro', 'call', 'filter', 'with', 'autoescape',
+    'trans', 'set'
+])
+
+# Brackets inside the arguments of a call
+OPENING_BRACKETS = set(['lparen', 'lbracket', 'lbrace'])
+CLOSING_BRACKETS = set(['rparen', 'rbracket', 'rbrace'])
+
+
+class CompiledPage(object):
+    '''
+    The facades, combos and csses registered by a template, and the outputs
+    prerendered by `engine`, which is `None` if there is no engine
+    '''
+
+    __slots__ = ('facades', 'combos', 'csses', 'engine', 'debug', 'outputs')
+
+    def __init__(self, facades, combos, csses, engine=None):
+        self.facades = facades
+        self.combos = combos
+        self.csses = csses
+        self.engine = engine
+        self.debug = None
+        self.outputs = None
+
+        if engine is None or not facades:
+            return
+
+        n = Context(engine)
+        for module_id in facades:
+            n.facade(module_id)
+        for combo in combos:
+            n.combo(*combo)
+        for css_module in csses:
+            n.css(*css_module)
+
+        self.debug = bool(n._is_debug())
+        self.outputs = prerender(n)
+
+
+class NeuronExtension(Extension):
+    '''
+    Finds the calls of `n.facade()`, `n.combo()` and `n.css()` with literal
+    module ids at the top level of a template, when the template is compiled:
+
+        {{ n.facade('home', {'user': user.id}) }}
+        {{ n.combo('b', 'c') }}
+        {{ n.css('home/home.css') }}
+
+    Consecutive calls are registered at once when rendered, and if they are
+    the whole page, the outputs of `n.output_scripts()`, `n.output_config()`
+    and `n.output_css()` are prerendered with `environment.neuron_engine`
+    when the template is compiled, and are never analyzed per request. Only
+    the data of facades is evaluated per request, for `n.output_facades()`.
+
+        env = Environment(extensions=[NeuronExtension])
+        env.neuron_engine = engine
+
+        def handler(request):
+            return env.get_template('home.html').render(n=Context(engine))
+
+    - `environment.neuron_variable` is the name of the variable of the
+      context, `'n'` by default.
+    - The prerendered outputs apply only if the context is of the same
+      engine, and nothing else is registered before the outputs. Otherwise
+      the page is analyzed as usual.
+    - Calls inside tags, such as `{% if %}` and `{% block %}`, and calls
+      after other uses of the context are left as they are.
+    '''
+
+    def __init__(self, environment):
+        Extension.__init__(self, environment)
+        environment.extend(
+            neuron_engine=None,
+            neuron_variable='n'
+        )
+
+        # key -> CompiledPage
+        self.pages = {}
+        environment.globals[REGISTER] = self._register
+
+    # The facades, combos and csses of the page are the arguments of the
+    # compiled template, so that the template also works when loaded from
+    # a bytecode cache, and the page is created lazily in each process
+    def _register(self, n, key, facades, combos, csses, *data):
+        page = self.pages.get(key)
+        if page is None:
+            page = self.pages[key] = CompiledPage(
+                tuple(facades),
+                tuple([tuple(combo) for combo in combos]),
+                tuple([tuple(css) for css in csses]),
+                self.environment.neuron_engine)
+        return n._register_compiled(page, data)
+
+    def filter_stream(self, stream):
+        return self._compile(list(stream))
+
+    def _compile(self, tokens):
+        # end tags of unknown tags make the depth unknown
+        for i, token in enumerate(tokens):
+            if token.type == 'block_begin' and i + 1 < len(tokens):
+                name = tokens[i + 1].value
+                if tokens[i + 1].type == 'name' and name.startswith('end') \
+                        and name[3:] not in BLOCK_TAGS:
+                    return tokens
+
+        output = []
+        calls = []
+
+        # the index of `output` to insert the registration
+        position = None
+        lineno = None
+        finished = False
+        depth = 0
+
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+
+            if token.type == 'block_begin':
+                finished = finished or bool(calls)
+                depth += NeuronExtension._get_depth_change(tokens, i)
+
+            elif token.type == 'variable_begin' and not finished:
+                call, end = None, None
+                if not depth:
+                    call, end = self._parse_call(tokens, i)
+
+                if call is not None:
+                    if position is None:
+                        position = len(output)
+                        lineno = token.lineno
+                    calls.append(call)
+                    i = end
+                    continue
+
+                # other uses of the context
+                finished = bool(calls)
+
+            output.append(token)
+            i += 1
+
+        if calls:
+            output[position:position] = self._create_registration(
+                calls, lineno)
+        return output
+
+    # Returns `1` if the tag at `i` has an end tag, `-1` if it is an end
+    # tag, or `0`
+    @staticmethod
+    def _get_depth_change(tokens, i):
+        if i + 1 >= len(tokens) or tokens[i + 1].type != 'name':
+            return 0
+
+        name = tokens[i + 1].value
+        if name.startswith('end'):
+            return -1
+
+        if name not in BLOCK_TAGS:
+            return 0
+
+        if name == 'set':
+            # `{% set x = 1 %}` has no end tag
+            for token in tokens[i + 2:]:
+                if token.type == 'block_end':
+                    return 1
+                if token.type == 'assign':
+                    return 0
+        return 1
+
+    # Parses `{{ n.<method>(<args>) }}` from `i`, and returns
+    # `((method, module ids, data tokens), index after the call)`,
+    # or `(None, None)` if it could not be compiled
+    def _parse_call(self, tokens, i):
+        variable = self.environment.neuron_variable
+
+        def match(j, type_, value=None):
+            return j < len(tokens) and tokens[j].type == type_ \
+                and (value is None or tokens[j].value == value)
+
+        if not (
+            match(i + 1, 'name', variable)
+            and match(i + 2, 'dot')
+            and match(i + 3, 'name')
+            and match(i + 4, 'lparen')
+        ):
+            return None, None
+
+        method = tokens[i + 3].value
+        if method not in ('facade', 'combo', 'css'):
+            return None, None
+
+        j = i + 5
+        ids = []
+        data = None
+        while True:
+            if not match(j, 'string'):
+                return None, None
+            ids.append(tokens[j].value)
+            j += 1
+
+            if match(j, 'rparen'):
+                j += 1
+                break
+
+            if not match(j, 'comma'):
+                return None, None
+            j += 1
+
+            if method == 'facade':
+                data, j = NeuronExtension._parse_data(tokens, j)
+                if data is None:
+                    return None, None
+                break
+
+        if not match(j, 'variable_end'):
+            return None, None
+        return (method, ids, data), j + 1
+
+    # Returns the tokens of the data of a facade from `j`, and the index
+    # after `)`, or `(None, None)` for keyword arguments or more arguments
+    @staticmethod
+    def _parse_data(tokens, j):
+        depth = 0
+        start = j
+        while j < len(tokens):
+            type_ = tokens[j].type
+            if type_ in OPENING_BRACKETS:
+                depth += 1
+            elif type_ in CLOSING_BRACKETS:
+                if not depth:
+                    break
+                depth -= 1
+            elif type_ == 'variable_end':
+                return None, None
+            elif not depth and type_ in ('comma', 'assign'):
+                return None, None
+            j += 1
+
+        if j == start or j >= len(tokens) or tokens[j].type != 'rparen':
+            return None, None
+        return tokens[start:j], j + 1
+
+    # Returns the tokens of
+    # `{{ _neuron_register(n, key, facades, combos, csses, data...) }}`
+    def _create_registration(self, calls, lineno):
+        facades = []
+        combos = []
+        csses = []
+        arguments = []
+
+        for method, ids, data in calls:
+            if method == 'facade':
+                facades.append(ids[0])
+                arguments.append(
+                    data or [Token(lineno, 'name', 'none')])
+
+            # combos of a single package never apply
+            elif method == 'combo':
+                if len(ids) > 1:
+                    combos.append(tuple(ids))
+
+            elif tuple(ids) not in csses:
+                csses.append(tuple(ids))
+
+        m = hashlib.sha1()
+        m.update(repr((facades, combos, csses)).encode('utf-8'))
+        key = m.hexdigest()
+
+        registration = [
+            Token(lineno, 'variable_begin', '{{'),
+            Token(lineno, 'name', REGISTER),
+            Token(lineno, 'lparen', '('),
+            Token(lineno, 'name', self.environment.neuron_variable),
+            Token(lineno, 'comma', ','),
+            Token(lineno, 'string', key)
+        ]
+        for literal in (facades, combos, csses):
+            registration.append(Token(lineno, 'comma', ','))
+            registration.extend(NeuronExtension._to_tokens(literal, lineno))
+
+        for tokens in arguments:
+            registration.append(Token(lineno, 'comma', ','))
+            registration.extend(tokens)
+        registration.extend([
+            Token(lineno, 'rparen', ')'),
+            Token(lineno, 'variable_end', '}}')
+        ])
+        return registration
+
+    # Returns the tokens of the list of strings or lists of strings
+    @staticmethod
+    def _to_tokens(items, lineno):
+        tokens = [Token(lineno, 'lbracket', '[')]
+        for item in items:
+            if len(tokens) > 1:
+                tokens.append(Token(lineno, 'comma', ','))
+            if isinstance(item, tuple):
+                tokens.extend(NeuronExtension._to_tokens(item, lineno))
+            else:
+                tokens.append(Token(lineno, 'string', item))
+        tokens.append(Token(lineno, 'rbracket', ']'))
+        return tokens
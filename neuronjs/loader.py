@@ -0,0 +1,332 @@
+# Loads dependency trees, and reloads them when changed
+#
+# The snapshot format, all integers are little-endian uint32:
+#
+#   header      magic 'NRNT', format version, meta size, number of strings,
+#               number of nodes, number of edges
+#   meta        utf-8 json, such as `{"_version": "...", "css": {...}}`, in
+#               which "css" maps node ids to the csses of the packages, and
+#               "source" is the mtime and the size of the json file which
+#               the snapshot is written from
+#   strings     byte offsets (number of strings + 1), then the utf-8 blob
+#   nodes       name string ids, version string ids, defined flags (uint8)
+#   edges       offsets of each node (number of nodes + 1),
+#               package range string ids, child node ids
+
+
+import io
+import os
+import sys
+import json
+import mmap
+import time
+import struct
+import threading
+from array import array
+
+from .files import write_atomic, read_json
+from .tree import CompiledTree, compile_tree
+from .module import intern
+
+
+MAGIC = b'NRNT'
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct('<4sIIIII')
+
+_BIG_ENDIAN = sys.byteorder == 'big'
+
+
+def _uint32_array(values=()):
+    # 'I' is 4 bytes on all platforms we support, but make sure of it
+    for typecode in ('I', 'L'):
+        if array(typecode).itemsize == 4:
+            return array(typecode, values)
+    raise RuntimeError('no 4-byte array type')
+
+
+def _to_bytes(arr):
+    if _BIG_ENDIAN:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes() if hasattr(arr, 'tobytes') else arr.tostring()
+
+
+def _from_bytes(arr, data):
+    if hasattr(arr, 'frombytes'):
+        arr.frombytes(data)
+    else:
+        arr.fromstring(data)
+
+    if _BIG_ENDIAN:
+        arr.byteswap()
+    return arr
+
+
+# Writes the snapshot of a tree to `filename`
+# @param {dict|CompiledTree} tree
+# @param {dict=} source `{"mtime": ..., "size": ...}` of the json file
+def dump(tree, filename, source=None):
+    compiled = compile_tree(tree)
+
+    # string -> string id
+    string_ids = {}
+    strings = []
+
+    def string_id(s):
+        if s not in string_ids:
+            string_ids[s] = len(strings)
+            strings.append(s)
+        return string_ids[s]
+
+    names = _uint32_array(string_id(name) for name in compiled.names)
+    versions = _uint32_array(
+        string_id(version) for version in compiled.versions)
+    defined = array('B', (
+        1 if compiled.is_defined(node) else 0
+        for node in range(len(compiled))
+    ))
+
+    edge_offsets = _uint32_array([0])
+    edge_ranges = _uint32_array()
+    edge_children = _uint32_array()
+    for edges in compiled.edges:
+        for package_range_id, child in edges or ():
+            edge_ranges.append(string_id(package_range_id))
+            edge_children.append(child)
+        edge_offsets.append(len(edge_ranges))
+
+    string_offsets = _uint32_array([0])
+    blob = []
+    size = 0
+    for s in strings:
+        encoded = s.encode('utf-8')
+        blob.append(encoded)
+        size += len(encoded)
+        string_offsets.append(size)
+
+    meta = {
+        '_version': compiled.version
+    }
+
+    csses = dict([
+        (str(node), list(paths))
+        for node, paths in enumerate(compiled.csses)
+        if paths
+    ])
+    if csses:
+        meta['css'] = csses
+
+    if source is not None:
+        meta['source'] = source
+
+    meta = json.dumps(meta).encode('utf-8')
+
+    chunks = [
+        HEADER.pack(
+            MAGIC, FORMAT_VERSION, len(meta),
+            len(strings), len(compiled), len(edge_ranges)),
+        meta,
+        _to_bytes(string_offsets),
+        b''.join(blob),
+        _to_bytes(names),
+        _to_bytes(versions),
+        _to_bytes(defined),
+        _to_bytes(edge_offsets),
+        _to_bytes(edge_ranges),
+        _to_bytes(edge_children)
+    ]
+
+    write_atomic(filename, b''.join(chunks))
+
+
+# Returns the meta of the snapshot, or `None` if it is not a valid snapshot
+def load_meta(filename):
+    with io.open(filename, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return
+
+        magic, format_version, meta_size = HEADER.unpack(header)[:3]
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            return
+
+        meta = f.read(meta_size)
+        if len(meta) < meta_size:
+            return
+    return json.loads(meta.decode('utf-8'))
+
+
+def is_snapshot(filename):
+    with io.open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# Loads a snapshot written by `dump()`, and returns a `CompiledTree`
+def load_snapshot(filename):
+    with io.open(filename, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        return _parse_snapshot(buf)
+    finally:
+        buf.close()
+
+
+def _parse_snapshot(buf):
+    if len(buf) < HEADER.size:
+        raise ValueError('invalid dependency tree snapshot')
+
+    magic, format_version, meta_size, string_count, node_count, edge_count \
+        = HEADER.unpack(buf[0:HEADER.size])
+
+    if magic != MAGIC:
+        raise ValueError('invalid dependency tree snapshot')
+
+    if format_version != FORMAT_VERSION:
+        raise ValueError(
+            'unsupported snapshot format version %s' % format_version)
+
+    # offset of the section to read
+    position = [HEADER.size]
+
+    def read(size):
+        start = position[0]
+        end = position[0] = start + size
+        if end > len(buf):
+            raise ValueError('truncated dependency tree snapshot')
+        return buf[start:end]
+
+    def read_uint32s(count):
+        return _from_bytes(_uint32_array(), read(count * 4))
+
+    meta = json.loads(read(meta_size).decode('utf-8'))
+
+    string_offsets = read_uint32s(string_count + 1)
+    blob = read(string_offsets[-1])
+    strings = [
+        intern(blob[string_offsets[i]:string_offsets[i + 1]].decode('utf-8'))
+        for i in range(string_count)
+    ]
+
+    names = read_uint32s(node_count)
+    versions = read_uint32s(node_count)
+    defined = _from_bytes(array('B'), read(node_count))
+
+    edge_offsets = read_uint32s(node_count + 1)
+    edge_ranges = read_uint32s(edge_count)
+    edge_children = read_uint32s(edge_count)
+
+    nodes = [
+        (strings[names[node]], strings[versions[node]], defined[node])
+        for node in range(node_count)
+    ]
+
+    edges = [
+        tuple(
+            (strings[edge_ranges[i]], edge_children[i])
+            for i in range(edge_offsets[node], edge_offsets[node + 1])
+        )
+        for node in range(node_count)
+    ]
+
+    return CompiledTree.from_nodes(
+        meta.get('_version'), nodes, edges, meta.get('css'))
+
+
+# Loads a dependency tree from either a snapshot or a json file,
+# and returns a `CompiledTree`
+def load(filename):
+    if is_snapshot(filename):
+        return load_snapshot(filename)
+
+    return CompiledTree(read_json(filename))
+
+
+class TreeLoader(object):
+    '''
+    Loads the dependency tree from `filename`, and reloads it when the file
+    is changed, without blocking requests.
+
+    `loader.tree` checks the modification time of the file at most once
+    every `interval` seconds. The new tree is loaded by the first request
+    which finds the change, while the other requests go on with the old
+    tree, and then the reference to the tree is swapped at once. A request
+    should get `loader.tree` only once, so that it never sees two trees.
+
+    If `snapshot` is specified, the tree is loaded from the snapshot file,
+    which is written again unless it is written from the same mtime and
+    size of `filename`, so that a rollback which restores an older file
+    is never served by a newer snapshot.
+    '''
+
+    def __init__(self, filename, snapshot=None, interval=1.0):
+        self.filename = filename
+        self.snapshot = snapshot
+        self.interval = interval
+
+        self._lock = threading.Lock()
+        self._checked = 0
+
+        # `{"mtime": ..., "size": ...}` of the loaded file
+        self._source = None
+        self._tree = None
+
+        self.reload()
+
+    @property
+    def tree(self):
+        now = time.time()
+
+        # Only one request checks and reloads, the others never wait for it
+        if now - self._checked >= self.interval \
+                and self._lock.acquire(False):
+            try:
+                self._checked = now
+                self._check()
+            finally:
+                self._lock.release()
+
+        return self._tree
+
+    # Loads the tree at once
+    def reload(self):
+        with self._lock:
+            self._checked = time.time()
+            self._load(self._stat())
+
+    def _stat(self):
+        stat = os.stat(self.filename)
+        return {
+            'mtime': stat.st_mtime,
+            'size': stat.st_size
+        }
+
+    def _check(self):
+        try:
+            source = self._stat()
+        except OSError:
+            # The file might be being replaced, keep the current tree
+            return
+
+        if source == self._source:
+            return
+
+        try:
+            self._load(source)
+        except (IOError, OSError, ValueError):
+            # A partially written file, try again on the next check
+            pass
+
+    def _load(self, source):
+        snapshot = self.snapshot
+        if snapshot and os.path.isfile(snapshot) \
+                and (load_meta(snapshot) or {}).get('source') == source:
+            tree = load_snapshot(snapshot)
+        else:
+            tree = load(self.filename)
+            if snapshot:
+                dump(tree, snapshot, source)
+
+        self._tree = tree
+        self._source = source
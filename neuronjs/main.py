@@ -5,71 +5,285 @@ __author__ = 'Kael Zhang <i@kael.me>'
 
 import json
 import hashlib
+import functools
 
 from .walker import Walker
+from .tree import compile_tree
+from .graph import encode_graph
 from . import tools
 from . import module
 
 
-class Neuron(object):
+# A combo is a list of module ids, which is not hashable
+def _url_key(id):
+    if type(id) is list:
+        return tuple(id)
+    return id
+
+
+# The default resolver could not resolve combos, which the planner creates
+def _check_resolver(resolve, resolve_many, planner):
+    if planner is not None and not resolve and resolve_many is None:
+        raise ValueError(
+            '`planner` requires `resolve` or `resolve_many` which resolves '
+            'a list of module ids into the url of a combo')
+
+
+class Engine(object):
     '''
+    The immutable configurations shared by all requests: the dependency tree,
+    the resolvers, the caches and `js_config`.
+
+    An engine is thread-safe, so a single engine could be created when the
+    application starts, and then each request renders with its own `Context`
+    of the engine, which costs almost nothing to create:
+
+        engine = Engine(dependency_tree=tree, resolve=resolve)
+
+        def handler(request):
+            n = Context(engine)
+
+    The arguments are the same as `Neuron`.
     '''
 
+    __slots__ = (
+        'dependency_tree',
+        'tree',
+        'resolve',
+        'resolve_many',
+        'planner',
+        'instrument',
+        'debug',
+        'is_debug',
+        'version',
+        'cache',
+        'js_config',
+        'analysis_cache',
+        'url_cache',
+        'manifest',
+        'compact_graph'
+    )
+
     def __init__(self,
                  dependency_tree = {},
                  resolve         = None,
                  debug           = False,
                  version         = 0,
                  cache           = None,
-                 js_config       = {}):
-
+                 js_config       = {},
+                 analysis_cache  = True,
+                 resolve_many    = None,
+                 url_cache       = True,
+                 planner         = None,
+                 instrument      = None,
+                 manifest        = None,
+                 compact_graph   = False):
+
+        _check_resolver(resolve, resolve_many, planner)
         if not resolve:
-            resolve = Neuron._default_resolver
-
-        self.dependency_tree     = dependency_tree
-        self.resolve             = resolve
-        self.debug               = debug
-        self.version             = str(version)
-
-        # TODO
-        self.cache               = cache
-        self.js_config           = js_config
-
-        if hasattr(self.debug, b'__call__'):
-            self._is_debug = self._is_debug_fn
+            resolve = Context._default_resolver
+
+        # The compiled tree is shared by all engines of the same tree
+        tree = compile_tree(dependency_tree)
+
+        # By default, analysis results are shared by all instances
+        # of the same dependency tree
+        if analysis_cache is True:
+            analysis_cache = tree.analysis_cache
+        elif analysis_cache is False:
+            analysis_cache = None
+
+        # Resolved urls are shared by all instances of the same tree,
+        # (resolve, id) -> url
+        if url_cache is True:
+            url_cache = tree.url_cache
+        elif url_cache is False:
+            url_cache = None
+
+        if hasattr(debug, '__call__'):
+            is_debug = debug
         else:
-            self.is_debug = bool(self.debug)
-            self._is_debug = self._is_debug_bool
+            debug = bool(debug)
+            is_debug = lambda: debug
+
+        set_ = functools.partial(object.__setattr__, self)
+        set_('dependency_tree', dependency_tree)
+        set_('tree', tree)
+        set_('resolve', resolve)
+        set_('resolve_many', resolve_many)
+        set_('planner', planner)
+        set_('instrument', instrument)
+        set_('debug', debug)
+        set_('is_debug', is_debug)
+        set_('version', str(version))
+        set_('cache', cache)
+        set_('js_config', js_config)
+        set_('analysis_cache', analysis_cache)
+        set_('url_cache', url_cache)
+
+        # page id -> prerendered outputs, see `neuronjs.precompile`
+        set_('manifest', manifest.get('pages') if manifest else None)
+        set_('compact_graph', bool(compact_graph))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Engine is immutable')
+
+
+# Reads the configuration from the engine
+def _engine_property(name):
+    return property(lambda self: getattr(self.engine, name))
+
+
+class Context(object):
+    '''
+    The state of rendering a single request with an `Engine`: the facades,
+    the combos, the csses and what are already output.
 
+    A context should never be shared by threads, while the engine could.
+    '''
+
+    __slots__ = (
+        'engine',
+        '_analyzed',
+        '_analysis_key',
+        '_facades',
+        '_deferred_facades',
+        '_deferred',
+        '_pending_facades',
+        '_extended',
+        '_walked',
+        '_walker',
+        '_scripts_sent',
+        '_config_sent',
+        '_sent',
+        '_facades_sent',
+        '_csses_sent',
+        '_css_output',
+        '_csses',
+        '_tree_csses',
+        '_loaded',
+        '_encoded',
+        '_combos',
+        '_combos_output',
+        '_packages',
+        '_graph',
+        '_urls',
+        '_prerendered',
+        '_prerendered_csses',
+        '_compiled_page'
+    )
+
+    dependency_tree = _engine_property('dependency_tree')
+    resolve = _engine_property('resolve')
+    resolve_many = _engine_property('resolve_many')
+    planner = _engine_property('planner')
+    instrument = _engine_property('instrument')
+    debug = _engine_property('debug')
+    version = _engine_property('version')
+    cache = _engine_property('cache')
+    js_config = _engine_property('js_config')
+    analysis_cache = _engine_property('analysis_cache')
+    url_cache = _engine_property('url_cache')
+
+    def __init__(self, engine):
+        self.engine = engine
         self._analyzed = False
 
         # allow a facade with several different data
         self._facades = []
 
-        # a single css file should not be loaded more than once
-        self._csses = set([])
+        # indexes of the facades of `self._facades` which are deferred
+        self._deferred_facades = set()
+
+        # (name, version, path) of the modules which are only depended by
+        # deferred facades, and will be loaded after the page is loaded
+        self._deferred = frozenset()
+
+        # module ids of facades registered after analysis
+        self._pending_facades = []
+
+        # whether the analysis is extended by facades after analysis
+        self._extended = False
+
+        # whether `self._walker` holds the walked state of `self._graph`,
+        # which might be restored from the analysis cache instead
+        self._walked = False
+
+        # created only if the tree should be walked, see `_get_walker()`
+        self._walker = None
+
+        # what are already output, so that the following outputs
+        # only contain new scripts, facades and csses
+        self._scripts_sent = False
+        self._sent = set([])
+        self._facades_sent = 0
+
+        # the number of facades covered by the config output, or `None` if
+        # the config is never output
+        self._config_sent = None
+
+        # normalized ids of the csses output, and whether `iter_css()` is
+        # ever called
+        self._csses_sent = set([])
+        self._css_output = False
+
+        # list.<tuple> of the csses registered by `css()`
+        self._csses = []
+
+        # (name, version, path) of the csses declared by the packages
+        # of the facades, see `Walker.csses`
+        self._tree_csses = ()
         self._loaded = set([])
 
+        # encoding -> (json of `_loaded`, json of `_graph`), which is shared
+        # by all instances restoring the same analysis, see `_encode_config()`
+        self._encoded = {}
+
         # list.<tuple>
         self._combos = []
-        self._walker = Walker(self.dependency_tree)
 
-    def _is_debug_fn(self):
-        return self.debug()
+        # the number of combos output by the last `output_scripts()`,
+        # only for instrumentation
+        self._combos_output = 0
+
+        # urls resolved for this request, id -> url
+        self._urls = {}
 
-    def _is_debug_bool(self):
-        return self.debug
+        # the outputs of the page found in the manifest, with which the
+        # analysis is skipped, see `_ensure_analysis()`
+        self._prerendered = None
+        self._prerendered_csses = None
+
+        # the page compiled from a template, see `_register_compiled()`
+        self._compiled_page = None
+
+    def _is_debug(self):
+        return self.engine.is_debug()
+
+    def _get_walker(self):
+        if self._walker is None:
+            self._walker = Walker(self.engine.tree, self.engine.instrument)
+        return self._walker
 
     @staticmethod
     def _default_resolver(pathname):
         return '/' + pathname
 
-    @tools.before_analysis
-    def facade(self, module_id, data=None):
+    # If `defer` is true, the modules which are only depended by deferred
+    # facades will be loaded after the load event of the page
+    def facade(self, module_id, data=None, defer=False):
         self._facades.append(
             (module_id, data)
         )
 
+        if defer:
+            self._deferred_facades.add(len(self._facades) - 1)
+
+        # Facades of partial templates might be registered after analysis,
+        # which will extend the analysis incrementally
+        if self._analyzed:
+            self._pending_facades.append(module_id)
+
         # Actually, neuron.facade() will output nothing
         return ''
 
@@ -82,61 +296,357 @@ class Neuron(object):
             self._combos.append(package_names)
         return ''
 
+    # Registers the facades, combos and csses of a page compiled from a
+    # template by `neuronjs.jinja`, whose outputs might be prerendered.
+    # @param {CompiledPage} page
+    # @param {list} data the data of the facades
+    def _register_compiled(self, page, data):
+        # Only a whole page could use the prerendered outputs
+        if self._analyzed or self._facades or self._combos or self._csses:
+            for module_id, data_ in zip(page.facades, data):
+                self.facade(module_id, data_)
+            for combo in page.combos:
+                self.combo(*combo)
+            for css_module in page.csses:
+                self.css(*css_module)
+            return ''
+
+        self._facades.extend(zip(page.facades, data))
+
+        debug = bool(self._is_debug())
+        if not debug:
+            self._combos.extend(page.combos)
+        self._csses.extend(page.csses)
+
+        if page.outputs is not None and page.engine is self.engine \
+                and page.debug == debug:
+            self._compiled_page = page
+        return ''
+
+    # Returns the prerendered outputs of the compiled page, if nothing
+    # else is registered
+    def _get_compiled_outputs(self):
+        page = self._compiled_page
+        if page is None:
+            return
+
+        combos = 0 if page.debug else len(page.combos)
+        if len(self._facades) == len(page.facades) \
+                and len(self._combos) == combos \
+                and len(self._csses) == len(page.csses):
+            return page.outputs
+
     def css(self, *css_module):
-        self._csses.add(css_module)
+        if css_module not in self._csses:
+            self._csses.append(css_module)
         return ''
 
     def src(self, module_id):
-        name, range_, path = module.parse_module_id(module_id)
-        if name not in self.dependency_tree:
-            version = range_
-        else:
-            versions = self.dependency_tree[name]
-            version = module.max_satisfying(range_, versions.keys())
+        return self._resolve(self._src_id(module_id))
 
-        return self.resolve(module.module_id(name, version, path))
+    def _src_id(self, module_id):
+        name, range_, path = module.parse_module_id(module_id)
+        version = self.engine.tree.resolve_range(name, range_) or range_
+        return module.module_id(name, version, path)
 
+    # Outputs all csses, and only the csses which are not output before
+    # if called again.
+    @tools.instrument('output_css')
     def output_css(self):
+        return ''.join(self.iter_css())
+
+    # Yields the html of csses one by one
+    def iter_css(self):
         self.analyze()
 
-        def normalize(ids):
-            normalized = [
-                module.normalize_id(id)
-                for id in ids
-            ]
+        ids, keys = self._collect_csses(self._csses_sent)
+        self._csses_sent.update(keys)
 
-            if len(normalized) == 1:
-                return normalized[0]
-            return normalized
+        if self._css_output:
+            for chunk in self._iter_css(ids):
+                yield chunk
+            return
 
-        return self._get_joiner().join([
-            Neuron.decorate(
-                self.resolve(normalize(id)),
+        self._css_output = True
+
+        if self._prerendered is not None \
+                and set(self._csses) == self._prerendered_csses:
+            yield self._prerendered['css']
+            return
+
+        if self.cache is not None:
+            yield self._output_all_css()
+            return
+
+        for chunk in self._iter_css(ids):
+            yield chunk
+
+    @tools.memoize('_get_identifier_hash')
+    def _output_all_css(self):
+        return ''.join(self._iter_css(self._css_ids()))
+
+    def _iter_css(self, ids):
+        self._prefetch(ids)
+        return Context._iter_join(self._get_joiner(), (
+            Context.decorate(
+                self._resolve(id),
                 'css'
             )
-            for id in self._csses
-        ])
+            for id in ids
+        ))
+
+    # Returns the ids to resolve of csses, a combo is a list of ids
+    # @param {set=} sent the keys of the csses to skip
+    def _css_ids(self, sent=()):
+        return self._collect_csses(sent)[0]
+
+    # Returns `(ids, keys)`, the ids to resolve and the keys of them.
+    # The csses of the packages come first, which are comboed as the
+    # scripts of the packages are, and then those registered by `css()`.
+    # A css is keyed by its id with the version resolved from the tree,
+    # so that a css registered by different ids, such as 'a/a.css',
+    # 'a@*/a.css' and 'a@^1.0.0/a.css', is only output once.
+    def _collect_csses(self, sent=()):
+        seen = set(sent)
+        keys = []
+        ids = []
+
+        for group in self._css_groups():
+            cleaned = []
+            for key, id in group:
+                if key not in seen:
+                    seen.add(key)
+                    keys.append(key)
+                    cleaned.append(id)
 
-    @tools.memoize('_get_identifier_hash')
-    def output_scripts(self):
+            # should not combo a single file
+            if len(cleaned) == 1:
+                ids.append(cleaned[0])
+            elif cleaned:
+                ids.append(cleaned)
+        return ids, keys
+
+    # Yields the lists of `(key, id)` of csses, each of which is a combo
+    def _css_groups(self):
+        tree_csses = self._tree_csses
+        if tree_csses:
+            # (name, version) -> index of the combo
+            comboed = {}
+            for index, combo in enumerate(self._combos):
+                for name, version, path in combo:
+                    comboed[(name, version)] = index
+
+            groups = [[] for combo in self._combos]
+            singles = []
+            for name, version, path in tree_csses:
+                index = comboed.get((name, version))
+                id = module.module_id(name, version, path)
+                if index is None:
+                    singles.append([(id, id)])
+                else:
+                    groups[index].append((id, id))
+
+            for group in groups + singles:
+                if group:
+                    yield group
+
+        for css_module in self._csses:
+            yield [
+                (self._src_id(id), module.normalize_id(id))
+                for id in css_module
+            ]
+
+    # Returns the list of ids to resolve by the next
+    # `output_scripts()` and `output_css()`, including neuron.js
+    def _pending_ids(self):
+        return self._pending_script_ids() + self._pending_css_ids()
+
+    # If `deferred` is false, excludes the deferred scripts
+    def _pending_script_ids(self, deferred=True):
+        self.analyze()
+
+        # the scripts of the prerendered page are already resolved
+        if self._prerendered is not None:
+            return []
+
+        ids = []
+        if not self._scripts_sent:
+            ids.append('neuron.js')
+            if not self._is_debug():
+                script_ids = list(self._script_ids())
+                if not deferred:
+                    script_ids = self._split_script_ids(script_ids)[0]
+                ids.extend(script_ids)
+        elif not self._is_debug():
+            ids.extend([
+                module.module_id(*module_tuple)
+                for module_tuple in self._new_scripts()
+                if deferred or module_tuple not in self._deferred
+            ])
+        return ids
+
+    def _pending_css_ids(self):
         self.analyze()
 
+        return self._css_ids(self._csses_sent)
+
+    # Outputs the `<link rel="preload">` tags of neuron.js, the scripts and
+    # the csses which are not output yet, so that the browser could fetch
+    # them before reaching `output_scripts()` and `output_css()`.
+    # Facades should be registered before it is called.
+    def output_preload(self):
         return self._get_joiner().join([
-            self._output_neuron(),
-            self._output_scripts()
+            Context.decorate(url, 'preload', 'as="%s"' % as_)
+            for url, as_ in self._preload_urls()
+        ])
+
+    # Returns the value of the `Link` http header, which preloads the same
+    # urls as `output_preload()`, so that the server or the reverse proxy
+    # could push or early hint them before the html is rendered.
+    def preload_header(self):
+        return ', '.join([
+            '<%s>; rel=preload; as=%s' % (url, as_)
+            for url, as_ in self._preload_urls()
         ])
 
+    # Returns the list of `(url, as)`
+    def _preload_urls(self):
+        self.analyze()
+        self._ensure_analysis()
+
+        # deferred scripts should never compete with the critical ones
+        scripts = self._pending_script_ids(False)
+        csses = self._pending_css_ids()
+        self._prefetch(scripts)
+
+        return [
+            (self._resolve(id), 'script') for id in scripts
+        ] + [
+            (self._resolve(id), 'style') for id in csses
+        ]
+
+    # Outputs neuron.js and all scripts, and only the scripts which are not
+    # output before if called again, i.e. those of facades after analysis.
+    @tools.instrument('output_scripts')
+    def output_scripts(self):
+        return ''.join(self.iter_scripts())
+
+    # Yields the html of neuron.js and then the scripts one by one, so that
+    # the head of the page could be flushed before all scripts are resolved
+    def iter_scripts(self):
+        self.analyze()
+
+        if self._scripts_sent:
+            for chunk in self._iter_new_scripts():
+                yield chunk
+            return
+
+        self._scripts_sent = True
+        self._sent.update(self._loaded)
+        self._combos_output = len(self._combos)
+
+        if self._prerendered is not None:
+            yield self._prerendered['scripts']
+            return
+
+        if self.cache is not None:
+            yield self._output_all_scripts()
+            return
+
+        for chunk in self._iter_all_scripts():
+            yield chunk
+
+    @tools.memoize('_get_identifier_hash')
+    def _output_all_scripts(self):
+        return ''.join(self._iter_all_scripts())
+
+    def _iter_all_scripts(self):
+        # If debug, no javascript files of dependencies will be preloaded
+        if self._is_debug():
+            self._prefetch(['neuron.js'])
+            yield self._output_neuron()
+            yield self._get_joiner()
+            return
+
+        ids, deferred = self._split_script_ids(list(self._script_ids()))
+        self._prefetch(['neuron.js'] + ids + deferred)
+
+        yield self._output_neuron()
+        for id in ids:
+            yield self._decorate_script(id)
+
+        if deferred:
+            yield self._output_deferred(deferred)
+
+    @tools.instrument('output_config')
     def output_config(self):
-        return self._get_joiner().join([
+        return ''.join(self.iter_config())
+
+    # Yields the html of the configurations of neuron.js, and only the
+    # config updated by the facades registered after the last output
+    # if called again
+    def iter_config(self):
+        self.analyze()
+
+        if self._config_sent is not None:
+            if self._is_config_stale():
+                self._config_sent = len(self._facades)
+                yield ''.join(self._iter_all_config())
+            return
+
+        self._config_sent = len(self._facades)
+
+        if self._prerendered is not None:
+            yield self._prerendered['config']
+            return
+
+        if self.cache is not None:
+            yield self._output_all_config()
+            return
+
+        for chunk in self._iter_all_config():
+            yield chunk
+
+    # Whether the config is output before the facades registered after
+    # analysis. The config of debug never changes with facades.
+    def _is_config_stale(self):
+        return self._config_sent is not None \
+            and self._config_sent != len(self._facades) \
+            and not self._is_debug()
+
+    @tools.memoize('_get_identifier_hash')
+    def _output_all_config(self):
+        return ''.join(self._iter_all_config())
+
+    def _iter_all_config(self):
+        return Context._iter_join(self._get_joiner(), [
             '<script>',
             self._output_config(),
             '</script>'
         ])
 
+    # Outputs all facades, and only the facades which are not output before
+    # if called again.
+    @tools.instrument('output_facades')
     def output_facades(self):
+        if self._facades_sent:
+            facades = self._facades[self._facades_sent:]
+            self._facades_sent = len(self._facades)
+            if not facades:
+                return ''
+            return self._wrap_facades(facades)
+
+        self._facades_sent = len(self._facades)
+        return self._output_all_facades()
+
+    @tools.memoize('_get_identifier_hash')
+    def _output_all_facades(self):
+        return self._wrap_facades(self._facades)
+
+    def _wrap_facades(self, facades):
         return self._get_joiner().join([
             '<script>',
-            self._output_facades(),
+            self._output_facades(facades),
             '</script>'
         ])
 
@@ -147,11 +657,75 @@ class Neuron(object):
         return joiner
 
     # prevent duplicated analysis
-    @tools.before_analysis
     def analyze(self):
+        if not self._analyzed or self._pending_facades:
+            self._run_analysis()
+        return ''
+
+    @tools.instrument('analyze')
+    def _run_analysis(self):
+        if self._analyzed:
+            self._extend_analysis()
+            return
+
+        # combos will be cleaned after analysis,
+        # so the key should be created before that
+        self._analysis_key = self._get_analysis_key()
         self._analyzed = True
 
-        facade_module_ids = [module_id for module_id, data in self._facades]
+        page = self._get_compiled_outputs()
+        if page is not None:
+            self._prerendered = page
+            self._prerendered_csses = set(self._csses)
+            return
+
+        if self.engine.manifest is not None:
+            page = self.engine.manifest.get(
+                self._get_identifier_hash('page'))
+            if page is not None:
+                self._prerendered = page
+                self._prerendered_csses = set(self._csses)
+                return
+
+        self._analyze_facades()
+
+    # Analyzes the facades before the `end` index
+    def _analyze_facades(self, end=None):
+        key = self._analysis_key
+
+        if self.analysis_cache is not None:
+            cached = self.analysis_cache.get(key)
+            if cached is not None:
+                self._restore_analysis(cached)
+                self._record_plan(end)
+                return
+
+        self._analyze(end)
+
+        if self.analysis_cache is not None:
+            self.analysis_cache.set(key, self._dump_analysis())
+
+    # The analysis of a prerendered page is skipped until it is needed,
+    # such as by the facades registered after analysis
+    def _ensure_analysis(self):
+        if self._prerendered is None:
+            return
+
+        self._prerendered = None
+        self._analyze_facades(
+            len(self._facades) - len(self._pending_facades))
+
+        if self._scripts_sent:
+            self._sent.update(self._loaded)
+
+        # the csses of the packages are already in the prerendered output
+        if self._css_output:
+            self._csses_sent.update([
+                module.module_id(*css) for css in self._tree_csses
+            ])
+
+    def _analyze(self, end=None):
+        critical, deferred = self._split_facades(0, end)
 
         # _packages:
         # {
@@ -161,11 +735,19 @@ class Neuron(object):
 
         # _graph:
         # neuron.config.graph for javascript
-        self._packages, self._graph = self._walker.look_up(facade_module_ids)
+        walker = self._get_walker()
+        self._packages, self._graph = walker.look_up(critical)
+        self._deferred = self._extend_deferred(deferred)
+        self._tree_csses = tuple(walker.csses)
+        self._walked = True
 
         combos = self._combos
-        if not len(combos):
-            return
+        if self._use_planner():
+            self.planner.record(self._get_page_key(), self._packages)
+
+            # manual combos take precedence
+            if not combos:
+                combos = self.planner.combos()
 
         self._combos = []
         # self._combos
@@ -175,6 +757,165 @@ class Neuron(object):
             if len(combo):
                 self._combos.append(combo)
 
+        # Packages which are not comboed will be loaded one by one,
+        # and the `loaded` config never depends on whether
+        # `output_scripts()` is cached or not
+        for name in self._packages:
+            for version, path in self._packages[name]:
+                self._set_loaded(name, version, path)
+
+    # The analysis restored from the cache might never be recorded by
+    # the planner, so we walk again for the planner, only once per facades
+    def _record_plan(self, end=None):
+        if not self._use_planner():
+            return
+
+        facades = self._get_page_key()
+        if self.planner.has(facades):
+            return
+
+        selected, graph = self._get_walker().look_up([
+            module_id for module_id, data in self._facades[:end]
+        ])
+        self.planner.record(facades, selected)
+
+    # If debug, combos will not apply
+    def _use_planner(self):
+        return self.planner is not None and not self._is_debug()
+
+    # Walks down the facades registered after analysis, and only adds
+    # the packages which are not loaded yet
+    def _extend_analysis(self):
+        self._ensure_analysis()
+
+        facades = self._pending_facades
+        self._pending_facades = []
+
+        start = len(self._facades) - len(facades)
+        walker = self._get_walker()
+
+        # The graph restored from or saved to the analysis cache is shared,
+        # so we walk again to get a graph of our own
+        if not self._walked or (
+            self.analysis_cache is not None and not self._extended
+        ):
+            critical, deferred = self._split_facades(0, start)
+            walker.look_up(critical)
+            self._extend_deferred(deferred)
+            self._walked = True
+
+        self._extended = True
+        self._graph = walker.graph
+        self._encoded = {}
+
+        critical, deferred = self._split_facades(start)
+        added = walker.extend(critical)
+        deferred = self._extend_deferred(deferred)
+        if deferred:
+            self._deferred = self._deferred | deferred
+        self._tree_csses = tuple(walker.csses)
+
+        for name, version, path in added + list(deferred):
+            loaded_id = self._get_loaded_id(name, version, path)
+            if loaded_id in self._loaded:
+                # already loaded or comboed
+                continue
+
+            self._loaded.add(loaded_id)
+            if name not in self._packages:
+                self._packages[name] = set()
+            self._packages[name].add((version, path))
+
+    # Returns the module ids of the critical facades and
+    # the deferred facades, from the `start` index of `self._facades`
+    def _split_facades(self, start, end=None):
+        critical = []
+        deferred = []
+        if end is None:
+            end = len(self._facades)
+
+        for index in range(start, end):
+            module_id = self._facades[index][0]
+            if index in self._deferred_facades:
+                deferred.append(module_id)
+            else:
+                critical.append(module_id)
+        return critical, deferred
+
+    # Walks down the deferred facades after the critical ones, so that
+    # the modules also depended by critical facades are never deferred.
+    # Returns the frozenset of the newly selected `(name, version, path)`
+    def _extend_deferred(self, deferred):
+        if not deferred:
+            return frozenset()
+        return frozenset(self._get_walker().extend(deferred))
+
+    # The facades of the analysis key, by which the planner records pages
+    def _get_page_key(self):
+        facades, deferred, combos, debug = self._get_analysis_key()
+        if deferred:
+            return (facades, deferred)
+        return facades
+
+    # The canonical key of the analysis:
+    # different module ids of the same module, such as 'a' and 'a@*',
+    # and duplicate facades lead to the same result
+    def _get_analysis_key(self):
+        if self._analyzed:
+            return self._analysis_key
+
+        facades = []
+        deferred = []
+        for index, (module_id, data) in enumerate(self._facades):
+            parsed = module.parse_module_id(module_id)
+            parsed_facades = deferred \
+                if index in self._deferred_facades else facades
+            if parsed not in parsed_facades:
+                parsed_facades.append(parsed)
+
+        combos = tuple([
+            tuple([module.parse_module_id(id) for id in combo])
+            for combo in self._combos
+        ])
+
+        if not combos and self._use_planner():
+            # make sure the key of the plan is up to date
+            self.planner.combos()
+            combos = ('planner', self.planner.key)
+
+        return (
+            tuple(facades),
+            tuple(deferred),
+            combos,
+            bool(self._is_debug())
+        )
+
+    # The cached result is shared between threads, so it should never be
+    # changed. `_graph` is read-only after analysis.
+    def _dump_analysis(self):
+        return (
+            dict([
+                (name, frozenset(self._packages[name]))
+                for name in self._packages
+            ]),
+            self._graph,
+            frozenset(self._loaded),
+            tuple([tuple(combo) for combo in self._combos]),
+            self._encoded,
+            self._deferred,
+            self._tree_csses
+        )
+
+    def _restore_analysis(self, cached):
+        packages, self._graph, loaded, combos, self._encoded, \
+            self._deferred, self._tree_csses = cached
+        self._packages = dict([
+            (name, set(packages[name]))
+            for name in packages
+        ])
+        self._loaded = set(loaded)
+        self._combos = [list(combo) for combo in combos]
+
     def _clean_combo(self, combo):
         cleaned = []
 
@@ -211,62 +952,112 @@ class Neuron(object):
         return cleaned
 
     def _output_neuron(self):
-        return Neuron.decorate(self.resolve('neuron.js'), 'js', 'main')
+        return Context.decorate(self._resolve('neuron.js'), 'js', 'main')
 
-    @tools.nodebug
-    def _output_scripts(self):
-        output = []
-        self._decorate_combos_scripts(output)
-
-        for name in self._packages:
-            for version, path in self._packages[name]:
-                self._set_loaded(name, version, path)
-                self._decorate_script(output, (name, version, path))
+    def _iter_new_scripts(self):
+        # no facades are registered after the prerendered page
+        if self._is_debug() or self._prerendered is not None:
+            return
 
-        return ''.join(output)
+        new_scripts = self._new_scripts()
+        ids = [
+            module.module_id(*module_tuple)
+            for module_tuple in new_scripts
+        ]
+        self._prefetch(ids)
 
-    def _set_loaded(self, name, version, path):
-        if path:
-            self._loaded.add(module.module_id(name, version, path))
-        else:
-            self._loaded.add(module.package_id(name, version))
+        deferred = []
+        for module_tuple, id in zip(new_scripts, ids):
+            self._sent.add(self._get_loaded_id(*module_tuple))
+            if module_tuple in self._deferred:
+                deferred.append(id)
+                continue
+            yield self._decorate_script(id)
+
+        if deferred:
+            yield self._output_deferred(deferred)
+
+        # the config output before should also cover the new scripts
+        if self._is_config_stale():
+            self._config_sent = len(self._facades)
+            yield ''.join(self._iter_all_config())
+
+    # Returns the list of `(name, version, path)` which are not output yet
+    def _new_scripts(self):
+        return [
+            (name, version, path)
+            for name in self._packages
+            for version, path in self._packages[name]
+            if self._get_loaded_id(name, version, path) not in self._sent
+        ]
 
-    def _decorate_combos_scripts(self, output):
+    # Yields the ids to resolve of combos and then packages, a combo is
+    # a list of module ids
+    def _script_ids(self):
         for combo in self._combos:
             # should not combo a single file
             if len(combo) == 1:
-                self._decorate_script(output, combo[0])
+                yield module.module_id(*combo[0])
                 continue
 
-            joined_combo = [
+            yield [
                 module.module_id(*package)
                 for package in combo
             ]
 
-            script = Neuron.decorate(
-                self.resolve(joined_combo),
-                'js',
-                'async'
-            )
-            output.append(script)
+        for name in self._packages:
+            for version, path in self._packages[name]:
+                yield module.module_id(name, version, path)
 
-    def _decorate_script(self, output, module_tuple):
-        script = Neuron.decorate(
-            self.resolve(module.module_id(*module_tuple)),
+    # Splits the ids of `_script_ids()` into the critical ones and
+    # the deferred ones. A combo is deferred only if all of its modules are.
+    def _split_script_ids(self, ids):
+        if not self._deferred:
+            return ids, []
+
+        deferred_ids = set([
+            module.module_id(*module_tuple)
+            for module_tuple in self._deferred
+        ])
+
+        critical = []
+        deferred = []
+        for id in ids:
+            if all([
+                i in deferred_ids
+                for i in (id if type(id) is list else [id])
+            ]):
+                deferred.append(id)
+            else:
+                critical.append(id)
+        return critical, deferred
+
+    def _set_loaded(self, name, version, path):
+        self._loaded.add(self._get_loaded_id(name, version, path))
+
+    def _get_loaded_id(self, name, version, path):
+        return module.loaded_id(name, version, path)
+
+    # Loads the scripts after the load event of the page
+    def _output_deferred(self, ids):
+        urls = json.dumps([self._resolve(id) for id in ids])
+        return Context.DEFERRED_TEMPLATE % urls.replace('</', '<\\/')
+
+    def _decorate_script(self, id):
+        return Context.decorate(
+            self._resolve(id),
             'js',
             'async'
         )
-        output.append(script)
 
     USER_CONFIGS = ['path', 'resolve']
 
     def _output_config(self):
-        config = {
-            'loaded': self._json_dumps(list(self._loaded)),
-            'graph': self._json_dumps(self._graph)
-        } if not self._is_debug() else {}
+        config = {}
+        if not self._is_debug():
+            config['loaded'], config['graph'] = self._encode_config()
 
-        for key in Neuron.USER_CONFIGS:
+        for key in Context.USER_CONFIGS:
             c = self.js_config.get(key)
             if c:
                 config[key] = c
@@ -278,10 +1069,26 @@ class Neuron(object):
 
         return 'neuron.config({' + ','.join(config_pair) + '});'
 
-    def _output_facades(self):
+    # `_loaded` and `_graph` are encoded only once for each analysis result,
+    # and then each output only joins the encoded json.
+    # The analysis is shared by engines with different `compact_graph`,
+    # so `compact_graph` is a part of the encoding.
+    def _encode_config(self):
+        compact = self.engine.compact_graph
+        encoding = (bool(self._is_debug()), compact)
+        encoded = self._encoded.get(encoding)
+        if encoded is None:
+            encoded = self._encoded[encoding] = (
+                self._json_dumps(list(self._loaded)),
+                self._json_dumps(
+                    encode_graph(self._graph) if compact else self._graph)
+            )
+        return encoded
+
+    def _output_facades(self, facades):
         return '\n'.join([
             self._output_facade(module_id, data)
-            for module_id, data in self._facades
+            for module_id, data in facades
         ])
 
     def _output_facade(self, module_id, data):
@@ -295,23 +1102,210 @@ class Neuron(object):
             return json.dumps(obj, indent=2)
         return json.dumps(obj, separators=(',', ':'))
 
-    # creates the hash according to the facades
-    def _get_identifier_hash(self):
-        s = 'pyneuron:' + self.version + ':' + ','.join([
-            package_name for package_name, data in self._facades.sort()
-        ])
+    # creates the hash according to the facades, combos, csses and configs
+    # Returns `None` if the output should not be cached
+    def _get_identifier_hash(self, method_name):
+        # prevent saving cache for empty facades, and the analysis extended
+        # by late facades is not covered by the key
+        if not len(self._facades) or self._extended:
+            return
+
+        facades, deferred, combos, debug = self._get_analysis_key()
+        identifier = {
+            'facades': facades,
+            'combos': combos,
+            'csses': sorted(self._csses),
+            'js_config': self.js_config,
+            'debug': debug
+        }
+
+        if deferred:
+            identifier['deferred'] = deferred
+
+        if self.engine.compact_graph:
+            identifier['compact_graph'] = True
+
+        # Only the output of facades depends on the data of facades
+        if method_name == '_output_all_facades':
+            identifier['data'] = self._facades
 
         m = hashlib.sha1()
-        m.update(s)
-        return m.hexdigest()[0:8]
+        m.update(
+            json.dumps(identifier, sort_keys=True).encode('utf-8')
+        )
+
+        return ':'.join([
+            'pyneuron',
+            method_name,
+            self.version,
+            str(self.engine.tree.version),
+            m.hexdigest()
+        ])
+
+    # Resolves the id, and memoizes the url
+    def _resolve(self, id):
+        key = _url_key(id)
+        if key not in self._urls:
+            self._resolve_ids([id])
+        return self._urls[key]
+
+    # If `resolve_many` is defined, resolves `ids` and also the csses
+    # to output in one batch, so that it is called only once per render.
+    # Otherwise, ids are resolved one by one when output.
+    def _prefetch(self, ids):
+        if self.resolve_many is None:
+            return
+
+        ids = list(ids)
+        ids.extend(self._css_ids(self._csses_sent))
+        self._resolve_ids(ids)
+
+    def _resolve_ids(self, ids):
+        missing = self._get_missing(ids)
+        if not missing:
+            return
+
+        keys = list(missing)
+        if self.instrument is not None:
+            start = tools.timer()
+
+        if self.resolve_many is not None:
+            urls = self.resolve_many([missing[key] for key in keys])
+        else:
+            urls = [self.resolve(missing[key]) for key in keys]
+
+        self._set_resolved(keys, urls)
+
+        if self.instrument is not None:
+            self._report('resolve', {'time': tools.timer() - start}, keys)
+
+    # Adds the counts of the event to `data`, and calls the hook
+    def _report(self, event, data, result):
+        if event == 'resolve':
+            data['ids'] = len(result)
+
+        elif event == 'analyze':
+            data['cached'] = not self._walked
+
+        elif event.startswith('output_'):
+            data['bytes'] = len(result.encode('utf-8'))
+
+            if event == 'output_scripts':
+                data['scripts'] = result.count('<script')
+                data['combos'] = self._combos_output
+                self._combos_output = 0
+
+        self.instrument(event, data)
+
+    # Returns the dict of ids which are not resolved,
+    # neither in this request nor in `self.url_cache`
+    def _get_missing(self, ids):
+        cache = self.url_cache
+        resolver = self._get_resolver()
+        missing = {}
+
+        for id in ids:
+            key = _url_key(id)
+            if key in self._urls or key in missing:
+                continue
+
+            if cache is not None:
+                url = cache.get((resolver, key))
+                if url is not None:
+                    self._urls[key] = url
+                    continue
+
+            missing[key] = id
+        return missing
+
+    def _set_resolved(self, keys, urls):
+        cache = self.url_cache
+        resolver = self._get_resolver()
+        for key, url in zip(keys, urls):
+            self._urls[key] = url
+            if cache is not None:
+                cache.set((resolver, key), url)
+
+    # The function which actually resolves the urls, by which the urls are
+    # cached, so that engines with different resolvers never share urls
+    def _get_resolver(self):
+        if self.resolve_many is not None:
+            return self.resolve_many
+        return self.resolve
+
+    # Joins chunks lazily
+    @staticmethod
+    def _iter_join(joiner, chunks):
+        first = True
+        for chunk in chunks:
+            if not first and joiner:
+                yield joiner
+            first = False
+            yield chunk
 
     ASSET_TEMPLATE = {
         'js': '<script%s src="%s"></script>',
         'css': '<link%s rel="stylesheet" href="%s">',
+        'preload': '<link%s rel="preload" href="%s">',
         'other': '<img%s alt="" src="%s"/>'
     }
 
+    DEFERRED_TEMPLATE = (
+        '<script>(function(urls){'
+        'function load(){urls.forEach(function(url){'
+        'var s=document.createElement("script");s.async=true;s.src=url;'
+        'document.body.appendChild(s)})}'
+        'if(document.readyState==="complete"){load()}'
+        'else{window.addEventListener("load",load)}'
+        '})(%s);</script>'
+    )
+
     @staticmethod
     def decorate(url, type_, extra=''):
         extra = ' ' + extra if extra else ''
-        return Neuron.ASSET_TEMPLATE.get(type_) % (extra, url)
+        return Context.ASSET_TEMPLATE.get(type_) % (extra, url)
+
+
+class Neuron(Context):
+    '''
+    A context with an engine of its own, which accepts the arguments of
+    `Engine`. If `engine` is specified, the other arguments are ignored,
+    and the engine is shared.
+    '''
+
+    def __init__(self,
+                 dependency_tree = {},
+                 resolve         = None,
+                 debug           = False,
+                 version         = 0,
+                 cache           = None,
+                 js_config       = {},
+                 analysis_cache  = True,
+                 resolve_many    = None,
+                 url_cache       = True,
+                 planner         = None,
+                 instrument      = None,
+                 manifest        = None,
+                 compact_graph   = False,
+                 engine          = None):
+
+        if engine is None:
+            engine = Engine(
+                dependency_tree = dependency_tree,
+                resolve         = resolve,
+                debug           = debug,
+                version         = version,
+                cache           = cache,
+                js_config       = js_config,
+                analysis_cache  = analysis_cache,
+                resolve_many    = resolve_many,
+                url_cache       = url_cache,
+                planner         = planner,
+                instrument      = instrument,
+                manifest        = manifest,
+                compact_graph   = compact_graph)
+
+        Context.__init__(self, engine)
+
+        if not hasattr(engine.debug, '__call__'):
+            self.is_debug = engine.debug
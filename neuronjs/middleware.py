@@ -0,0 +1,212 @@
+# WSGI middleware, which creates a context for each request, and replaces
+# the placeholders of the outputs in html responses
+#
+# Placeholders:
+#   <!--neuron:css-->       n.output_css()
+#   <!--neuron:scripts-->   n.output_scripts()
+#   <!--neuron:config-->    n.output_config()
+#   <!--neuron:facades-->   n.output_facades(), after the scripts of the
+#                           facades registered after the head
+
+
+import re
+
+from .main import Context
+
+
+CSS = '<!--neuron:css-->'
+SCRIPTS = '<!--neuron:scripts-->'
+CONFIG = '<!--neuron:config-->'
+FACADES = '<!--neuron:facades-->'
+
+# The key of the context in the WSGI environ or the ASGI scope
+CONTEXT_KEY = 'neuronjs.context'
+
+PLACEHOLDERS = [
+    placeholder.encode('ascii')
+    for placeholder in (CSS, SCRIPTS, CONFIG, FACADES)
+]
+
+REGEX_PLACEHOLDER = re.compile(
+    b'<!--neuron:(css|scripts|config|facades)-->')
+
+MAX_PLACEHOLDER_LENGTH = max([len(p) for p in PLACEHOLDERS])
+
+
+# Returns the output of the placeholder named `name`.
+# Outputs are joined from the generators, so that an `AsyncNeuron`
+# could also render after `prepare()`
+def render(n, name):
+    if name == 'css':
+        return ''.join(n.iter_css())
+    if name == 'scripts':
+        return ''.join(n.iter_scripts())
+    if name == 'config':
+        return ''.join(n.iter_config())
+    return render_facades(n)
+
+
+# Returns the facades, after the csses, the scripts and the updated config
+# of the facades which are registered after the outputs of the head
+def render_facades(n):
+    return ''.join(n.iter_css()) + ''.join(n.iter_scripts()) \
+        + n.output_facades()
+
+
+class Injector(object):
+    '''
+    Replaces the placeholders in the chunks of a response body.
+
+    Each placeholder is replaced as soon as it is reached, so the response
+    is never held. Facades registered after the outputs of the head are
+    output at `<!--neuron:facades-->`, with their scripts and the updated
+    config, or at `close()` if they are registered after that.
+    '''
+
+    def __init__(self, n, encoding='utf-8'):
+        self.n = n
+        self.encoding = encoding
+
+        # the end of the last chunk, which might be the start of a
+        # placeholder split by chunks
+        self._tail = b''
+
+        # whether any placeholder is replaced
+        self._rendered = False
+
+    # Returns the list of bytes to send for the chunk
+    def feed(self, chunk):
+        return self._scan(self._tail + chunk, False)
+
+    # Whether `feed(chunk)` replaces placeholders, before which the urls
+    # of an `AsyncNeuron` should be resolved
+    def will_render(self, chunk):
+        return REGEX_PLACEHOLDER.search(self._tail + chunk) is not None
+
+    # Returns the list of bytes to send at the end of the body
+    def close(self):
+        data = self._tail
+        self._tail = b''
+        chunks = self._scan(data, True)
+
+        n = self.n
+        if self._rendered and len(n._facades) > n._facades_sent:
+            chunks.append(render_facades(n).encode(self.encoding))
+        return chunks
+
+    def _scan(self, data, final):
+        chunks = []
+        position = 0
+
+        for match in REGEX_PLACEHOLDER.finditer(data):
+            chunks.append(data[position:match.start()])
+            chunks.append(self._render(match.group(1)))
+            position = match.end()
+
+        rest = data[position:]
+        tail = b'' if final else Injector._get_tail(rest)
+        self._tail = tail
+        chunks.append(rest[:len(rest) - len(tail)])
+        return [chunk for chunk in chunks if chunk]
+
+    def _render(self, name):
+        self._rendered = True
+        return render(self.n, name.decode('ascii')).encode(self.encoding)
+
+    # Returns the end of `data` which is the start of a placeholder
+    @staticmethod
+    def _get_tail(data):
+        for length in range(
+            min(len(data), MAX_PLACEHOLDER_LENGTH - 1), 0, -1
+        ):
+            tail = data[-length:]
+            for placeholder in PLACEHOLDERS:
+                if placeholder.startswith(tail):
+                    return tail
+        return b''
+
+
+# Returns `(is html, encoding)` of the value of the Content-Type header
+def parse_content_type(content_type):
+    parts = content_type.split(';')
+    if parts[0].strip().lower() != 'text/html':
+        return False, None
+
+    encoding = 'utf-8'
+    for part in parts[1:]:
+        key, sep, value = part.partition('=')
+        if key.strip().lower() == 'charset' and value.strip():
+            encoding = value.strip().strip('"')
+    return True, encoding
+
+
+class NeuronMiddleware(object):
+    '''
+    WSGI middleware, which creates a context of `engine` for each request
+    as `environ['neuronjs.context']`, and replaces the placeholders in the
+    bodies of html responses:
+
+        app = NeuronMiddleware(app, engine)
+
+        def view(environ, start_response):
+            n = environ['neuronjs.context']
+            ...
+
+    - `create_context(engine)` creates the context, `Context` by default
+    - `Content-Length` is removed from html responses, of which the length
+      is changed
+    '''
+
+    def __init__(self, app, engine, create_context=Context):
+        self.app = app
+        self.engine = engine
+        self.create_context = create_context
+
+    def __call__(self, environ, start_response):
+        n = environ[CONTEXT_KEY] = self.create_context(self.engine)
+
+        # the encoding of the html response, or `None` if not html
+        state = {
+            'encoding': None
+        }
+
+        def _start_response(status, headers, exc_info=None):
+            is_html = False
+            for key, value in headers:
+                if key.lower() == 'content-type':
+                    is_html, encoding = parse_content_type(value)
+
+            state['encoding'] = None
+            if is_html:
+                state['encoding'] = encoding
+                headers = [
+                    (key, value)
+                    for key, value in headers
+                    if key.lower() != 'content-length'
+                ]
+            return start_response(status, headers, exc_info)
+
+        body = self.app(environ, _start_response)
+        return self._iter_body(n, body, state)
+
+    def _iter_body(self, n, body, state):
+        injector = None
+        try:
+            for chunk in body:
+                # `start_response` might be called by the first iteration
+                if injector is None:
+                    if state['encoding'] is None:
+                        yield chunk
+                        continue
+
+                    injector = Injector(n, state['encoding'])
+
+                for data in injector.feed(chunk):
+                    yield data
+
+            if injector is not None:
+                for data in injector.close():
+                    yield data
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
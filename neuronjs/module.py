@@ -2,6 +2,72 @@
 
 
 import re
+from operator import itemgetter
+
+from .cache import LRUCache
+from .semver import VersionIndex
+
+try:
+    # python 2, in which only `str` could be interned, and the ids and
+    # the trees from `json.loads` are `unicode`
+    _intern = intern
+
+    def intern(string):
+        if type(string) is str:
+            return _intern(string)
+        return string
+
+except NameError:
+    from sys import intern
+
+
+# The max number of ids to keep in each of the caches below
+MAX_CACHED_IDS = 65536
+
+# (name, version, path) -> ModuleId
+_interned = LRUCache(MAX_CACHED_IDS)
+
+# module id -> ModuleId
+_parsed = LRUCache(MAX_CACHED_IDS)
+
+
+class ModuleId(tuple):
+    '''
+    The parsed `(name, version, path)` of a module id.
+
+    `parse_module_id()` returns the same object for the same module, such as
+    'a', 'a@*' and 'a@*/', as long as the module is cached, so that it is
+    cheap to compare and hash, and it could still be unpacked and compared
+    as a plain tuple.
+    '''
+
+    __slots__ = ()
+
+    def __new__(cls, name, version='*', path=''):
+        return tuple.__new__(cls, (name, version, path))
+
+    def __getnewargs__(self):
+        return tuple(self)
+
+    name = property(itemgetter(0))
+    version = property(itemgetter(1))
+    path = property(itemgetter(2))
+
+    def __str__(self):
+        return module_id(*self)
+
+    def __repr__(self):
+        return 'ModuleId(%r, %r, %r)' % tuple(self)
+
+
+# Returns the interned `ModuleId`
+def intern_module_id(name, version='*', path=''):
+    key = (name, version, path)
+    parsed = _interned.get(key)
+    if parsed is None:
+        parsed = _interned.setdefault(
+            key, ModuleId(intern(name), intern(version), path))
+    return parsed
 
 
 # format to module id
@@ -15,6 +81,15 @@ def module_id(name, version, path=''):
     return package_id(name, version) + path
 
 
+# format to the id in `neuron.config.loaded`
+# 'a', '1.0.0', '' -> 'a@1.0.0'
+# 'a', '1.0.0', '/b.js' -> 'a@1.0.0/b.js'
+def loaded_id(name, version, path=''):
+    if path:
+        return module_id(name, version, path)
+    return package_id(name, version)
+
+
 def normalize_id(id):
     return module_id(*parse_module_id(id))
 
@@ -34,9 +109,18 @@ REGEX_MODULE_ID = re.compile(
         $""",
     re.X)
 
+# Parses a module id into an interned `ModuleId` of (name, version, path)
 def parse_module_id(id):
+    parsed = _parsed.get(id)
+    if parsed is None:
+        parsed = _parse_module_id(id)
+        _parsed.set(id, parsed)
+    return parsed
+
+
+def _parse_module_id(id):
     # there will always a match
-    m = re.match(REGEX_MODULE_ID, id)
+    m = REGEX_MODULE_ID.match(id)
 
     if not m:
         raise ValueError('Invalid module id: "' + id + '", format: <name>[@<version>][/<path>]')
@@ -46,15 +130,17 @@ def parse_module_id(id):
     if path == '/':
         path = ''
 
-    return (
+    return intern_module_id(
         m.group(1),
         # version default to '*'
         m.group(2) or '*',
         path)
 
-# returns the max satisfied version of the range
+# returns the max satisfied version of the range, or `None`
 # @param {str} r Range
 # @param {list} versions The list of existing versions
+#
+# To resolve ranges against the same versions repeatedly,
+# use `semver.VersionIndex` instead
 def max_satisfying(r, versions):
-    # returns the range directly temporarily for now
-    return r
+    return VersionIndex(versions).max_satisfying(r)
@@ -0,0 +1,116 @@
+# Combo planner
+
+
+import json
+import hashlib
+import threading
+
+from . import module
+
+
+class ComboPlanner(object):
+    '''
+    Plans combos from the packages which are selected together.
+
+    `Neuron` records the selected modules of each facade set. Modules which
+    are always selected by the same facade sets are planned into one combo,
+    so that a page never loads modules it does not need, and a combo shared
+    by several pages is cached by the browser across these pages.
+
+    The plan could be exported, and then loaded in production as a fixed
+    plan, which will not change by recording.
+    '''
+
+    def __init__(self, max_pages=1024, min_size=2):
+        self.max_pages = max_pages
+
+        # groups smaller than `min_size` will not be comboed
+        self.min_size = min_size
+
+        # tuple.<facade> -> frozenset.<module id>
+        self._pages = {}
+        self._lock = threading.Lock()
+
+        self._combos = []
+        self._dirty = False
+        self.fixed = False
+
+        # identifies the current plan
+        self.key = ComboPlanner._get_key(self._combos)
+
+    # Whether the facade set needs not to be recorded
+    def has(self, facades):
+        return self.fixed or facades in self._pages
+
+    # @param {tuple} facades the canonical facades
+    # @param {dict} selected, see `Walker.look_up()`
+    def record(self, facades, selected):
+        if self.fixed:
+            return
+
+        module_ids = frozenset([
+            module.loaded_id(name, version, path)
+            for name in selected
+            for version, path in selected[name]
+        ])
+
+        with self._lock:
+            if self._pages.get(facades) == module_ids:
+                return
+
+            if facades not in self._pages \
+                    and len(self._pages) >= self.max_pages:
+                return
+
+            self._pages[facades] = module_ids
+            self._dirty = True
+
+    # Returns the list of combos, each of which is a list of module ids
+    def combos(self):
+        if self._dirty:
+            with self._lock:
+                if self._dirty:
+                    self._combos = self._plan()
+                    self.key = ComboPlanner._get_key(self._combos)
+                    self._dirty = False
+        return self._combos
+
+    def _plan(self):
+        # module id -> list.<facades>, the pages on which a module is loaded
+        signatures = {}
+        for facades in self._pages:
+            for module_id in self._pages[facades]:
+                signatures.setdefault(module_id, []).append(facades)
+
+        groups = {}
+        for module_id in signatures:
+            signature = frozenset(signatures[module_id])
+            groups.setdefault(signature, []).append(module_id)
+
+        combos = [
+            sorted(group)
+            for group in groups.values()
+            if len(group) >= self.min_size
+        ]
+        combos.sort()
+        return combos
+
+    def export(self):
+        return {
+            'combos': self.combos()
+        }
+
+    # Creates a planner with a fixed plan from `planner.export()`
+    @staticmethod
+    def load(data):
+        planner = ComboPlanner()
+        planner.fixed = True
+        planner._combos = [list(combo) for combo in data['combos']]
+        planner.key = ComboPlanner._get_key(planner._combos)
+        return planner
+
+    @staticmethod
+    def _get_key(combos):
+        m = hashlib.sha1()
+        m.update(json.dumps(combos).encode('utf-8'))
+        return m.hexdigest()[0:16]
@@ -0,0 +1,128 @@
+# Prerenders the outputs of pages at build time
+#
+# A page is a dict of the facades, combos and csses to register:
+# {
+#   "facades": ["home", "b@^1.0.0"],
+#   "defer": ["comments"],
+#   "combos": [["b", "c"]],
+#   "css": ["home/home.css", ["b/b.css", "c/c.css"]]
+# }
+#
+# The manifest could be passed to `Neuron(manifest=...)`, and then the
+# outputs of the pages are looked up from it instead of being analyzed.
+
+
+import json
+import importlib
+
+from .files import MANIFEST_VERSION, read_json, write_json, load_manifest
+from .main import Engine, Context
+from .tree import compile_tree
+
+
+def _register(n, page):
+    for module_id in page.get('facades', []):
+        n.facade(module_id)
+
+    for module_id in page.get('defer', []):
+        n.facade(module_id, defer=True)
+
+    for combo in page.get('combos', []):
+        n.combo(*combo)
+
+    for css in page.get('css', []):
+        if isinstance(css, list):
+            n.css(*css)
+        else:
+            n.css(css)
+
+
+# Returns the outputs of the context in which a page is registered
+def prerender(n):
+    return {
+        'scripts': n.output_scripts(),
+        'config': n.output_config(),
+        'css': n.output_css()
+    }
+
+
+# Returns the manifest of the prerendered `output_scripts()`,
+# `output_config()` and `output_css()` of `pages`
+# @param {list} pages
+# @param {dict} options the arguments of `Engine` to render with, which
+#   should be the same as those at runtime
+def precompile(dependency_tree, pages, **options):
+    options['dependency_tree'] = dependency_tree
+    options['analysis_cache'] = False
+    options['url_cache'] = False
+    engine = Engine(**options)
+
+    prerendered = {}
+    for page in pages:
+        n = Context(engine)
+        _register(n, page)
+
+        page_id = n._get_identifier_hash('page')
+        if page_id is None:
+            # a page without facades
+            continue
+
+        prerendered[page_id] = prerender(n)
+
+    return {
+        'manifest_version': MANIFEST_VERSION,
+        'tree_version': engine.tree.version,
+        'pages': prerendered
+    }
+
+
+# Imports a function by `'<module>:<name>'`
+def import_function(spec):
+    module_name, sep, name = spec.partition(':')
+    if not sep or not name:
+        raise ValueError(
+            'Invalid function "%s", format: <module>:<name>' % spec)
+    return getattr(importlib.import_module(module_name), name)
+
+
+def main(args):
+    tree = read_json(args.tree)
+    pages = read_json(args.pages)
+
+    options = {
+        'debug': args.debug,
+        'version': args.version,
+        'js_config': json.loads(args.js_config) if args.js_config else {},
+        'compact_graph': args.compact_graph
+    }
+
+    if args.resolve:
+        options['resolve'] = import_function(args.resolve)
+    if args.resolve_many:
+        options['resolve_many'] = import_function(args.resolve_many)
+
+    manifest = precompile(compile_tree(tree), pages, **options)
+
+    write_json(manifest, args.output)
+    return 0
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        '--tree', required=True, help='the json file of the dependency tree')
+    parser.add_argument(
+        '--pages', required=True, help='the json file of the list of pages')
+    parser.add_argument(
+        '--output', required=True, help='the manifest file to write')
+    parser.add_argument(
+        '--resolve', metavar='MODULE:NAME', help='the resolve function')
+    parser.add_argument(
+        '--resolve-many', metavar='MODULE:NAME',
+        help='the resolve_many function')
+    parser.add_argument(
+        '--js-config', help='the js_config as a json object')
+    parser.add_argument('--version', default=0)
+    parser.add_argument('--debug', action='store_true')
+    parser.add_argument(
+        '--compact-graph', action='store_true',
+        help='encodes the graph compactly, see `neuronjs.graph`')
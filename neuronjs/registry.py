@@ -0,0 +1,97 @@
+# Registry of the dependency trees of several versions
+
+
+import threading
+from collections import OrderedDict
+
+from .tree import CompiledTree
+
+
+class TreeRegistry(object):
+    '''
+    Keeps the compiled trees of several versions alive in one process, such
+    as during canary or blue/green deploys, keyed by the `_version` of the
+    trees:
+
+        registry = TreeRegistry()
+        registry.add(tree_v1)
+        registry.add(tree_v2, current=False)
+
+        def handler(request):
+            tree = registry.get(request.cookies.get('tree_version'))
+            n = Neuron(dependency_tree=tree, ...)
+
+    Each tree is compiled based on the current one, so the packages which
+    are not changed between the versions are shared by them, and the
+    memory grows with the changes of the trees rather than the number of
+    versions. At most `max_versions` versions are kept, the least recently
+    added ones are removed first, except the current one.
+    '''
+
+    def __init__(self, max_versions=3):
+        self.max_versions = max_versions
+
+        # version -> CompiledTree
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+
+        # the version of `get()` by default
+        self.current = None
+
+    # Compiles and adds the tree, and returns the compiled tree.
+    # If a tree of the same version is already added, it is returned.
+    # @param {dict} tree which should have `_version`
+    # @param {bool} current whether the tree becomes the current version
+    def add(self, tree, current=True):
+        version = tree.get('_version')
+        if version is None:
+            raise ValueError('the dependency tree has no _version')
+
+        with self._lock:
+            compiled = self._trees.get(version)
+            if compiled is None:
+                base = self._trees.get(self.current)
+                compiled = CompiledTree(tree, base=base)
+                self._trees[version] = compiled
+
+            if current or self.current is None:
+                self.current = version
+
+            while len(self._trees) > self.max_versions:
+                for oldest in self._trees:
+                    if oldest != self.current:
+                        break
+                self._trees.pop(oldest)
+
+            return compiled
+
+    # Returns the compiled tree of `version`, or the current one if
+    # `version` is `None` or not in the registry
+    def get(self, version=None):
+        trees = self._trees
+        compiled = trees.get(version) if version is not None else None
+        if compiled is None:
+            compiled = trees.get(self.current)
+        return compiled
+
+    # Sets the version of `get()` by default
+    def use(self, version):
+        with self._lock:
+            if version not in self._trees:
+                raise KeyError(version)
+            self.current = version
+
+    def remove(self, version):
+        with self._lock:
+            if version == self.current:
+                raise ValueError('could not remove the current version')
+            self._trees.pop(version, None)
+
+    def versions(self):
+        return list(self._trees)
+
+    def __contains__(self, version):
+        return version in self._trees
+
+    def __len__(self):
+        return len(self._trees)
@@ -0,0 +1,404 @@
+# Semantic versions and ranges
+#
+# Supports the range syntax of node-semver:
+#   '1.2.3', '=1.2.3', '>1.2.3', '>=1.2', '<2', '<=1.2.x',
+#   '~1.2.3', '~1.2', '^0.2.3', '1.x', '1.2.*', '*', '',
+#   '1.2.3 - 2.3', '>=1.0.0 <2.0.0', '1.x || >=2.5.0'
+
+
+import re
+import bisect
+
+
+REGEX_VERSION = re.compile(
+    r"""^\s*v?=?\s*
+        (\d+)\.(\d+)\.(\d+)                 # major, minor, patch
+        (?:-([0-9A-Za-z.-]+))?              # prerelease
+        (?:\+[0-9A-Za-z.-]+)?               # build metadata
+        \s*$""",
+    re.X)
+
+REGEX_PARTIAL = re.compile(
+    r"""^v?=?
+        (\d+|[xX*])
+        (?:
+            \.(\d+|[xX*])
+            (?:
+                \.(\d+|[xX*])
+                (?:-([0-9A-Za-z.-]+))?
+                (?:\+[0-9A-Za-z.-]+)?
+            )?
+        )?$""",
+    re.X)
+
+REGEX_HYPHEN = re.compile(r'^\s*(\S+)\s+-\s+(\S+)\s*$')
+
+REGEX_COMPARATOR = re.compile(r'^(~>?|\^|[<>]=?|=)?(.*)$')
+
+# '>= 1.2.3' -> '>=1.2.3'
+REGEX_OPERATOR_SPACE = re.compile(r'(~>?|\^|[<>]=?|=)\s+')
+
+# The key of the release version sorts after all of its prereleases
+RELEASE = (1,)
+
+# A comparator set which matches nothing
+NOTHING = None
+
+
+def _prerelease_key(prerelease):
+    if not prerelease:
+        return RELEASE
+
+    identifiers = [0]
+    for identifier in prerelease.split('.'):
+        # numeric identifiers always have lower precedence
+        if identifier.isdigit():
+            identifiers.append((0, int(identifier)))
+        else:
+            identifiers.append((1, identifier))
+    return tuple(identifiers)
+
+
+# Parses a version into a sortable key:
+# '1.2.3-beta.1' -> (1, 2, 3, (0, (1, 'beta'), (0, 1)))
+# Returns `None` if `version` is not a valid semver
+def parse_version(version):
+    m = REGEX_VERSION.match(version)
+    if not m:
+        return
+
+    return (
+        int(m.group(1)),
+        int(m.group(2)),
+        int(m.group(3)),
+        _prerelease_key(m.group(4))
+    )
+
+
+def is_prerelease(key):
+    return key[3] != RELEASE
+
+
+def _parse_partial(partial):
+    m = REGEX_PARTIAL.match(partial)
+    if not m:
+        raise ValueError('Invalid version "%s"' % partial)
+
+    numbers = []
+    for group in m.groups()[:3]:
+        # Everything after a wildcard is a wildcard
+        if group is None or not group.isdigit() or None in numbers:
+            numbers.append(None)
+        else:
+            numbers.append(int(group))
+
+    major, minor, patch = numbers
+    prerelease = m.group(4) if patch is not None else None
+    return major, minor, patch, prerelease
+
+
+def _key(major, minor=0, patch=0, prerelease=None):
+    return (major, minor or 0, patch or 0, _prerelease_key(prerelease))
+
+
+# A comparator is a tuple of `(operator, key)`,
+# in which `operator` is one of '>', '>=', '<', '<=' and '='
+def _xrange(operator, partial):
+    major, minor, patch, prerelease = _parse_partial(partial)
+
+    if operator in ('', '='):
+        if major is None:
+            return []
+        if minor is None:
+            return [('>=', _key(major)), ('<', _key(major + 1))]
+        if patch is None:
+            return [('>=', _key(major, minor)), ('<', _key(major, minor + 1))]
+        return [('=', _key(major, minor, patch, prerelease))]
+
+    if operator == '>':
+        if major is None:
+            return NOTHING
+        if minor is None:
+            return [('>=', _key(major + 1))]
+        if patch is None:
+            return [('>=', _key(major, minor + 1))]
+        return [('>', _key(major, minor, patch, prerelease))]
+
+    if operator == '>=':
+        if major is None:
+            return []
+        return [('>=', _key(major, minor, patch, prerelease))]
+
+    if operator == '<':
+        if major is None:
+            return NOTHING
+        return [('<', _key(major, minor, patch, prerelease))]
+
+    # '<='
+    if major is None:
+        return []
+    if minor is None:
+        return [('<', _key(major + 1))]
+    if patch is None:
+        return [('<', _key(major, minor + 1))]
+    return [('<=', _key(major, minor, patch, prerelease))]
+
+
+def _tilde(partial):
+    major, minor, patch, prerelease = _parse_partial(partial)
+
+    if major is None:
+        return []
+    if minor is None:
+        return [('>=', _key(major)), ('<', _key(major + 1))]
+    return [
+        ('>=', _key(major, minor, patch, prerelease)),
+        ('<', _key(major, minor + 1))
+    ]
+
+
+def _caret(partial):
+    major, minor, patch, prerelease = _parse_partial(partial)
+
+    if major is None:
+        return []
+    if minor is None:
+        return [('>=', _key(major)), ('<', _key(major + 1))]
+
+    lower = ('>=', _key(major, minor, patch, prerelease))
+    if major:
+        return [lower, ('<', _key(major + 1))]
+    if minor or patch is None:
+        return [lower, ('<', _key(0, minor + 1))]
+    return [lower, ('<', _key(0, 0, patch + 1))]
+
+
+def _hyphen(lower, upper):
+    major, minor, patch, prerelease = _parse_partial(lower)
+    comparators = []
+    if major is not None:
+        comparators.append(('>=', _key(major, minor, patch, prerelease)))
+
+    return comparators + _xrange('<=', upper)
+
+
+def _parse_comparator(comparator):
+    m = REGEX_COMPARATOR.match(comparator)
+    operator, partial = m.group(1) or '', m.group(2)
+
+    if operator.startswith('~'):
+        return _tilde(partial)
+    if operator == '^':
+        return _caret(partial)
+    return _xrange(operator, partial)
+
+
+# Intersects comparators into an interval:
+# (lower key, inclusive, upper key, inclusive, prerelease tuples)
+# `None` of a key means unbounded.
+def _to_interval(comparators):
+    lower = upper = None
+    lower_inclusive = upper_inclusive = True
+
+    # [major, minor, patch] of the prereleases which could be matched
+    prereleases = set()
+
+    for operator, key in comparators:
+        if is_prerelease(key):
+            prereleases.add(key[:3])
+
+        if operator in ('>', '>=', '='):
+            inclusive = operator != '>'
+            if lower is None or key > lower or (
+                key == lower and not inclusive
+            ):
+                lower, lower_inclusive = key, inclusive
+
+        if operator in ('<', '<=', '='):
+            inclusive = operator != '<'
+            if upper is None or key < upper or (
+                key == upper and not inclusive
+            ):
+                upper, upper_inclusive = key, inclusive
+
+    if lower is not None and upper is not None:
+        if lower > upper or (
+            lower == upper and not (lower_inclusive and upper_inclusive)
+        ):
+            return NOTHING
+
+    return (
+        lower, lower_inclusive,
+        upper, upper_inclusive,
+        frozenset(prereleases)
+    )
+
+
+MAX_CACHED_RANGES = 4096
+
+_parsed_ranges = {}
+
+
+# Parses a range into a list of intervals, which are or-ed
+# Raises `ValueError` if the range is invalid
+def parse_range(range_):
+    if range_ in _parsed_ranges:
+        return _parsed_ranges[range_]
+
+    intervals = []
+    for part in range_.split('||'):
+        m = REGEX_HYPHEN.match(part)
+        if m:
+            comparators = _hyphen(m.group(1), m.group(2))
+        else:
+            comparators = []
+            part = REGEX_OPERATOR_SPACE.sub(r'\1', part.strip())
+            for comparator in part.split():
+                parsed = _parse_comparator(comparator)
+                if parsed is NOTHING:
+                    comparators = NOTHING
+                    break
+                comparators.extend(parsed)
+
+        if comparators is NOTHING:
+            continue
+
+        interval = _to_interval(comparators)
+        if interval is not NOTHING:
+            intervals.append(interval)
+
+    if len(_parsed_ranges) >= MAX_CACHED_RANGES:
+        _parsed_ranges.clear()
+    _parsed_ranges[range_] = intervals
+
+    return intervals
+
+
+def satisfies(version, range_):
+    key = parse_version(version)
+    if key is None:
+        return False
+
+    try:
+        intervals = parse_range(range_)
+    except ValueError:
+        return False
+
+    for interval in intervals:
+        if _in_interval(key, interval):
+            return True
+    return False
+
+
+def _in_interval(key, interval):
+    lower, lower_inclusive, upper, upper_inclusive, prereleases = interval
+
+    if lower is not None and (
+        key < lower or key == lower and not lower_inclusive
+    ):
+        return False
+
+    if upper is not None and (
+        key > upper or key == upper and not upper_inclusive
+    ):
+        return False
+
+    return not is_prerelease(key) or key[:3] in prereleases
+
+
+MAX_CACHED_RESULTS = 1024
+
+
+class VersionIndex(object):
+    '''
+    The sorted index of the versions of a package.
+
+    Versions are parsed only once, and `max_satisfying()` finds the version
+    by binary search and memoizes the result of each range.
+    '''
+
+    def __init__(self, versions):
+        versions = list(versions)
+        self._versions = set(versions)
+
+        parsed = []
+        for version in versions:
+            key = parse_version(version)
+            if key is not None:
+                parsed.append((key, version))
+        parsed.sort()
+
+        # all valid versions
+        self.keys = [key for key, version in parsed]
+        self.versions = [version for key, version in parsed]
+
+        # versions without prereleases, which are searched for most ranges
+        self.release_keys = [
+            key for key, version in parsed if not is_prerelease(key)
+        ]
+        self.release_versions = [
+            version for key, version in parsed if not is_prerelease(key)
+        ]
+
+        self._results = {}
+
+    def max_satisfying(self, range_):
+        try:
+            return self._results[range_]
+        except KeyError:
+            pass
+
+        result = self._max_satisfying(range_)
+        if len(self._results) >= MAX_CACHED_RESULTS:
+            self._results.clear()
+        self._results[range_] = result
+        return result
+
+    def _max_satisfying(self, range_):
+        # Versions which are not semver, such as '*', could only be matched
+        # by themselves
+        if range_ in self._versions:
+            return range_
+
+        try:
+            intervals = parse_range(range_)
+        except ValueError:
+            return
+
+        best_key = None
+        best = None
+        for interval in intervals:
+            found = self._search(interval)
+            if found and (best_key is None or found[0] > best_key):
+                best_key, best = found
+        return best
+
+    def _search(self, interval):
+        lower, lower_inclusive, upper, upper_inclusive, prereleases = interval
+
+        if prereleases:
+            keys, versions = self.keys, self.versions
+        else:
+            keys, versions = self.release_keys, self.release_versions
+
+        if upper is None:
+            i = len(keys)
+        elif upper_inclusive:
+            i = bisect.bisect_right(keys, upper)
+        else:
+            i = bisect.bisect_left(keys, upper)
+
+        while i > 0:
+            i -= 1
+            key = keys[i]
+            if lower is not None and (
+                key < lower or key == lower and not lower_inclusive
+            ):
+                return
+
+            # A prerelease only satisfies the range if a comparator
+            # has the prerelease of the same [major, minor, patch]
+            if is_prerelease(key) and key[:3] not in prereleases:
+                continue
+
+            return key, versions[i]
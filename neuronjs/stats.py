@@ -0,0 +1,64 @@
+# Aggregated statistics of instrumentation
+
+
+import threading
+
+
+class Stats(object):
+    '''
+    Aggregates the events reported by `Neuron(instrument=...)`, and could be
+    shared by all instances:
+
+        stats = Stats()
+        n = Neuron(..., instrument=stats)
+        stats.report()
+
+    For each event, it sums up the time and the counts of the data, and
+    keeps the max of the time and the data named `max_*`. If `hook` is
+    specified, events are also passed to it.
+    '''
+
+    def __init__(self, hook=None):
+        self.hook = hook
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event, data):
+        with self._lock:
+            entry = self._events.get(event)
+            if entry is None:
+                entry = self._events[event] = {
+                    'count': 0,
+                    'time': 0.0,
+                    'max_time': 0.0
+                }
+
+            entry['count'] += 1
+            for key in data:
+                value = data[key]
+                if key == 'time':
+                    entry['time'] += value
+                    if value > entry['max_time']:
+                        entry['max_time'] = value
+                elif key.startswith('max_'):
+                    entry[key] = max(entry.get(key, 0), value)
+                else:
+                    entry[key] = entry.get(key, 0) + value
+
+        if self.hook is not None:
+            self.hook(event, data)
+
+    # Returns `event -> dict` of the aggregated data,
+    # with the mean time of each event
+    def report(self):
+        with self._lock:
+            report = {}
+            for event in self._events:
+                entry = dict(self._events[event])
+                entry['mean_time'] = entry['time'] / entry['count']
+                report[event] = entry
+            return report
+
+    def reset(self):
+        with self._lock:
+            self._events.clear()
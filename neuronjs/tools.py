@@ -1,31 +1,60 @@
 # decorators
 
 
+import time
 import functools
 
+from .cache import KeyLocks
+
+_key_locks = KeyLocks()
+
+try:
+    timer = time.perf_counter
+except AttributeError:
+    # python 2
+    timer = time.time
+
+
 # Memoize the result of the function
 def memoize(cache_key_getter):
     """ Decorator: memoize the result of a function by
         the key which is generated from `cache_key_getter`
 
-        - cache_key_getter `String|function()`
+        - cache_key_getter `String` the name of the method which accepts
+          the name of the decorated function and returns the key, or `None`
+          if the result should not be cached
+
+        Concurrent misses of the same key will only run the function once.
     """
 
     def decorator(fn):
+        name = fn.__name__
+
         @functools.wraps(fn)
         def wrapper(self, *args):
-            # prevent saving cache for empty facades
-            if not self.cache or not len(self.facades):
+            if self.cache is None:
                 return fn(self, *args)
 
-            hash_id = getattr(self, cache_key_getter)()
-            result = self.cache.get(hash_id);
-            if result:
+            # `None` means the result should not be cached
+            hash_id = getattr(self, cache_key_getter)(name)
+            if hash_id is None:
+                return fn(self, *args)
+
+            cache = self.cache
+            result = cache.get(hash_id)
+            if result is not None:
                 return result
 
-            result = fn(self, *args)
-            self.cache.save(hash_id, result)
-            return result
+            with _key_locks.hold(hash_id):
+                # The result might be saved while we are waiting for the lock
+                if cache.has(hash_id):
+                    result = cache.get(hash_id)
+                    if result is not None:
+                        return result
+
+                result = fn(self, *args)
+                cache.set(hash_id, result)
+                return result
         return wrapper
     return decorator
 
@@ -46,3 +75,20 @@ def nodebug(fn):
             return ''
         return fn(self, *args)
     return method
+
+
+# Times the method and reports it by `self._report(event, data, result)`,
+# only if `self.instrument` is set
+def instrument(event):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def method(self, *args):
+            if self.instrument is None:
+                return fn(self, *args)
+
+            start = timer()
+            result = fn(self, *args)
+            self._report(event, {'time': timer() - start}, result)
+            return result
+        return method
+    return decorator
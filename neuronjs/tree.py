@@ -0,0 +1,429 @@
+# Compiled dependency tree
+
+
+import threading
+from collections import OrderedDict
+
+from . import module
+from .cache import LRUCache
+from .semver import VersionIndex
+
+
+# The max number of analysis results to keep for each tree
+ANALYSIS_CACHE_SIZE = 256
+
+# The max number of resolved urls to keep for each tree
+URL_CACHE_SIZE = 4096
+
+
+class CompiledTree(object):
+    '''
+    A flattened, read-only index of the dependency tree.
+
+    Each `<name>@<version>` of the tree becomes an integer node id, and the
+    dependencies of a node become an adjacency tuple of
+    `(<package range id>, <node id>)`. The walk order and the transitive
+    dependencies of a node are computed on first use and then kept for the
+    lifetime of the process, so a `CompiledTree` should be shared by all
+    requests, see `compile_tree()`.
+
+    If `base` is specified, which is the compiled tree of another version,
+    nodes keep the ids of `base` if possible, and the edges, csses, walks
+    and transitive dependencies of the packages which are not changed are
+    shared with `base` instead of being created again, see
+    `neuronjs.registry`. Node ids are always `0` to `len(tree) - 1`, so
+    a chain of derived trees never keeps the nodes of removed packages.
+    '''
+
+    def __init__(self, tree=None, base=None):
+        self.version = None
+
+        # node id -> name / version
+        self.names = []
+        self.versions = []
+
+        # (name, version) -> node id
+        self.index = {}
+
+        # name -> list.<version>, only the packages defined in the tree
+        self.packages = {}
+
+        # lazily created, name -> VersionIndex
+        self._version_indexes = {}
+
+        # node id -> tuple.<(package range id, node id)>
+        self.edges = []
+
+        # node id -> tuple.<path> of the csses declared by the package,
+        # such as `('/index.css',)`
+        self.csses = []
+
+        # lazily computed, node id -> (
+        #   tuple.<node id> walk order,
+        #   tuple.<int> depths of the nodes in walk order,
+        #   tuple.<(node id, node id)> edges which lead to cycles
+        # )
+        self._walks = []
+
+        # lazily computed, node id -> frozenset.<node id>
+        self._descendants = []
+
+        # Analysis results shared by all `Neuron`s of the tree,
+        # see `Neuron.analyze()`
+        self.analysis_cache = LRUCache(ANALYSIS_CACHE_SIZE)
+
+        # Resolved urls shared by all `Neuron`s of the tree
+        self.url_cache = LRUCache(URL_CACHE_SIZE)
+
+        # (name, version) -> node id inherited from `base`, and the free
+        # node ids in reverse order, only used by compiling
+        self._base_ids = None
+        self._free_ids = None
+
+        if tree is not None:
+            self.version = tree.get('_version')
+            if base is not None:
+                self._inherit(base, tree)
+            self._compile(tree)
+            if base is not None:
+                self._share(base)
+
+    # Creates a compiled tree from flattened nodes, see `neuronjs.loader`
+    # @param {list} nodes list.<(name, version, whether defined in the tree)>
+    # @param {list} edges node id -> tuple.<(package range id, node id)>
+    # @param {dict=} csses node id -> list.<path>
+    @staticmethod
+    def from_nodes(version, nodes, edges, csses=None):
+        compiled = CompiledTree()
+        compiled.version = version
+
+        for name, version_, defined in nodes:
+            node = compiled._add_node(name, version_)
+            if defined:
+                compiled.packages.setdefault(
+                    compiled.names[node], []).append(compiled.versions[node])
+
+        compiled.edges = list(edges)
+
+        if csses:
+            for node in csses:
+                compiled.csses[int(node)] = CompiledTree._clean_csses(
+                    csses[node])
+        return compiled
+
+    # Whether the node is defined in the tree, or only depended by others
+    def is_defined(self, node):
+        versions = self.packages.get(self.names[node])
+        return versions is not None and self.versions[node] in versions
+
+    def _compile(self, tree):
+        defined = []
+        for name in tree:
+            versions = tree[name]
+            if type(versions) is not dict:
+                # '_version'
+                continue
+
+            for version in versions:
+                node = self._add_node(name, version)
+                defined.append(node)
+                self.packages.setdefault(
+                    self.names[node], []).append(self.versions[node])
+
+        # Dependencies could only be resolved after all nodes are created
+        for node in defined:
+            definition = tree[self.names[node]][self.versions[node]]
+            if type(definition) is dict and definition.get('css'):
+                self.csses[node] = CompiledTree._clean_csses(
+                    definition['css'])
+
+            dependencies = CompiledTree._get_dependencies(
+                tree, self.names[node], self.versions[node])
+
+            if not dependencies:
+                self.edges[node] = ()
+                continue
+
+            edges = []
+            for dep in dependencies:
+                dep_name, dep_range, dep_path = module.parse_module_id(dep)
+                dep_node = self._get_node(dep_name, dependencies[dep])
+                edges.append(
+                    (module.intern(module.package_id(dep_name, dep_range)), dep_node)
+                )
+
+            self.edges[node] = tuple(edges)
+
+    def _add_node(self, name, version):
+        name = module.intern(name)
+        version = module.intern(version)
+
+        if self._base_ids is not None:
+            node = self._base_ids.get((name, version))
+            if node is None:
+                node = self._free_ids.pop()
+            self.names[node] = name
+            self.versions[node] = version
+            self.index[(name, version)] = node
+            return node
+
+        node = len(self.names)
+        self.names.append(name)
+        self.versions.append(version)
+        self.index[(name, version)] = node
+
+        self.edges.append(None)
+        self.csses.append(())
+        self._walks.append(None)
+        self._descendants.append(None)
+        return node
+
+    # Reserves the node ids of `base` for the packages which are still in
+    # the tree. The ids of removed packages, and the ids out of the range of
+    # the new tree, are given to the other packages.
+    def _inherit(self, base, tree):
+        keys = CompiledTree._get_keys(tree)
+        count = len(keys)
+
+        self._base_ids = {}
+        for key in keys:
+            node = base.index.get(key)
+            if node is not None and node < count:
+                self._base_ids[key] = node
+
+        taken = set(self._base_ids.values())
+        self._free_ids = [
+            node for node in range(count - 1, -1, -1)
+            if node not in taken
+        ]
+
+        self.names = [None] * count
+        self.versions = [None] * count
+        self.edges = [None] * count
+        self.csses = [()] * count
+        self._walks = [None] * count
+        self._descendants = [None] * count
+
+    # Returns the set of `(name, version)` of all nodes of the tree, the
+    # same as `_compile()` creates
+    @staticmethod
+    def _get_keys(tree):
+        keys = set()
+        for name in tree:
+            versions = tree[name]
+            if type(versions) is not dict:
+                continue
+
+            for version in versions:
+                keys.add((name, version))
+                dependencies = CompiledTree._get_dependencies(
+                    tree, name, version)
+                for dep in dependencies or ():
+                    keys.add((
+                        module.parse_module_id(dep)[0], dependencies[dep]))
+        return keys
+
+    # Shares the objects of `base` which are equal to the compiled ones,
+    # and the walks of the nodes which could not reach any changed node
+    def _share(self, base):
+        self._base_ids = None
+        self._free_ids = None
+        count = min(len(self.names), len(base.names))
+
+        # nodes of which the packages or the edges are changed, and the
+        # nodes of `base` out of the range, which are moved or removed
+        changed = list(range(count, len(base.names)))
+        for node in range(count):
+            if self.names[node] == base.names[node] \
+                    and self.versions[node] == base.versions[node] \
+                    and self.edges[node] == base.edges[node]:
+                self.edges[node] = base.edges[node]
+            else:
+                changed.append(node)
+
+            if self.csses[node] == base.csses[node]:
+                self.csses[node] = base.csses[node]
+
+        for name in self.packages:
+            versions = base.packages.get(name)
+            if versions == self.packages[name]:
+                self.packages[name] = versions
+                version_index = base._version_indexes.get(name)
+                if version_index is not None:
+                    self._version_indexes[name] = version_index
+
+        # The walk of a node is changed only if it reaches a changed node,
+        # so we walk up from the changed nodes by the edges of `base`
+        parents = {}
+        for node in range(len(base.names)):
+            for range_id, child in base.edges[node] or ():
+                parents.setdefault(child, []).append(node)
+
+        affected = set(changed)
+        stack = list(changed)
+        while stack:
+            for parent in parents.get(stack.pop(), ()):
+                if parent not in affected:
+                    affected.add(parent)
+                    stack.append(parent)
+
+        for node in range(count):
+            if node not in affected:
+                self._walks[node] = base._walks[node]
+                self._descendants[node] = base._descendants[node]
+
+    # Get the node id, creates a leaf node if the package is not in the tree
+    def _get_node(self, name, version):
+        node = self.index.get((name, version))
+        if node is None:
+            node = self._add_node(name, version)
+            self.edges[node] = ()
+        return node
+
+    # 'index.css' -> '/index.css'
+    @staticmethod
+    def _clean_csses(paths):
+        return tuple([
+            module.intern(path if path.startswith('/') else '/' + path)
+            for path in paths
+        ])
+
+    @staticmethod
+    def _get_dependencies(tree, name, version):
+        node = tree.get(name)
+        if type(node) is not dict:
+            return
+
+        node = node.get(version)
+        if type(node) is not dict:
+            return
+
+        dependencies = node.get('dependencies')
+        if type(dependencies) is not dict:
+            return
+        return dependencies
+
+    def __len__(self):
+        return len(self.names)
+
+    def package_id(self, node):
+        return module.package_id(self.names[node], self.versions[node])
+
+    # Returns the node id of `name@version`, or `None`
+    def node(self, name, version):
+        return self.index.get((name, version))
+
+    # Returns the max version of package `name` which satisfies `range_`,
+    # or `None`
+    def resolve_range(self, name, range_):
+        index = self._version_indexes.get(name)
+        if index is None:
+            versions = self.packages.get(name)
+            if versions is None:
+                return
+            index = self._version_indexes[name] = VersionIndex(versions)
+
+        return index.max_satisfying(range_)
+
+    # Returns the tuple of node ids in the order of which they are first
+    # reached by walking down from `node`, including `node` itself
+    def walk_order(self, node):
+        return self.walk(node)[0]
+
+    # Returns `(order, depths, cycles)`, see `self._walks`
+    def walk(self, node):
+        walk = self._walks[node]
+        if walk is None:
+            walk = self._walks[node] = self._walk(node)
+        return walk
+
+    # Returns the frozenset of node ids which `node` depends on, directly or
+    # transitively. `node` itself is included only if it is in a cycle.
+    def descendants(self, node):
+        descendants = self._descendants[node]
+        if descendants is None:
+            edges = self.edges
+            descendants = frozenset([
+                child
+                for parent in self.walk_order(node)
+                for range_id, child in edges[parent]
+            ])
+            self._descendants[node] = descendants
+        return descendants
+
+    # Walks down iteratively, so that deep dependency chains never exceed
+    # the recursion limit. The order is the same as a recursive walk which
+    # visits the dependencies in the order of `self.edges`.
+    def _walk(self, node):
+        edges = self.edges
+
+        order = [node]
+        depths = [0]
+        cycles = []
+
+        parsed = set([node])
+        walking = set([node])
+        stack = [(node, iter(edges[node]))]
+
+        while stack:
+            parent, children = stack[-1]
+
+            for range_id, child in children:
+                if child in walking:
+                    # `child` is one of the ancestors of `parent`
+                    cycles.append((parent, child))
+
+                if child not in parsed:
+                    parsed.add(child)
+                    walking.add(child)
+                    order.append(child)
+                    depths.append(len(stack))
+                    stack.append((child, iter(edges[child])))
+                    break
+            else:
+                stack.pop()
+                walking.discard(parent)
+
+        return (tuple(order), tuple(depths), tuple(cycles))
+
+    # Computes the walk orders and transitive dependencies of all nodes
+    def precompute(self):
+        for node in range(len(self.names)):
+            self.descendants(node)
+        return self
+
+
+# The max number of different trees to keep compiled in a process
+MAX_COMPILED_TREES = 8
+
+_compiled = OrderedDict()
+_compile_lock = threading.Lock()
+
+
+def compile_tree(tree):
+    '''
+    Returns the `CompiledTree` of the dependency tree, which is only compiled
+    once per process and then shared by every `Walker` of the same tree.
+    '''
+
+    if isinstance(tree, CompiledTree):
+        return tree
+
+    key = id(tree)
+
+    with _compile_lock:
+        cached = _compiled.get(key)
+        # `id()` could be reused once the tree is garbage collected,
+        # so we hold the tree and check the identity.
+        if cached and cached[0] is tree:
+            # most recently used
+            _compiled[key] = _compiled.pop(key)
+            return cached[1]
+
+        compiled = CompiledTree(tree)
+        _compiled[key] = (tree, compiled)
+
+        while len(_compiled) > MAX_COMPILED_TREES:
+            _compiled.popitem(last=False)
+
+        return compiled
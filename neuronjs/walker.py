@@ -2,10 +2,12 @@
 
 
 from . import module
+from . import tools
+from .tree import compile_tree
 
 class Walker(object):
 
-    # @param {dict} tree
+    # @param {dict|CompiledTree} tree
     # {
     #   "a": {
     #     "*": {
@@ -18,14 +20,54 @@ class Walker(object):
     #     "*": {}
     #   }
     # }
-    def __init__(self, tree):
+    # @param {function(event, data)=} instrument, see `Neuron`
+    def __init__(self, tree, instrument=None):
         self._tree = tree
+        self.instrument = instrument
+
+        # The compiled tree is shared by all walkers of the same tree
+        self._compiled = compile_tree(tree)
         self.guid = 0
 
-    # @param {list} entries
-    # @param {list} host_list where the result will be appended to
+    # @param {list} facades module ids of facades
+    @tools.instrument('look_up')
     def look_up(self, facades):
-        self.parsed = []
+        self._reset()
+        self._extend(facades)
+        return (self.selected, self.graph)
+
+    # Walks down more facades after `look_up()`, and only walks the
+    # packages which are not parsed yet.
+    # Returns the list of newly selected `(name, version, path)`
+    @tools.instrument('extend')
+    def extend(self, facades):
+        return self._extend(facades)
+
+    def _extend(self, facades):
+        self.added = []
+        facade_node = self.graph['_']
+
+        for module_id in facades:
+            name, range_, path = module.parse_module_id(module_id)
+
+            # If the module id facaded contains path, the path will be ignored
+            self._walk_down_facade(name, range_, path, facade_node)
+
+        return self.added
+
+    def _report(self, event, data, result):
+        stats = self.stats
+        data['nodes'] = stats['nodes']
+        data['max_depth'] = stats['max_depth']
+        data['selected'] = len(self.added)
+        self.instrument(event, data)
+
+    def _reset(self):
+        # set.<node id>
+        self.parsed = set()
+
+        # set.<node id> of the packages which are depended by others
+        self.reached = set()
         facade_node = {}
 
         # `self.selected` has the structure like:
@@ -36,6 +78,12 @@ class Walker(object):
         # }
         self.selected = {}
 
+        # list.<(name, version, path)> of the csses declared by the walked
+        # packages, in which the csses of a package always follow those of
+        # its dependencies, so that a package could override the styles of
+        # its dependencies
+        self.csses = []
+
         # see [here](https://github.com/kaelzhang/neuron/blob/master/doc/graph.md)
         self.graph = {
             '_': facade_node
@@ -43,21 +91,21 @@ class Walker(object):
 
         # map to store the index of the dependency node
         self.index_map = {}
+        self.guid = 0
 
-        for module_id in facades:
-            name, range_, path = module.parse_module_id(module_id)
-
-            # If the module id facaded contains path, the path will be ignored
-            self._walk_down_facade(name, range_, path, facade_node)
+        # list.<(package id, package id)> dependencies which lead to cycles
+        self.cycles = []
 
-        return (self.selected, self.graph)
+        # statistics of the walk
+        # - nodes: the number of packages walked
+        # - max_depth: the max depth of dependencies from the facades
+        self.stats = {
+            'nodes': 0,
+            'max_depth': 0
+        }
 
     def _resolve_range(self, name, range_):
-        if name not in self._tree:
-            return
-
-        versions = self._tree[name]
-        return module.max_satisfying(range_, versions.keys())
+        return self._compiled.resolve_range(name, range_)
 
     def _guid(self):
         uid = self.guid
@@ -68,69 +116,123 @@ class Walker(object):
         # The offline ci could not know which facades to load,
         # so the range version of the facade is still not resolved.
         version = self._resolve_range(name, range_) or range_
-        self._walk_down(name, range_, version, path, dependency_node)
-
-    def _walk_down_non_facade(self, name, range_, version, dependency_node):
-        # If not facade, module should not contain `path`
-        self._walk_down(name, range_, version, '', dependency_node)
-
-    # walk down
-    # @param {list} entry list of package names
-    # @param {dict} tree the result tree to extend
-    # @param {list} parsed the list to store parsed entries
-    def _walk_down(self, name, range_, version, path, dependency_node):
-        # if the node is already parsed,
-        # sometimes we still need to add the dependency to the parent node
         package_range_id = module.package_id(name, range_)
-        package_id = module.package_id(name, version)
-        node, index = self._get_graph_node(package_id, version)
-        dependency_node[package_range_id] = index
 
         # Always select the module(not package),
         # because a package might have more than one modules
         self._select(name, version, path)
 
-        if package_id in self.parsed:
-            # prevent parsing duplicately.
-            return
-
-        self.parsed.append(package_id)
+        node = self._compiled.node(name, version)
+        if node is None:
+            # The package is not in the tree
+            node_key = (name, version)
+            if node_key not in self.index_map:
+                self.stats['nodes'] += 1
 
-        # Walk dependencies
-        dependencies = self._get_dependencies(name, version)
-        if not dependencies:
+            dependency_node[package_range_id] = self._get_graph_node(
+                node_key, version)[1]
             return
 
-        current_dependency_node = self._get_dependency_node(node)
-        for dep in dependencies:
-            dep_name, dep_range, dep_path = module.parse_module_id(dep)
+        self._walk_down(node)
+        dependency_node[package_range_id] = self.index_map[node]
 
-            # The dependency version of a package is already resolved by
-            #   neuron-package-dependency
-            dep_version = dependencies[dep]
-            self._walk_down_non_facade(
-                dep_name,
-                dep_range,
-                dep_version,
-                current_dependency_node)
-
-    def _get_dependencies(self, name, version):
-        return Walker.access(self._tree, [name, version, 'dependencies'])
+    # walk down
+    # Instead of walking the dict tree, it only extends
+    # `self.graph` with the nodes reachable from `node` which are not parsed
+    def _walk_down(self, node):
+        compiled = self._compiled
+        parsed = self.parsed
+
+        order, depths, cycles = compiled.walk(node)
+        stats = self.stats
+
+        new_nodes = []
+        for n, depth in zip(order, depths):
+            if n in parsed:
+                # prevent parsing duplicately.
+                continue
+
+            parsed.add(n)
+            new_nodes.append(n)
+
+            if depth > stats['max_depth']:
+                stats['max_depth'] = depth
+
+            # The graph index is allocated in the order of walking
+            self._get_graph_node(n, compiled.versions[n])
+
+        stats['nodes'] += len(new_nodes)
+
+        csses = compiled.csses
+        if any([csses[n] for n in new_nodes]):
+            self._collect_csses(order, depths, set(new_nodes))
+
+        descendants = compiled.descendants(node)
+        for n in descendants - self.reached:
+            self._select(compiled.names[n], compiled.versions[n])
+        self.reached |= descendants
+
+        if cycles and new_nodes:
+            new = set(new_nodes)
+            for parent, child in cycles:
+                # A parsed package could never depend on a new one
+                if parent in new:
+                    self.cycles.append((
+                        compiled.package_id(parent),
+                        compiled.package_id(child)
+                    ))
+
+        index_map = self.index_map
+        for n in new_nodes:
+            edges = compiled.edges[n]
+            if not edges:
+                continue
+
+            current_dependency_node = self._get_dependency_node(
+                self.graph[index_map[n]])
+            for package_range_id, child in edges:
+                # The dependency version of a package is already resolved by
+                #   neuron-package-dependency
+                current_dependency_node[package_range_id] = index_map[child]
+
+    # Collects the csses of the `new` nodes in the post order of the walk,
+    # in which dependencies come before the packages that depend on them
+    def _collect_csses(self, order, depths, new):
+        compiled = self._compiled
+        post_order = []
+        stack = []
+        for n, depth in zip(order, depths):
+            while stack and stack[-1][1] >= depth:
+                post_order.append(stack.pop()[0])
+            stack.append((n, depth))
+        while stack:
+            post_order.append(stack.pop()[0])
+
+        for n in post_order:
+            if n not in new:
+                continue
+            name = compiled.names[n]
+            version = compiled.versions[n]
+            for path in compiled.csses[n]:
+                self.csses.append((name, version, path))
 
     def _select(self, name, version, path = ''):
         selected = self.selected
         if name not in selected:
             selected[name] = set()
 
-        selected[name].add((version, path))
+        version_path = (version, path)
+        if version_path not in selected[name]:
+            selected[name].add(version_path)
+            self.added.append((name, version, path))
 
-    def _get_graph_node(self, package_id, version):
-        if package_id in self.index_map:
-            index = self.index_map[package_id]
+    def _get_graph_node(self, node_key, version):
+        if node_key in self.index_map:
+            index = self.index_map[node_key]
             return (self.graph[index], index)
 
         index = self._guid()
-        self.index_map[package_id] = index
+        self.index_map[node_key] = index
         node = [version]
         self.graph[index] = node
         return (node, index)
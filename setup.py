@@ -21,9 +21,11 @@ setup(
     keywords = 'neuron.js middleware javascript loader facade',
     url = 'https://github.com/kaelzhang/python-neuronjs',
     long_description=read('README.rst'),
+    extras_require={
+        'jinja': ['jinja2']
+    },
     classifiers=[
         'Programming Language :: Python',
-        'Programming Language :: Python :: 2.6',
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: Implementation :: PyPy',
         'Topic :: Utilities',
@@ -17,7 +17,14 @@ abort() {
 }
 
 py='.py'
-files=(module walker)
+files=(module semver walker tree loader neuron planner bench precompile assets registry graph jinja middleware)
+
+# asyncio tests require python 3.5+
+async_files=(aio asgi)
+if python -c 'import sys; sys.exit(sys.version_info < (3, 5))'; then
+  files+=(${async_files[@]})
+fi
+
 for file in ${files[@]}; do
   echo
   log "test" "$file$py"
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+import json
+import os
+import asyncio
+
+from env import ABSPATH
+from neuronjs import Neuron
+from neuronjs.aio import AsyncNeuron
+from neuronjs.cache import LRUCache
+from neuronjs.planner import ComboPlanner
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    content = open(filename).read()
+    return json.loads(content)
+
+dependency_tree = read_json('dependency.json')
+
+
+def resolve(module_ids):
+    if type(module_ids) is not list:
+        return '/mod/' + module_ids
+
+    return '/concat/' + ','.join(module_ids)
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+class TestAsyncNeuron(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.running = 0
+        self.max_running = 0
+
+    async def async_resolve(self, module_ids):
+        self.calls.append(module_ids)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(0.01)
+        self.running -= 1
+        return resolve(module_ids)
+
+    def create(self, **options):
+        options.setdefault('url_cache', LRUCache(100))
+        return AsyncNeuron(
+            dependency_tree=dependency_tree,
+            resolve=self.async_resolve,
+            **options)
+
+    def prepare(self, n):
+        n.facade('home', {'a': 1})
+        n.combo('b', 'c')
+        n.css('a/a.css')
+        return n
+
+    def test_same_output(self):
+        n = self.prepare(self.create())
+        expected = self.prepare(
+            Neuron(dependency_tree=dependency_tree, resolve=resolve))
+
+        self.assertEqual(
+            run(n.output_scripts()), expected.output_scripts())
+        self.assertEqual(run(n.output_css()), expected.output_css())
+        self.assertEqual(n.output_config(), expected.output_config())
+        self.assertEqual(
+            run(n.src('c/style.css')), expected.src('c/style.css'))
+
+    def test_concurrent(self):
+        n = self.prepare(self.create())
+        run(n.output_scripts())
+
+        # neuron.js, the combo, home, and the css
+        self.assertEqual(len(self.calls), 4)
+        self.assertEqual(self.max_running, 4)
+
+    def test_url_cache(self):
+        url_cache = LRUCache(100)
+        run(self.prepare(self.create(url_cache=url_cache)).output_scripts())
+        calls = len(self.calls)
+
+        n = self.prepare(self.create(url_cache=url_cache))
+        run(n.prepare())
+        self.assertEqual(len(self.calls), calls)
+        self.assertEqual(len(list(n.iter_scripts())), 3)
+
+    def test_not_prepared(self):
+        n = self.prepare(self.create())
+        self.assertRaises(RuntimeError, lambda: list(n.iter_scripts()))
+
+    def test_planner(self):
+        self.assertRaises(
+            ValueError, AsyncNeuron,
+            dependency_tree=dependency_tree, planner=ComboPlanner())
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestAsyncNeuron)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+import json
+import os
+import asyncio
+
+from env import ABSPATH
+from neuronjs import Engine, Context
+from neuronjs.asgi import ASGIMiddleware
+from neuronjs.aio import AsyncNeuron
+from neuronjs.middleware import CONTEXT_KEY, CSS, SCRIPTS, CONFIG, FACADES
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    content = open(filename).read()
+    return json.loads(content)
+
+dependency_tree = read_json('dependency.json')
+
+
+def resolve(module_ids):
+    if type(module_ids) is not list:
+        return '/mod/' + module_ids
+
+    return '/concat/' + ','.join(module_ids)
+
+
+engine = Engine(dependency_tree=dependency_tree, resolve=resolve)
+
+HEAD = '<head>' + CSS + SCRIPTS + CONFIG + '</head>'
+
+
+def expected(*facades):
+    n = Context(engine)
+    for facade in facades:
+        n.facade(facade)
+    return (
+        '<head>' + n.output_css() + n.output_scripts() + n.output_config()
+        + '</head><body>' + n.output_facades() + '</body>')
+
+
+# The html of `HEAD + '<body>' + FACADES + '</body>'` with `late` facades
+# registered after the head
+def expected_late(facades, late):
+    n = Context(engine)
+    for facade in facades:
+        n.facade(facade)
+    head = n.output_css() + n.output_scripts() + n.output_config()
+
+    for facade in late:
+        n.facade(facade)
+    return (
+        '<head>' + head + '</head><body>' + n.output_css()
+        + n.output_scripts() + n.output_facades() + '</body>')
+
+
+class TestASGI(unittest.TestCase):
+    def call(self, messages, create_context=Context):
+        async def app(scope, receive, send):
+            n = scope[CONTEXT_KEY]
+            for message, facades in messages:
+                for facade in facades:
+                    n.facade(facade)
+                await send(message)
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        middleware = ASGIMiddleware(app, engine, create_context)
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(middleware({'type': 'http'}, None, send))
+        finally:
+            loop.close()
+        return sent
+
+    def start(self, content_type=b'text/html'):
+        return ({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', content_type),
+                (b'content-length', b'100')
+            ]
+        }, [])
+
+    def body(self, body, more_body=True, facades=()):
+        return ({
+            'type': 'http.response.body',
+            'body': body.encode('utf-8'),
+            'more_body': more_body
+        }, facades)
+
+    def test_streaming(self):
+        sent = self.call([
+            self.start(),
+            self.body('<html>', facades=['home']),
+            self.body(HEAD),
+            self.body('<body>', facades=['d']),
+            self.body(FACADES + '</body>', False)
+        ])
+
+        self.assertEqual(sent[0]['headers'], [(b'content-type', b'text/html')])
+        bodies = [message['body'] for message in sent[1:]]
+
+        # every message is sent at once
+        self.assertEqual(len(bodies), 4)
+        self.assertEqual(bodies[0], b'<html>')
+        self.assertEqual(bodies[2], b'<body>')
+        self.assertEqual(
+            b''.join(bodies).decode('utf-8'),
+            '<html>' + expected_late(['home'], ['d']))
+
+    def test_async_neuron(self):
+        async def async_resolve(id):
+            return resolve(id)
+
+        async_engine = Engine(
+            dependency_tree=dependency_tree, resolve=async_resolve)
+        sent = self.call([
+            self.start(),
+            self.body(HEAD + '<body>' + FACADES + '</body>', False, ['home'])
+        ], lambda engine: AsyncNeuron(engine=async_engine))
+        self.assertEqual(sent[1]['body'].decode('utf-8'), expected('home'))
+
+        sent = self.call([
+            self.start(),
+            self.body(HEAD, facades=['home']),
+            self.body('<body>', facades=['d']),
+            self.body(FACADES + '</body>', False)
+        ], lambda engine: AsyncNeuron(engine=async_engine))
+        self.assertEqual(
+            b''.join([message['body'] for message in sent[1:]]).decode('utf-8'),
+            expected_late(['home'], ['d']))
+
+    def test_not_html(self):
+        sent = self.call([
+            self.start(b'text/plain'),
+            self.body(SCRIPTS, False)
+        ])
+        self.assertEqual(len(sent[0]['headers']), 2)
+        self.assertEqual(sent[1]['body'], SCRIPTS.encode('utf-8'))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestASGI)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+import json
+import os
+import shutil
+import hashlib
+import tempfile
+
+from env import ABSPATH
+from neuronjs import Neuron
+from neuronjs import assets
+from neuronjs.__main__ import main
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    content = open(filename).read()
+    return json.loads(content)
+
+dependency_tree = read_json('dependency.json')
+
+
+def sha1(content):
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
+class TestAssets(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.write('neuron.js', 'neuron')
+        self.write('b/1.0.0/b.js', 'b')
+        self.write('c/1.0.0/c.js', 'c1')
+        self.write('c/2.0.0/c.js', 'c2')
+        self.write('c/2.0.0/lib/d.js', 'd')
+        self.write('x/1.0.0/x.js', 'x')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def write(self, path, content):
+        filename = os.path.join(self.dir, *path.split('/'))
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        with open(filename, 'w') as f:
+            f.write(content)
+
+    def test_build(self):
+        manifest = assets.build_manifest(self.dir, dependency_tree)
+        files = manifest['files']
+        self.assertEqual(sorted(files), [
+            'b/1.0.0/b.js',
+            'c/1.0.0/c.js',
+            'c/2.0.0/c.js',
+            'c/2.0.0/lib/d.js',
+            'neuron.js'
+        ])
+        self.assertEqual(files['c/1.0.0/c.js']['hash'], sha1('c1'))
+        self.assertTrue(
+            'x/1.0.0/x.js' in assets.build_manifest(self.dir)['files'])
+
+    def test_parallel(self):
+        threshold = assets.PARALLEL_THRESHOLD
+        assets.PARALLEL_THRESHOLD = 1
+        try:
+            manifest = assets.build_manifest(self.dir, processes=2)
+        finally:
+            assets.PARALLEL_THRESHOLD = threshold
+        self.assertEqual(manifest, assets.build_manifest(self.dir))
+
+    def test_incremental(self):
+        previous = assets.build_manifest(self.dir)
+        previous['files']['b/1.0.0/b.js']['hash'] = 'not rehashed'
+
+        self.write('c/1.0.0/c.js', 'changed')
+        manifest = assets.build_manifest(self.dir, previous=previous)
+        files = manifest['files']
+        self.assertEqual(files['b/1.0.0/b.js']['hash'], 'not rehashed')
+        self.assertEqual(files['c/1.0.0/c.js']['hash'], sha1('changed'))
+
+    def test_resolver(self):
+        resolve = assets.HashResolver(
+            assets.build_manifest(self.dir), base='//cdn/', length=8)
+        self.assertEqual(
+            resolve('b@1.0.0/b.js'), '//cdn/b/1.0.0/b.js?v=' + sha1('b')[:8])
+        self.assertEqual(
+            resolve('neuron.js'), '//cdn/neuron.js?v=' + sha1('neuron')[:8])
+        self.assertEqual(resolve('a@*/a.js'), '//cdn/a/*/a.js')
+
+        combo = resolve(['b@1.0.0/b.js', 'c@1.0.0/c.js'])
+        self.assertEqual(
+            combo,
+            '//cdn/??b/1.0.0/b.js,c/1.0.0/c.js?v='
+            + sha1(sha1('b') + ',' + sha1('c1'))[:8])
+
+        n = Neuron(dependency_tree=dependency_tree, resolve=resolve)
+        n.facade('b')
+        scripts = n.output_scripts()
+        self.assertTrue(
+            '//cdn/c/2.0.0/c.js?v=' + sha1('c2')[:8] in scripts)
+
+    def test_cli(self):
+        output = os.path.join(self.dir, 'hashes.json')
+        argv = ['hash', '--directory', self.dir, '--output', output]
+        self.assertEqual(main(argv), 0)
+        manifest = assets.load_manifest(output)
+        self.assertEqual(
+            manifest['files']['neuron.js']['hash'], sha1('neuron'))
+
+        # the manifest itself is never hashed
+        self.assertEqual(main(argv), 0)
+        self.assertEqual(assets.load_manifest(output), manifest)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestAssets)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
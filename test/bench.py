@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+
+from env import ABSPATH
+from neuronjs.bench import generate_tree, generate_facades, run, compare
+from neuronjs.walker import Walker
+
+
+class TestBench(unittest.TestCase):
+    def test_generate_tree(self):
+        tree = generate_tree(packages=100, fanout=3, depth=4, versions=2)
+        self.assertEqual(len(tree), 101)
+        self.assertEqual(tree, generate_tree(
+            packages=100, fanout=3, depth=4, versions=2))
+
+        facades = generate_facades(tree, 3)
+        self.assertEqual(len(facades), 3)
+
+        walker = Walker(tree)
+        walker.look_up(facades)
+        self.assertEqual(walker.cycles, [])
+        self.assertTrue(walker.stats['max_depth'] >= 1)
+
+    def test_run(self):
+        report = run(packages=50, iterations=2)
+        results = report['results']
+        for name in (
+            'walker.look_up', 'neuron.analyze', 'neuron.src',
+            'neuron.output_scripts', 'neuron.output_config'
+        ):
+            self.assertTrue(results[name]['p50'] >= 0)
+
+        self.assertEqual(compare(report, report), [])
+
+        slower = {
+            'config': report['config'],
+            'results': dict([
+                (name, dict(results[name], p50=results[name]['p50'] * 2 + 1))
+                for name in results
+            ])
+        }
+        self.assertEqual(len(compare(slower, report)), len(results))
+
+        # results of different trees are never compared
+        other = dict(report, config=dict(report['config'], seed=1))
+        self.assertRaises(ValueError, compare, other, report)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestBench)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+
+import unittest
+import re
+import sys
+import json
+import os
+
+from env import ABSPATH
+from neuronjs import Neuron
+from neuronjs.bench import generate_tree, generate_facades
+from neuronjs.graph import encode_graph, decode_graph
+from neuronjs.walker import Walker
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    return json.loads(open(filename).read())
+
+
+# Expands the graph from the facades into nested tuples, which are the same
+# for graphs numbered differently
+def expand(graph, index='_', walking=()):
+    if index == '_':
+        node = [None, graph['_']]
+    else:
+        # keys of the nodes are strings in json
+        node = graph[index] if index in graph else graph[str(index)]
+
+    if len(node) == 1 or index in walking:
+        return (node[0],)
+
+    walking = walking + (index,)
+    dependencies = node[1]
+    return (node[0], tuple(sorted([
+        (key, expand(graph, dependencies[key], walking))
+        for key in dependencies
+    ])))
+
+
+def dumps(obj):
+    return json.dumps(obj, separators=(',', ':'))
+
+
+class TestGraph(unittest.TestCase):
+    def test_round_trip(self):
+        graph = {
+            '_': {'a@^1.0.0': 0},
+            0: ['1.0.0', {'b@~2.0.0': 1, 'c@*': 2}],
+            1: ['2.0.1', {'c@*': 2}],
+            2: ['1.0.0']
+        }
+        encoded = encode_graph(graph)
+        self.assertEqual(encoded, [
+            ['a@^1.0.0', '1.0.0', 'b@~2.0.0', 'c@*', '2.0.1'],
+            [[0, 0], [2, 1, 3, -2], [3, -2]],
+            [[1, 1], [4, 2]]
+        ])
+        self.assertEqual(expand(decode_graph(encoded)), expand(graph))
+
+        # json turns the keys of nodes into strings
+        decoded = decode_graph(json.loads(json.dumps(encoded)))
+        self.assertEqual(expand(decoded), expand(graph))
+
+    def test_empty(self):
+        graph = {'_': {}}
+        self.assertEqual(decode_graph(encode_graph(graph)), graph)
+
+    def test_size(self):
+        tree = generate_tree(packages=2000)
+        facades = generate_facades(tree, count=10)
+        selected, graph = Walker(tree).look_up(facades)
+
+        encoded = encode_graph(graph)
+        self.assertEqual(expand(decode_graph(encoded)), expand(graph))
+        self.assertTrue(len(dumps(encoded)) < len(dumps(graph)) * 0.8)
+
+    def test_config(self):
+        tree = read_json('dependency.json')
+        outputs = []
+        for compact in (False, True):
+            n = Neuron(dependency_tree=tree, compact_graph=compact)
+            n.facade('home')
+            n.facade('d')
+            config = n.output_config()
+            graph = re.search(r'graph:(.*)\}\);</script>$', config).group(1)
+            outputs.append(json.loads(graph))
+
+        graph, encoded = outputs
+        self.assertEqual(type(encoded), list)
+        self.assertEqual(expand(decode_graph(encoded)), expand(graph))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestGraph)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
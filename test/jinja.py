@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+import json
+import os
+import shutil
+import tempfile
+
+from env import ABSPATH
+from neuronjs import Engine, Context
+
+try:
+    from jinja2 import Environment, DictLoader, FileSystemBytecodeCache
+    from neuronjs.jinja import NeuronExtension
+except ImportError:
+    # jinja2 is optional
+    Environment = None
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    content = open(filename).read()
+    return json.loads(content)
+
+dependency_tree = read_json('dependency.json')
+
+
+def resolve(module_ids):
+    if type(module_ids) is not list:
+        return '/mod/' + module_ids
+
+    return '/concat/' + ','.join(module_ids)
+
+
+OUTPUTS = (
+    '{{ n.output_css() }}|{{ n.output_scripts() }}|{{ n.output_config() }}'
+    '|{{ n.output_facades() }}'
+)
+
+PAGE = '''<head>
+{{ n.facade('home', {'user': user}) }}
+{{ n.combo('b', 'c') }}
+{{ n.css('a/a.css') }}
+</head>''' + OUTPUTS
+
+
+def expected(engine, *calls):
+    n = Context(engine)
+    for method, args in calls:
+        getattr(n, method)(*args)
+    return '|'.join([
+        n.output_css(),
+        n.output_scripts(),
+        n.output_config(),
+        n.output_facades()
+    ])
+
+
+@unittest.skipIf(Environment is None, 'jinja2 is not installed')
+class TestJinja(unittest.TestCase):
+    def setUp(self):
+        self.engine = Engine(dependency_tree=dependency_tree, resolve=resolve)
+
+    def render(self, template, engine=None, bytecode_cache=None, **context):
+        env = Environment(
+            extensions=[NeuronExtension],
+            loader=DictLoader({'page.html': template}),
+            bytecode_cache=bytecode_cache)
+        env.neuron_engine = self.engine
+        n = context['n'] = Context(engine or self.engine)
+        return env.get_template('page.html').render(**context), n
+
+    def test_prerendered(self):
+        for user in (1, 2):
+            html, n = self.render(PAGE, user=user)
+            self.assertTrue(n._prerendered is not None)
+            self.assertEqual(html.split('</head>')[1], expected(
+                self.engine,
+                ('facade', ('home', {'user': user})),
+                ('combo', ('b', 'c')),
+                ('css', ('a/a.css',))))
+
+    def test_bytecode_cache(self):
+        directory = tempfile.mkdtemp()
+        try:
+            cache = FileSystemBytecodeCache(directory)
+            first, n = self.render(PAGE, bytecode_cache=cache, user=1)
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+            # as another process, which never compiles the template
+            html, n = self.render(
+                PAGE, bytecode_cache=FileSystemBytecodeCache(directory),
+                user=1)
+            self.assertTrue(n._prerendered is not None)
+            self.assertEqual(html, first)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_other_engine(self):
+        engine = Engine(dependency_tree=dependency_tree, resolve=resolve)
+        html, n = self.render(PAGE, engine=engine, user=1)
+        self.assertTrue(n._prerendered is None)
+        self.assertEqual(html.split('</head>')[1], expected(
+            engine,
+            ('facade', ('home', {'user': 1})),
+            ('combo', ('b', 'c')),
+            ('css', ('a/a.css',))))
+
+    def test_dynamic_facades(self):
+        template = (
+            "{{ n.facade(name) }}{{ n.facade('home') }}{{ n.css('a/a.css') }}"
+            + OUTPUTS)
+        html, n = self.render(template, name='d')
+        self.assertTrue(n._prerendered is None)
+        self.assertEqual(html, expected(
+            self.engine,
+            ('facade', ('d',)),
+            ('facade', ('home',)),
+            ('css', ('a/a.css',))))
+
+    def test_conditional(self):
+        template = (
+            "{{ n.facade('home') }}"
+            "{% if show %}{{ n.facade('d') }}{% endif %}" + OUTPUTS)
+
+        html, n = self.render(template, show=False)
+        self.assertTrue(n._prerendered is not None)
+        self.assertEqual(html, expected(self.engine, ('facade', ('home',))))
+
+        html, n = self.render(template, show=True)
+        self.assertTrue(n._prerendered is None)
+        self.assertEqual(html, expected(
+            self.engine, ('facade', ('home',)), ('facade', ('d',))))
+
+    def test_late_facades(self):
+        template = (
+            "{{ n.facade('b') }}{{ n.output_scripts() }}"
+            "{{ n.facade('home') }}|{{ n.output_scripts() }}")
+        html, n = self.render(template)
+
+        n2 = Context(self.engine)
+        n2.facade('b')
+        first = n2.output_scripts()
+        n2.facade('home')
+        self.assertEqual(html, first + '|' + n2.output_scripts())
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestJinja)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
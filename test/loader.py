@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+import json
+import os
+import shutil
+import tempfile
+
+from env import ABSPATH
+from neuronjs import Neuron
+from neuronjs.tree import CompiledTree
+from neuronjs.loader import dump, load, load_snapshot, is_snapshot, \
+    TreeLoader
+
+
+def fixture(filename):
+    return os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+
+
+def read_json(filename):
+    return json.loads(open(fixture(filename)).read())
+
+
+def output(tree):
+    nr = Neuron(dependency_tree=tree)
+    nr.facade('home')
+    nr.facade('c@2.0.0')
+    nr.analyze()
+    return nr.output_scripts() + nr.output_config()
+
+
+class TestLoader(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.tree = read_json('dependency.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_snapshot(self):
+        filename = os.path.join(self.dir, 'tree.bin')
+        dump(self.tree, filename)
+        self.assertTrue(is_snapshot(filename))
+        self.assertFalse(is_snapshot(fixture('dependency.json')))
+
+        loaded = load_snapshot(filename)
+        compiled = CompiledTree(self.tree)
+        self.assertEqual(loaded.version, 1)
+        self.assertEqual(loaded.names, compiled.names)
+        self.assertEqual(loaded.versions, compiled.versions)
+        self.assertEqual(loaded.edges, compiled.edges)
+        self.assertEqual(loaded.packages, compiled.packages)
+        self.assertEqual(loaded.csses, compiled.csses)
+        self.assertEqual(output(loaded), output(self.tree))
+
+    def test_csses(self):
+        filename = os.path.join(self.dir, 'tree.bin')
+        dump({
+            'a': {'1.0.0': {'css': ['a.css', '/theme.css']}}
+        }, filename)
+        self.assertEqual(load(filename).csses, [('/a.css', '/theme.css')])
+
+    def test_missing_dependency(self):
+        filename = os.path.join(self.dir, 'tree.bin')
+        dump({
+            'a': {'*': {'dependencies': {'b@*': '1.0.0'}}}
+        }, filename)
+        loaded = load(filename)
+        self.assertTrue(loaded.node('b', '1.0.0') is not None)
+        self.assertTrue('b' not in loaded.packages)
+        self.assertEqual(loaded.version, None)
+
+    def test_invalid_snapshot(self):
+        filename = os.path.join(self.dir, 'tree.bin')
+        dump(self.tree, filename)
+        content = open(filename, 'rb').read()
+        with open(filename, 'wb') as f:
+            f.write(content[:-4])
+        self.assertRaises(ValueError, load_snapshot, filename)
+
+    def test_load_json(self):
+        loaded = load(fixture('dependency.json'))
+        self.assertEqual(output(loaded), output(self.tree))
+
+    def test_reload(self):
+        filename = os.path.join(self.dir, 'tree.json')
+        snapshot = os.path.join(self.dir, 'tree.bin')
+        with open(filename, 'w') as f:
+            json.dump(self.tree, f)
+
+        loader = TreeLoader(filename, snapshot=snapshot, interval=0)
+        old = loader.tree
+        self.assertTrue(os.path.isfile(snapshot))
+        self.assertTrue(loader.tree is old)
+
+        self.tree['_version'] = 2
+        with open(filename, 'w') as f:
+            json.dump(self.tree, f)
+        mtime = os.stat(snapshot).st_mtime + 10
+        os.utime(filename, (mtime, mtime))
+
+        tree = loader.tree
+        self.assertFalse(tree is old)
+        self.assertEqual(tree.version, 2)
+        self.assertEqual(old.version, 1)
+        self.assertEqual(load_snapshot(snapshot).version, 2)
+
+        # A partially written file keeps the current tree
+        with open(filename, 'w') as f:
+            f.write('{"a":')
+        os.utime(filename, (mtime + 10, mtime + 10))
+        self.assertTrue(loader.tree is tree)
+
+    def test_rollback(self):
+        filename = os.path.join(self.dir, 'tree.json')
+        snapshot = os.path.join(self.dir, 'tree.bin')
+        backup = os.path.join(self.dir, 'backup.json')
+        with open(filename, 'w') as f:
+            json.dump(self.tree, f)
+        shutil.copy2(filename, backup)
+
+        loader = TreeLoader(filename, snapshot=snapshot, interval=0)
+        self.assertEqual(loader.tree.version, 1)
+
+        self.tree['_version'] = 2
+        with open(filename, 'w') as f:
+            json.dump(self.tree, f)
+        mtime = os.stat(backup).st_mtime + 10
+        os.utime(filename, (mtime, mtime))
+        self.assertEqual(loader.tree.version, 2)
+
+        # `cp -p` restores the older file with its mtime
+        shutil.copy2(backup, filename)
+        self.assertEqual(loader.tree.version, 1)
+        self.assertEqual(load_snapshot(snapshot).version, 1)
+        self.assertEqual(
+            TreeLoader(filename, snapshot=snapshot).tree.version, 1)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestLoader)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
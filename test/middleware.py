@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+import json
+import os
+
+from env import ABSPATH
+from neuronjs import Engine, Context
+from neuronjs.middleware import NeuronMiddleware, Injector, CONTEXT_KEY, \
+    CSS, SCRIPTS, CONFIG, FACADES
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    content = open(filename).read()
+    return json.loads(content)
+
+dependency_tree = read_json('dependency.json')
+
+
+def resolve(module_ids):
+    if type(module_ids) is not list:
+        return '/mod/' + module_ids
+
+    return '/concat/' + ','.join(module_ids)
+
+
+engine = Engine(dependency_tree=dependency_tree, resolve=resolve)
+
+HEAD = '<head>' + CSS + SCRIPTS + CONFIG + '</head>'
+
+
+def expected(*facades):
+    n = Context(engine)
+    for facade in facades:
+        n.facade(facade)
+    return (
+        '<head>' + n.output_css() + n.output_scripts() + n.output_config()
+        + '</head><body>' + n.output_facades() + '</body>')
+
+
+# The html of `HEAD + '<body>' + FACADES + '</body>'` with `late` facades
+# registered after the head
+def expected_late(facades, late):
+    n = Context(engine)
+    for facade in facades:
+        n.facade(facade)
+    head = n.output_css() + n.output_scripts() + n.output_config()
+
+    for facade in late:
+        n.facade(facade)
+    return (
+        '<head>' + head + '</head><body>' + n.output_css()
+        + n.output_scripts() + n.output_facades() + '</body>')
+
+
+# Splits the html into chunks of `size` bytes
+def split(html, size):
+    data = html.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class TestInjector(unittest.TestCase):
+    def feed(self, n, chunks):
+        injector = Injector(n)
+        sent = []
+        for chunk in chunks:
+            sent.append(b''.join(injector.feed(chunk)))
+        sent.append(b''.join(injector.close()))
+        return sent
+
+    def test_split_placeholders(self):
+        html = HEAD + '<body>' + FACADES + '</body>'
+        for size in (1, 3, 7, 100):
+            n = Context(engine)
+            n.facade('home')
+            n.css('a/a.css')
+            sent = self.feed(n, split(html, size))
+
+            n2 = Context(engine)
+            n2.facade('home')
+            n2.css('a/a.css')
+            self.assertEqual(
+                b''.join(sent).decode('utf-8'),
+                '<head>' + n2.output_css() + n2.output_scripts()
+                + n2.output_config() + '</head><body>'
+                + n2.output_facades() + '</body>')
+
+    def test_streaming(self):
+        n = Context(engine)
+        n.facade('home')
+        chunks = [b'<html>', HEAD.encode('utf-8'), b'<body>', b'<p>']
+        injector = Injector(n)
+
+        # every chunk is sent at once
+        self.assertEqual(injector.feed(chunks[0]), [b'<html>'])
+        head = b''.join(injector.feed(chunks[1]))
+        self.assertTrue(head.startswith(b'<head><script'))
+        self.assertTrue(head.endswith(b'</script></head>'))
+        self.assertEqual(injector.feed(chunks[2]), [b'<body>'])
+
+        n.facade('d')
+        self.assertEqual(injector.feed(chunks[3]), [b'<p>'])
+        self.assertEqual(
+            b''.join(injector.feed(FACADES.encode('utf-8'))).decode('utf-8'),
+            expected_late(['home'], ['d']).split('<body>')[1][:-7])
+        self.assertEqual(injector.close(), [])
+
+    def test_after_facades(self):
+        n = Context(engine)
+        n.facade('home')
+        injector = Injector(n)
+        injector.feed((HEAD + FACADES).encode('utf-8'))
+
+        # facades registered after the placeholder are output at the end
+        n.facade('d')
+        late = b''.join(injector.close()).decode('utf-8')
+        self.assertTrue('/mod/d@2.3.0/d.js' in late)
+        self.assertTrue(late.endswith("facade('d');</script>"))
+
+    def test_other_comments(self):
+        n = Context(engine)
+        html = b'<!--neuron:other--><!-- x -->'
+        self.assertEqual(b''.join(self.feed(n, split(html.decode(), 4))), html)
+
+
+def wsgi_app(body, content_type='text/html; charset=utf-8'):
+    def app(environ, start_response):
+        n = environ[CONTEXT_KEY]
+
+        def iterate():
+            start_response('200 OK', [
+                ('Content-Type', content_type),
+                ('Content-Length', '100')
+            ])
+            for chunk, facades in body:
+                # facades could be registered anywhere in the body
+                for facade in facades:
+                    n.facade(facade)
+                yield chunk.encode('utf-8')
+
+        return iterate()
+    return app
+
+
+class TestWSGI(unittest.TestCase):
+    def call(self, app):
+        response = {}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = status
+            response['headers'] = headers
+
+        body = NeuronMiddleware(app, engine)({}, start_response)
+        response['body'] = b''.join(body).decode('utf-8')
+        return response
+
+    def test_late_facades(self):
+        response = self.call(wsgi_app([
+            (HEAD, ['home']),
+            ('<body>', ['d']),
+            (FACADES + '</body>', [])
+        ]))
+
+        self.assertEqual(response['body'], expected_late(['home'], ['d']))
+        self.assertEqual(
+            response['headers'],
+            [('Content-Type', 'text/html; charset=utf-8')])
+
+    def test_list(self):
+        def app(environ, start_response):
+            environ[CONTEXT_KEY].facade('home')
+            start_response('200 OK', [('Content-Type', 'text/html')])
+            return split(HEAD + '<body>' + FACADES + '</body>', 5)
+
+        self.assertEqual(self.call(app)['body'], expected('home'))
+
+    def test_not_html(self):
+        body = '{"a": "' + SCRIPTS + '"}'
+        response = self.call(wsgi_app(
+            [(body, ['home'])], 'application/json'))
+        self.assertEqual(response['body'], body)
+        self.assertEqual(len(response['headers']), 2)
+
+    def test_close(self):
+        closed = []
+
+        class Body(list):
+            def close(self):
+                closed.append(True)
+
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/html')])
+            return Body([b'a'])
+
+        self.assertEqual(self.call(app)['body'], 'a')
+        self.assertEqual(closed, [True])
+
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite([
+    loader.loadTestsFromTestCase(TestInjector),
+    loader.loadTestsFromTestCase(TestWSGI)
+])
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
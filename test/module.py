@@ -3,6 +3,8 @@
 
 import unittest
 import sys
+import pickle
+import threading
 
 from env import ABSPATH
 import neuronjs.module as module
@@ -68,6 +70,66 @@ class TestModuleParser(unittest.TestCase):
         id = module.module_id('jquery', '1.1.0', '/a.js')
         self.assertEqual(id, 'jquery@1.1.0/a.js')
 
+    def test_interned(self):
+        parsed = module.parse_module_id('jquery')
+        self.assertTrue(module.parse_module_id('jquery@*/') is parsed)
+        self.assertTrue(module.parse_module_id('jquery@*') is parsed)
+        self.assertEqual(parsed, ('jquery', '*', ''))
+        self.assertEqual(hash(parsed), hash(('jquery', '*', '')))
+        self.assertEqual(
+            (parsed.name, parsed.version, parsed.path), ('jquery', '*', ''))
+        self.assertEqual(str(parsed), 'jquery@*/jquery.js')
+        self.assertFalse(hasattr(parsed, '__dict__'))
+
+        self.assertEqual(pickle.loads(pickle.dumps(parsed)), parsed)
+
+    def test_evicted(self):
+        module._parsed.maxsize = module._interned.maxsize = 4
+        try:
+            parsed = module.parse_module_id('a@1.0.0')
+            module.parse_module_id('a@1.0.0/')
+            for i in range(10):
+                module.parse_module_id('b@1.0.' + str(i))
+
+            # the least recently used ids are evicted
+            self.assertEqual(len(module._parsed), 4)
+            self.assertEqual(len(module._interned), 4)
+            self.assertFalse(module._parsed.has('a@1.0.0'))
+            self.assertEqual(module.parse_module_id('a@1.0.0'), parsed)
+
+            module.parse_module_id('b@1.0.6')
+            module.parse_module_id('c')
+            self.assertTrue(module._parsed.has('b@1.0.6'))
+            self.assertFalse(module._parsed.has('b@1.0.7'))
+        finally:
+            module._parsed.maxsize = module.MAX_CACHED_IDS
+            module._interned.maxsize = module.MAX_CACHED_IDS
+
+    def test_threads(self):
+        ids = ['a@1.0.' + str(i % 15) for i in range(3000)]
+        results = []
+
+        def parse():
+            results.append([module.parse_module_id(id) for id in ids])
+
+        module._parsed.maxsize = module._interned.maxsize = 8
+        try:
+            threads = [threading.Thread(target=parse) for i in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            module._parsed.maxsize = module.MAX_CACHED_IDS
+            module._interned.maxsize = module.MAX_CACHED_IDS
+
+        self.assertEqual(len(results), 8)
+        for result in results:
+            self.assertEqual(
+                [module.module_id(*parsed) for parsed in result],
+                [id + '/a.js' for id in ids])
+        self.assertEqual(len(list(module._parsed._data)), 8)
+
 
 suite = unittest.TestLoader().loadTestsFromTestCase(TestModuleParser)
 runner = unittest.TextTestRunner(verbosity=2).run(suite)
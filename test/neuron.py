@@ -0,0 +1,757 @@
+#!/usr/bin/env python
+
+
+import unittest
+import re
+import sys
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from env import ABSPATH
+from neuronjs import Neuron, Engine, Context
+from neuronjs.cache import LRUCache, FileCache
+from neuronjs.stats import Stats
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    content = open(filename).read()
+    return json.loads(content)
+
+dependency_tree = read_json('dependency.json')
+
+
+def resolve(module_ids):
+    if type(module_ids) is not list:
+        return '/mod/' + module_ids
+
+    return '/concat/' + ','.join(module_ids)
+
+
+def create(**options):
+    options.setdefault('dependency_tree', dependency_tree)
+    options.setdefault('resolve', resolve)
+    return Neuron(**options)
+
+
+class TestAnalysisCache(unittest.TestCase):
+    def test_hit(self):
+        cache = LRUCache(10)
+
+        n = create(analysis_cache=cache)
+        n.facade('home/a.js')
+        n.facade('home/b.js')
+        n.combo('home', 'b')
+        expected = n.output_scripts()
+
+        n2 = create(analysis_cache=cache)
+        n2.facade('home@*/a.js')
+        n2.facade('home/b.js')
+        n2.facade('home/a.js')
+        n2.combo('home', 'b')
+
+        self.assertEqual(n2.output_scripts(), expected)
+        self.assertEqual(n2._loaded, n._loaded)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_key(self):
+        cache = LRUCache(10)
+
+        n = create(analysis_cache=cache)
+        n.facade('home')
+        n.analyze()
+
+        n2 = create(analysis_cache=cache)
+        n2.facade('home')
+        n2.combo('b', 'c')
+        n2.analyze()
+
+        n3 = create(analysis_cache=cache, debug=True)
+        n3.facade('home')
+        n3.analyze()
+
+        self.assertEqual(cache.stats()['hits'], 0)
+        self.assertEqual(len(cache), 3)
+
+    def test_restored_copy(self):
+        cache = LRUCache(10)
+
+        n = create(analysis_cache=cache)
+        n.facade('home')
+        n.analyze()
+        n._packages.pop('b')
+
+        n2 = create(analysis_cache=cache)
+        n2.facade('home')
+        n2.analyze()
+        self.assertTrue('b' in n2._packages)
+
+    def test_encoded_config(self):
+        cache = LRUCache(10)
+
+        n = create(analysis_cache=cache)
+        n.facade('home')
+        config = n.output_config()
+        self.assertTrue(json.dumps(n._graph, separators=(',', ':')) in config)
+
+        n2 = create(analysis_cache=cache)
+        n2.facade('home')
+        self.assertEqual(n2.output_config(), config)
+        self.assertTrue(n2._encoded is n._encoded)
+
+        # late facades never change the shared encoded json
+        n2.facade('a')
+        n2.analyze()
+        self.assertNotEqual(n2.output_config(), config)
+
+        n3 = create(analysis_cache=cache)
+        n3.facade('home')
+        self.assertEqual(n3.output_config(), config)
+
+    def test_shared_by_tree(self):
+        n = create()
+        n2 = create()
+        self.assertTrue(n.analysis_cache is n2.analysis_cache)
+        self.assertTrue(create(analysis_cache=False).analysis_cache is None)
+
+
+class TestOutputCache(unittest.TestCase):
+    def render(self, cache, data=None, css=None, debug=False):
+        n = create(cache=cache, debug=debug)
+        n.facade('home', data)
+        n.combo('home', 'b')
+        if css:
+            n.css(css)
+        return [
+            n.output_scripts(),
+            n.output_config(),
+            n.output_facades(),
+            n.output_css()
+        ]
+
+    def test_cached(self):
+        cache = LRUCache(10)
+        expected = self.render(None, css='a/a.css')
+
+        self.assertEqual(self.render(cache, css='a/a.css'), expected)
+        self.assertEqual(len(cache), 4)
+        self.assertEqual(self.render(cache, css='a/a.css'), expected)
+        self.assertEqual(cache.stats()['hits'], 4)
+
+    def test_key(self):
+        cache = LRUCache(10)
+        self.render(cache)
+        # different data only changes the output of facades
+        self.render(cache, data={'a': 1})
+        self.assertEqual(len(cache), 5)
+
+        self.render(cache, css='a/a.css')
+        self.assertEqual(len(cache), 9)
+
+        self.render(cache, debug=True)
+        self.assertEqual(len(cache), 10)
+
+    def test_stampede(self):
+        cache = LRUCache(10)
+        rendered = []
+
+        n = create(cache=cache)
+        n.facade('home')
+        key = n._get_identifier_hash('_output_all_scripts')
+
+        original = Neuron._script_ids
+
+        def slow_script_ids(self):
+            rendered.append(1)
+            time.sleep(0.05)
+            return original(self)
+
+        def render():
+            n = create(cache=cache)
+            n._script_ids = lambda: slow_script_ids(n)
+            n.facade('home')
+            n.output_scripts()
+
+        threads = [threading.Thread(target=render) for i in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(rendered), 1)
+        self.assertTrue(cache.has(key))
+
+
+class TestFileCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_file_cache(self):
+        cache = FileCache(os.path.join(self.dir, 'cache'))
+        self.assertFalse(cache.has('a'))
+        self.assertEqual(cache.get('a'), None)
+
+        cache.set('a', '<script></script>')
+        self.assertTrue(cache.has('a'))
+        self.assertEqual(cache.get('a'), '<script></script>')
+
+        cache.set('a', '')
+        self.assertEqual(FileCache(cache.directory).get('a'), '')
+
+
+class TestIncrementalAnalysis(unittest.TestCase):
+    def test_late_facade(self):
+        for analysis_cache in (False, True, True):
+            n = create(analysis_cache=analysis_cache)
+            n.facade('a')
+            n.css('a/a.css')
+            first = n.output_scripts()
+            self.assertEqual(n.output_facades(), "<script>facade('a');</script>")
+            self.assertEqual(
+                n.output_css(),
+                '<link rel="stylesheet" href="/mod/a@*/a.css">')
+
+            n.facade('home', {'b': 1})
+            n.facade('c@^1.0.0')
+            n.css('a/a.css')
+            n.css('b/b.css')
+            scripts = n.output_scripts()
+
+            self.assertEqual(first.count('<script'), 2)
+            self.assertEqual(scripts.count('<script'), 4)
+            self.assertTrue('neuron.js' not in scripts)
+            self.assertTrue('/mod/c@1.0.0/c.js' in scripts)
+            self.assertEqual(n.output_scripts(), '')
+
+            self.assertEqual(
+                n.output_facades(),
+                '<script>facade(\'home\', {"b":1});\n'
+                'facade(\'c@^1.0.0\');</script>')
+            self.assertEqual(n.output_facades(), '')
+            self.assertEqual(
+                n.output_css(),
+                '<link rel="stylesheet" href="/mod/b@*/b.css">')
+
+            self.assertEqual(n._graph['_'], {
+                    'a@*': 0,
+                    'home@*': 1,
+                    'c@^1.0.0': 2
+                })
+            self.assertEqual(len(n._graph), 6)
+
+    def test_shared_graph(self):
+        cache = LRUCache(10)
+        n = create(analysis_cache=cache)
+        n.facade('a')
+        n.analyze()
+        n.facade('home')
+        n.analyze()
+
+        n2 = create(analysis_cache=cache)
+        n2.facade('a')
+        n2.analyze()
+        self.assertEqual(len(n2._graph), 2)
+
+    def test_comboed(self):
+        n = create()
+        n.facade('home')
+        n.combo('home', 'b', 'c')
+        first = n.output_scripts()
+
+        n.facade('home2')
+        self.assertEqual(
+            n.output_scripts(),
+            '<script async src="/mod/home2@*/home2.js"></script>')
+        self.assertTrue('home2@*' in n.output_config())
+
+    def test_config(self):
+        for analysis_cache in (False, True):
+            n = create(analysis_cache=analysis_cache)
+            n.facade('a')
+            n.output_scripts()
+            config = n.output_config()
+            self.assertFalse('home@*' in config)
+            self.assertEqual(n.output_config(), '')
+
+            # the config is output again with the new scripts
+            n.facade('home')
+            scripts = n.output_scripts()
+            self.assertTrue('/mod/home@*/home.js' in scripts)
+            self.assertTrue(scripts.endswith('</script>'))
+            updated = scripts[scripts.index('<script>neuron.config('):]
+            self.assertTrue('"home@*"' in updated)
+            self.assertTrue('"c@1.0.0"' in updated)
+            self.assertEqual(n.output_config(), '')
+
+            n2 = create(analysis_cache=analysis_cache)
+            n2.facade('a')
+            n2.facade('home')
+            n2.analyze()
+            self.assertTrue(
+                json.dumps(n2._graph, separators=(',', ':')) in updated)
+
+            # or by `output_config()` if scripts are not output
+            n.facade('d')
+            n.analyze()
+            self.assertTrue('"d@*"' in n.output_config())
+            self.assertEqual(n.output_scripts().count('neuron.config('), 0)
+
+
+class TestStreaming(unittest.TestCase):
+    def test_iter_scripts(self):
+        n = create()
+        n.facade('home')
+        n.combo('b', 'c')
+
+        chunks = n.iter_scripts()
+        self.assertEqual(
+            next(chunks),
+            '<script main src="/mod/neuron.js"></script>')
+        combo = next(chunks)
+        self.assertTrue(combo.startswith(
+            '<script async src="/concat/b@1.0.0/b.js,c@'))
+        self.assertTrue('c@1.0.0/c.js' in combo)
+        self.assertTrue('c@2.0.0/c.js' in combo)
+        self.assertEqual(
+            list(chunks),
+            ['<script async src="/mod/home@*/home.js"></script>'])
+
+    def test_same_output(self):
+        for debug in (False, True):
+            n = create(debug=debug)
+            n.facade('home')
+            n.css('a/a.css')
+            n.css('b/b.css')
+
+            n2 = create(debug=debug)
+            n2.facade('home')
+            n2.css('a/a.css')
+            n2.css('b/b.css')
+
+            self.assertEqual(
+                ''.join(n.iter_scripts()), n2.output_scripts())
+            self.assertEqual(''.join(n.iter_css()), n2.output_css())
+            self.assertEqual(''.join(n.iter_config()), n2.output_config())
+
+    def test_debug(self):
+        n = create(debug=True)
+        n.facade('home')
+        self.assertEqual(
+            n.output_scripts(),
+            '<script main src="/mod/neuron.js"></script>\n')
+        self.assertEqual(
+            n.output_config(),
+            '<script>\nneuron.config({});\n</script>')
+
+
+class TestResolveMany(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+
+    def resolve_many(self, ids):
+        self.calls.append(ids)
+        return [resolve(id) for id in ids]
+
+    def render(self, **options):
+        options.setdefault('resolve_many', self.resolve_many)
+        n = create(**options)
+        n.facade('home')
+        n.combo('b', 'c')
+        n.css('a/a.css')
+        return n.output_scripts() + n.output_css() + n.src('home/a.css')
+
+    def test_once_per_render(self):
+        expected = self.render(resolve_many=None, url_cache=False)
+        self.assertEqual(self.render(url_cache=False), expected)
+
+        # scripts and csses in one batch, and then `src()`
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(len(self.calls[0]), 4)
+        self.assertEqual(self.calls[1], ['home@*/a.css'])
+
+    def test_url_cache(self):
+        url_cache = LRUCache(100)
+        expected = self.render(url_cache=url_cache)
+        self.assertEqual(self.render(url_cache=url_cache), expected)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_shared_by_tree(self):
+        n = create()
+        self.assertTrue(n.url_cache is create().url_cache)
+        self.assertTrue(create(url_cache=False).url_cache is None)
+
+    def test_resolvers(self):
+        def resolver(prefix):
+            return lambda ids: ['//' + prefix + '/' + id for id in ids]
+
+        # engines of the same tree share the url cache
+        a = create(resolve_many=resolver('cdn-a'))
+        b = create(resolve_many=resolver('cdn-b'))
+        self.assertTrue(a.url_cache is b.url_cache)
+
+        a.facade('a')
+        b.facade('a')
+        self.assertTrue('//cdn-a/a@*/a.js' in a.output_scripts())
+        self.assertTrue('//cdn-b/a@*/a.js' in b.output_scripts())
+
+
+class TestSrc(unittest.TestCase):
+    def test_src(self):
+        n = create()
+        self.assertEqual(n.src('c/style.css'), '/mod/c@2.0.0/style.css')
+        self.assertEqual(n.src('c@^1.0.0'), '/mod/c@1.0.0/c.js')
+        self.assertEqual(n.src('c@^3.0.0'), '/mod/c@^3.0.0/c.js')
+        self.assertEqual(n.src('home'), '/mod/home@*/home.js')
+        self.assertEqual(n.src('x/a.js'), '/mod/x@*/a.js')
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_eviction(self):
+        cache = LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertTrue(cache.has('a'))
+        self.assertFalse(cache.has('b'))
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.stats(), {
+                'hits': 1,
+                'misses': 1,
+                'evictions': 1,
+                'size': 2,
+                'maxsize': 2
+            })
+
+
+class TestInstrument(unittest.TestCase):
+    def test_events(self):
+        events = []
+        stats = Stats(lambda event, data: events.append((event, data)))
+
+        n = create(instrument=stats, analysis_cache=False, url_cache=False)
+        n.facade('home')
+        n.combo('b', 'c')
+        scripts = n.output_scripts()
+        n.output_config()
+        n.output_css()
+
+        names = [event for event, data in events]
+        self.assertEqual(names.count('analyze'), 1)
+        self.assertEqual(names.count('look_up'), 1)
+        self.assertEqual(names[-1], 'output_css')
+        self.assertTrue('resolve' in names)
+
+        data = dict(events)['output_scripts']
+        self.assertEqual(data['bytes'], len(scripts))
+        self.assertEqual(data['scripts'], scripts.count('<script'))
+        self.assertEqual(data['combos'], 1)
+        self.assertTrue(data['time'] >= 0)
+        self.assertTrue(dict(events)['look_up']['nodes'] > 0)
+
+        report = stats.report()
+        self.assertEqual(report['output_scripts']['count'], 1)
+        self.assertEqual(
+            report['resolve']['ids'],
+            sum([data['ids'] for event, data in events if event == 'resolve']))
+
+        # later calls output nothing new
+        n.output_scripts()
+        self.assertEqual(stats.report()['output_scripts']['combos'], 1)
+
+        stats.reset()
+        self.assertEqual(stats.report(), {})
+
+    def test_off(self):
+        n = create()
+        n.facade('home')
+        n.output_scripts()
+        self.assertTrue(n.instrument is None)
+        self.assertTrue(n._get_walker().instrument is None)
+
+
+class TestEngine(unittest.TestCase):
+    def render(self, n):
+        n.facade('home', {'a': 1})
+        n.combo('b', 'c')
+        n.css('a/a.css')
+        return ''.join([
+            n.output_css(),
+            n.output_scripts(),
+            n.output_config(),
+            n.output_facades()
+        ])
+
+    def test_immutable(self):
+        engine = Engine(dependency_tree=dependency_tree)
+
+        def set_resolve():
+            engine.resolve = resolve
+
+        self.assertRaises(AttributeError, set_resolve)
+        self.assertFalse(hasattr(Context(engine), '__dict__'))
+
+    def test_same_output(self):
+        engine = Engine(dependency_tree=dependency_tree, resolve=resolve)
+        expected = self.render(create())
+        self.assertEqual(self.render(Context(engine)), expected)
+        self.assertEqual(self.render(Neuron(engine=engine)), expected)
+
+    def test_threads(self):
+        engine = Engine(
+            dependency_tree=dependency_tree,
+            resolve=resolve,
+            analysis_cache=LRUCache(10),
+            url_cache=LRUCache(100))
+        expected = self.render(create())
+        results = []
+
+        def render():
+            for i in range(20):
+                results.append(self.render(Context(engine)))
+
+        threads = [threading.Thread(target=render) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(results), 80)
+        self.assertEqual(set(results), set([expected]))
+
+
+class TestPreload(unittest.TestCase):
+    def create(self, **options):
+        n = create(**options)
+        n.facade('home')
+        n.combo('b', 'c')
+        n.css('a/a.css')
+        return n
+
+    def test_preload(self):
+        n = self.create()
+        preload = n.output_preload()
+        header = n.preload_header()
+
+        scripts = re.findall(r'src="([^"]+)"', self.create().output_scripts())
+        self.assertEqual(len(scripts), 3)
+        self.assertEqual(preload, ''.join([
+            '<link as="script" rel="preload" href="%s">' % url
+            for url in scripts
+        ] + ['<link as="style" rel="preload" href="/mod/a@*/a.css">']))
+        self.assertEqual(header, ', '.join([
+            '<%s>; rel=preload; as=script' % url
+            for url in scripts
+        ] + ['</mod/a@*/a.css>; rel=preload; as=style']))
+
+        # nothing is marked as output
+        scripts = n.output_scripts()
+        self.assertTrue('/mod/neuron.js' in scripts)
+        self.assertTrue('/mod/home@*/home.js' in scripts)
+        self.assertEqual(
+            n.output_preload(),
+            '<link as="style" rel="preload" href="/mod/a@*/a.css">')
+        n.output_css()
+        self.assertEqual(n.output_preload(), '')
+
+    def test_debug(self):
+        n = self.create(debug=True)
+        self.assertEqual(n.preload_header(), ', '.join([
+            '</mod/neuron.js>; rel=preload; as=script',
+            '</mod/a@*/a.css>; rel=preload; as=style'
+        ]))
+
+
+class TestDefer(unittest.TestCase):
+    def create(self, **options):
+        n = create(**options)
+        n.facade('b')
+        n.facade('home', defer=True)
+        n.facade('d', defer=True)
+        return n
+
+    def deferred_urls(self, scripts):
+        m = re.search(r'\}\)\((\[.*?\])\);</script>', scripts)
+        return sorted(json.loads(m.group(1))) if m else []
+
+    def test_partition(self):
+        for i in range(2):
+            # the second one restores the analysis from the cache
+            n = self.create()
+            scripts = n.output_scripts()
+            critical = scripts.split('<script>(function(urls)')[0]
+
+            self.assertEqual(sorted(re.findall(r'src="([^"]+)"', critical)), [
+                '/mod/b@1.0.0/b.js',
+                '/mod/c@2.0.0/c.js',
+                '/mod/neuron.js'
+            ])
+            self.assertEqual(self.deferred_urls(scripts), [
+                '/mod/c@1.0.0/c.js',
+                '/mod/d@2.3.0/d.js',
+                '/mod/e@1.0.0/e.js',
+                '/mod/home@*/home.js'
+            ])
+            self.assertTrue('addEventListener("load"' in scripts)
+            self.assertTrue(
+                "facade('home')" in n.output_facades())
+            self.assertTrue('"home@*"' in n.output_config())
+
+    def test_key(self):
+        n = create()
+        n.facade('b')
+        n.facade('home')
+        scripts = n.output_scripts()
+        self.assertEqual(self.deferred_urls(scripts), [])
+        self.assertTrue('/mod/home@*/home.js' in scripts)
+
+    def test_combo(self):
+        n = self.create()
+        n.combo('home', 'd')
+        n.combo('b', 'c')
+        scripts = n.output_scripts()
+        self.assertEqual(self.deferred_urls(scripts), [
+            '/concat/home@*/home.js,d@2.3.0/d.js',
+            '/mod/e@1.0.0/e.js'
+        ])
+
+        # a combo with any critical module is critical
+        critical = scripts.split('<script>(function(urls)')[0]
+        self.assertTrue('/concat/b@1.0.0/b.js,' in critical)
+
+    def test_late_facade(self):
+        n = create()
+        n.facade('b')
+        n.output_scripts()
+        n.facade('home', defer=True)
+        n.facade('a')
+        scripts = n.output_scripts()
+        self.assertEqual(
+            re.findall(r'src="([^"]+)"', scripts), ['/mod/a@*/a.js'])
+        self.assertEqual(self.deferred_urls(scripts), [
+            '/mod/c@1.0.0/c.js',
+            '/mod/home@*/home.js'
+        ])
+
+    def test_preload(self):
+        header = self.create().preload_header()
+        self.assertTrue('b@1.0.0' in header)
+        self.assertFalse('home' in header)
+
+
+# a -> b -> c, and a -> c
+css_tree = {
+    '_version': 'css',
+    'a': {
+        '1.0.0': {
+            'dependencies': {'b@^1.0.0': '1.0.0', 'c@*': '1.0.0'},
+            'css': ['a.css']
+        }
+    },
+    'b': {
+        '1.0.0': {
+            'dependencies': {'c@*': '1.0.0'},
+            'css': ['/b.css', 'theme.css']
+        }
+    },
+    'c': {
+        '1.0.0': {
+            'css': ['c.css']
+        }
+    },
+    'd': {
+        '1.0.0': {}
+    }
+}
+
+
+class TestCss(unittest.TestCase):
+    def hrefs(self, html):
+        return re.findall(r'href="([^"]+)"', html)
+
+    def test_dedupe(self):
+        n = create(dependency_tree=css_tree)
+        n.css('d/d.css')
+        n.css('d@*/d.css')
+        n.css('d@^1.0.0/d.css')
+        self.assertEqual(self.hrefs(n.output_css()), ['/mod/d@*/d.css'])
+
+        # already output
+        n.css('d@1.0.0/d.css')
+        self.assertEqual(n.output_css(), '')
+
+    def test_tree_csses(self):
+        for i in range(2):
+            # the second one restores the analysis from the cache
+            n = create(dependency_tree=css_tree)
+            n.facade('a')
+            n.css('c/c.css')
+            n.css('a/page.css')
+
+            # dependencies come first
+            self.assertEqual(self.hrefs(n.output_css()), [
+                '/mod/c@1.0.0/c.css',
+                '/mod/b@1.0.0/b.css',
+                '/mod/b@1.0.0/theme.css',
+                '/mod/a@1.0.0/a.css',
+                '/mod/a@*/page.css'
+            ])
+
+    def test_combo(self):
+        n = create(dependency_tree=css_tree)
+        n.facade('a')
+        n.combo('b', 'c')
+        self.assertEqual(self.hrefs(n.output_css()), [
+            '/concat/c@1.0.0/c.css,b@1.0.0/b.css,b@1.0.0/theme.css',
+            '/mod/a@1.0.0/a.css'
+        ])
+
+    def test_debug(self):
+        n = create(dependency_tree=css_tree, debug=True)
+        n.facade('a')
+        n.combo('b', 'c')
+        self.assertEqual(len(self.hrefs(n.output_css())), 4)
+
+    def test_late_facade(self):
+        n = create(dependency_tree=css_tree)
+        n.facade('b')
+        self.assertEqual(self.hrefs(n.output_css()), [
+            '/mod/c@1.0.0/c.css',
+            '/mod/b@1.0.0/b.css',
+            '/mod/b@1.0.0/theme.css'
+        ])
+
+        n.facade('a')
+        self.assertEqual(
+            self.hrefs(n.output_css()), ['/mod/a@1.0.0/a.css'])
+
+
+loader = unittest.TestLoader()
+suite = unittest.TestSuite([
+    loader.loadTestsFromTestCase(TestAnalysisCache),
+    loader.loadTestsFromTestCase(TestOutputCache),
+    loader.loadTestsFromTestCase(TestFileCache),
+    loader.loadTestsFromTestCase(TestSrc),
+    loader.loadTestsFromTestCase(TestResolveMany),
+    loader.loadTestsFromTestCase(TestStreaming),
+    loader.loadTestsFromTestCase(TestIncrementalAnalysis),
+    loader.loadTestsFromTestCase(TestLRUCache),
+    loader.loadTestsFromTestCase(TestInstrument),
+    loader.loadTestsFromTestCase(TestEngine),
+    loader.loadTestsFromTestCase(TestPreload),
+    loader.loadTestsFromTestCase(TestDefer),
+    loader.loadTestsFromTestCase(TestCss)
+])
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+import json
+import os
+
+from env import ABSPATH
+from neuronjs import Neuron
+from neuronjs.planner import ComboPlanner
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    content = open(filename).read()
+    return json.loads(content)
+
+dependency_tree = read_json('dependency.json')
+
+
+def resolve(module_ids):
+    if type(module_ids) is not list:
+        return '/mod/' + module_ids
+
+    return '/concat/' + ','.join(module_ids)
+
+
+def render(facades, **options):
+    n = Neuron(
+        dependency_tree=dependency_tree,
+        resolve=resolve,
+        **options)
+    for facade in facades:
+        n.facade(facade)
+    return n.output_scripts()
+
+
+class TestComboPlanner(unittest.TestCase):
+    def test_plan(self):
+        planner = ComboPlanner()
+        planner.record(('home',), {
+            'home': set([('*', '')]),
+            'b': set([('1.0.0', '')]),
+            'c': set([('1.0.0', ''), ('2.0.0', '')])
+        })
+        planner.record(('home2',), {
+            'home2': set([('*', '/a.js')]),
+            'b': set([('1.0.0', '')]),
+            'c': set([('1.0.0', ''), ('2.0.0', '')])
+        })
+
+        self.assertEqual(planner.combos(), [
+            ['b@1.0.0', 'c@1.0.0', 'c@2.0.0']
+        ])
+
+    def test_neuron(self):
+        planner = ComboPlanner()
+        render(['home'], planner=planner)
+        render(['home2'], planner=planner)
+        self.assertEqual(planner.combos(), [
+            ['b@1.0.0', 'c@1.0.0', 'c@2.0.0']
+        ])
+
+        output = render(['home'], planner=planner)
+        self.assertTrue(
+            '/concat/b@1.0.0/b.js,c@1.0.0/c.js,c@2.0.0/c.js' in output)
+        self.assertEqual(output.count('<script'), 3)
+
+        # manual combos take precedence
+        n = Neuron(dependency_tree=dependency_tree, resolve=resolve,
+                   planner=planner)
+        n.facade('home')
+        n.combo('home', 'b')
+        self.assertTrue(
+            '/concat/home@*/home.js,b@1.0.0/b.js' in n.output_scripts())
+
+        # no combos in debug mode
+        output = render(['home'], planner=planner, debug=True)
+        self.assertEqual(output.count('<script'), 1)
+
+    def test_resolver(self):
+        # the default resolver could not resolve combos
+        self.assertRaises(
+            ValueError, Neuron,
+            dependency_tree=dependency_tree, planner=ComboPlanner())
+
+        n = Neuron(
+            dependency_tree=dependency_tree,
+            resolve_many=lambda ids: [resolve(id) for id in ids],
+            planner=ComboPlanner())
+        n.facade('home')
+        self.assertTrue('/concat/' in n.output_scripts())
+
+    def test_export(self):
+        planner = ComboPlanner()
+        render(['home'], planner=planner)
+        render(['home2'], planner=planner)
+
+        data = json.loads(json.dumps(planner.export()))
+        fixed = ComboPlanner.load(data)
+        self.assertEqual(fixed.combos(), planner.combos())
+        self.assertEqual(fixed.key, planner.key)
+
+        # A fixed plan never changes
+        render(['a'], planner=fixed)
+        self.assertEqual(fixed.combos(), planner.combos())
+
+        self.assertEqual(
+            render(['home'], planner=fixed),
+            render(['home'], planner=planner))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestComboPlanner)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+import json
+import os
+import shutil
+import tempfile
+
+from env import ABSPATH
+from neuronjs import Neuron
+from neuronjs.__main__ import main
+from neuronjs.precompile import precompile, load_manifest, import_function
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    content = open(filename).read()
+    return json.loads(content)
+
+dependency_tree = read_json('dependency.json')
+
+
+def resolve(module_ids):
+    if type(module_ids) is not list:
+        return '/mod/' + module_ids
+
+    return '/concat/' + ','.join(module_ids)
+
+
+PAGES = [
+    {
+        'facades': ['home'],
+        'combos': [['b', 'c']],
+        'css': ['a/a.css', ['b/b.css', 'c/c.css']]
+    },
+    {
+        'facades': ['b'],
+        'defer': ['d']
+    }
+]
+
+
+def register(n, page):
+    for module_id in page.get('facades', []):
+        n.facade(module_id)
+    for module_id in page.get('defer', []):
+        n.facade(module_id, defer=True)
+    for combo in page.get('combos', []):
+        n.combo(*combo)
+    for css in page.get('css', []):
+        n.css(*(css if isinstance(css, list) else [css]))
+    return n
+
+
+def render(n):
+    return [n.output_scripts(), n.output_config(), n.output_css()]
+
+
+class TestPrecompile(unittest.TestCase):
+    def setUp(self):
+        self.manifest = precompile(dependency_tree, PAGES, resolve=resolve)
+
+    def create(self, page, manifest=True):
+        return register(Neuron(
+            dependency_tree=dependency_tree,
+            resolve=resolve,
+            analysis_cache=False,
+            manifest=self.manifest if manifest else None), page)
+
+    def test_manifest(self):
+        self.assertEqual(len(self.manifest['pages']), 2)
+        self.assertEqual(self.manifest['tree_version'], 1)
+
+        for page in PAGES:
+            n = self.create(page)
+            self.assertEqual(
+                render(n), render(self.create(page, manifest=False)))
+
+            # never analyzed
+            self.assertTrue(n._walker is None)
+
+    def test_miss(self):
+        n = self.create({'facades': ['home', 'a']})
+        n.output_scripts()
+        self.assertTrue(n._prerendered is None)
+        self.assertFalse(n._walker is None)
+
+    def test_late_facade(self):
+        n = self.create(PAGES[1])
+        n.output_scripts()
+        n.facade('a')
+        n.css('a/a.css')
+
+        expected = self.create(PAGES[1], manifest=False)
+        expected.output_scripts()
+        expected.facade('a')
+        expected.css('a/a.css')
+
+        self.assertEqual(
+            n.output_scripts(), '<script async src="/mod/a@*/a.js"></script>')
+        expected.output_scripts()
+
+        self.assertEqual(render(n), render(expected))
+        self.assertEqual(render(n)[0], '')
+
+    def test_css_changed(self):
+        n = self.create(PAGES[0])
+        n.output_scripts()
+        n.css('d/d.css')
+        self.assertTrue('/mod/d@*/d.css' in n.output_css())
+
+    def test_preload(self):
+        n = self.create(PAGES[0])
+        expected = self.create(PAGES[0], manifest=False)
+        self.assertEqual(n.preload_header(), expected.preload_header())
+
+    def test_cli(self):
+        directory = tempfile.mkdtemp()
+        try:
+            tree = os.path.join(directory, 'tree.json')
+            pages = os.path.join(directory, 'pages.json')
+            output = os.path.join(directory, 'manifest.json')
+            with open(tree, 'w') as f:
+                json.dump(dependency_tree, f)
+            with open(pages, 'w') as f:
+                json.dump(PAGES, f)
+
+            self.assertEqual(main([
+                'precompile', '--tree', tree, '--pages', pages,
+                '--output', output, '--resolve', '__main__:resolve',
+                '--js-config', '{"path": "\'/mod\'"}'
+            ]), 0)
+
+            manifest = load_manifest(output)
+            n = register(Neuron(
+                dependency_tree=dependency_tree,
+                resolve=resolve,
+                js_config={'path': "'/mod'"},
+                manifest=manifest), PAGES[0])
+            n.analyze()
+            self.assertFalse(n._prerendered is None)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_import_function(self):
+        self.assertTrue(import_function('json:dumps') is json.dumps)
+        self.assertRaises(ValueError, import_function, 'json.dumps')
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestPrecompile)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
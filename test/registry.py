@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+
+
+import unittest
+import re
+import sys
+import copy
+import json
+import os
+
+from env import ABSPATH
+from neuronjs import Neuron
+from neuronjs.tree import CompiledTree
+from neuronjs.registry import TreeRegistry
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    return json.loads(open(filename).read())
+
+
+def output(tree, *facades):
+    n = Neuron(dependency_tree=tree)
+    for facade in facades:
+        n.facade(facade)
+    scripts = n.output_scripts()
+    config = n.output_config()
+    return (
+        sorted(re.findall(r'src="([^"]+)"', scripts)),
+        sorted(json.loads(re.search(r'loaded:(\[.*?\])', config).group(1)))
+    )
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.v1 = read_json('dependency.json')
+        self.v2 = copy.deepcopy(self.v1)
+        self.v2['_version'] = 2
+        # d changes, and c@1.0.0 is removed
+        self.v2['d']['2.4.0'] = self.v2['d'].pop('2.3.0')
+        self.v2['c'].pop('1.0.0')
+        self.v2['home']['*']['dependencies']['c@*'] = '2.0.0'
+
+    def test_versions(self):
+        registry = TreeRegistry(max_versions=2)
+        compiled = registry.add(self.v1)
+        self.assertTrue(registry.add(self.v1) is compiled)
+        registry.add(self.v2, current=False)
+
+        self.assertEqual(registry.current, 1)
+        self.assertTrue(registry.get() is compiled)
+        self.assertTrue(registry.get(3) is compiled)
+        self.assertEqual(registry.get(2).version, 2)
+
+        # the current version is never removed
+        v3 = dict(self.v2, _version=3)
+        registry.add(v3, current=False)
+        self.assertEqual(registry.versions(), [1, 3])
+
+        registry.use(3)
+        self.assertRaises(ValueError, registry.remove, 3)
+        registry.remove(1)
+        self.assertFalse(1 in registry)
+        self.assertRaises(KeyError, registry.use, 1)
+        self.assertRaises(ValueError, registry.add, {'a': {}})
+
+    def test_sharing(self):
+        base = CompiledTree(self.v1).precompute()
+        compiled = CompiledTree(self.v2, base=base).precompute()
+
+        b = base.node('b', '1.0.0')
+        self.assertEqual(compiled.node('b', '1.0.0'), b)
+        self.assertTrue(compiled.edges[b] is base.edges[b])
+        self.assertTrue(compiled._walks[b] is base._walks[b])
+        self.assertTrue(compiled.packages['b'] is base.packages['b'])
+
+        home = base.node('home', '*')
+        self.assertTrue(compiled.edges[home] is not base.edges[home])
+        self.assertTrue(compiled._walks[home] is not base._walks[home])
+
+        self.assertEqual(compiled.node('d', '2.3.0'), None)
+
+        # still depended by home2
+        c = compiled.node('c', '1.0.0')
+        self.assertFalse(compiled.is_defined(c))
+        self.assertEqual(compiled.packages['c'], ['2.0.0'])
+        self.assertEqual(compiled.resolve_range('d', '*'), '2.4.0')
+
+    def test_deploys(self):
+        def create(version):
+            tree = {'_version': version}
+            for i in range(50):
+                dependencies = {}
+                if i:
+                    dependencies['p%d@*' % (i - 1)] = '1.0.%d' % version
+                tree['p%d' % i] = {
+                    '1.0.%d' % version: {'dependencies': dependencies}
+                }
+            return tree
+
+        registry = TreeRegistry(max_versions=2)
+        for version in range(200):
+            # every other deploy keeps p0@1.0.0
+            tree = create(version)
+            if version % 2:
+                tree['p0'] = {'1.0.0': {}}
+                tree['p1']['1.0.%d' % version]['dependencies'] = {
+                    'p0@*': '1.0.0'
+                }
+            compiled = registry.add(tree)
+
+        # the removed packages of the previous versions are never kept
+        self.assertEqual(len(registry), 2)
+        self.assertEqual(len(compiled), 50)
+        self.assertEqual(sorted(compiled.index.values()), list(range(50)))
+        self.assertEqual(
+            output(compiled, 'p49'), output(CompiledTree(tree), 'p49'))
+
+    def test_output(self):
+        registry = TreeRegistry()
+        registry.add(self.v1)
+        derived = registry.add(self.v2)
+
+        for facades in (['home'], ['home', 'd'], ['b', 'a'], ['d@2.3.0']):
+            self.assertEqual(
+                output(derived, *facades),
+                output(CompiledTree(self.v2), *facades))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestRegistry)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
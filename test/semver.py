@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+
+from env import ABSPATH
+import neuronjs.semver as semver
+import neuronjs.module as module
+
+
+VERSIONS = [
+    '0.0.3', '0.0.4', '0.1.0', '0.2.5', '0.3.0',
+    '1.0.0', '1.2.3', '1.2.9', '1.3.0-beta.1', '1.3.0', '1.10.1',
+    '2.0.0-alpha', '2.0.0-beta.2', '2.0.0-beta.11', '2.0.0', '2.4.1',
+    '3.0.0-rc.1'
+]
+
+
+class TestSemver(unittest.TestCase):
+    def setUp(self):
+        self.index = semver.VersionIndex(VERSIONS)
+
+    def assertMax(self, range_, expected):
+        self.assertEqual(self.index.max_satisfying(range_), expected,
+                         range_)
+        self.assertEqual(module.max_satisfying(range_, VERSIONS), expected)
+
+    def test_parse_version(self):
+        self.assertTrue(
+            semver.parse_version('1.0.0-alpha')
+            < semver.parse_version('1.0.0-alpha.1')
+            < semver.parse_version('1.0.0-alpha.beta')
+            < semver.parse_version('1.0.0-beta.2')
+            < semver.parse_version('1.0.0-beta.11')
+            < semver.parse_version('1.0.0')
+            < semver.parse_version('1.0.1')
+        )
+        self.assertEqual(semver.parse_version('*'), None)
+
+    def test_exact(self):
+        self.assertMax('1.2.3', '1.2.3')
+        self.assertMax('=1.2.3', '1.2.3')
+        self.assertMax('v1.2.3', '1.2.3')
+        self.assertMax('1.2.4', None)
+
+    def test_any(self):
+        self.assertMax('*', '2.4.1')
+        self.assertMax('', '2.4.1')
+        self.assertMax('x', '2.4.1')
+
+    def test_x_range(self):
+        self.assertMax('1', '1.10.1')
+        self.assertMax('1.x', '1.10.1')
+        self.assertMax('1.2.x', '1.2.9')
+        self.assertMax('1.2', '1.2.9')
+        self.assertMax('1.2.*', '1.2.9')
+
+    def test_tilde(self):
+        self.assertMax('~1.2.3', '1.2.9')
+        self.assertMax('~1.2', '1.2.9')
+        self.assertMax('~1', '1.10.1')
+        self.assertMax('~0.2.0', '0.2.5')
+
+    def test_caret(self):
+        self.assertMax('^1.2.3', '1.10.1')
+        self.assertMax('^0.2.3', '0.2.5')
+        self.assertMax('^0.0.3', '0.0.3')
+        self.assertMax('^0.0', '0.0.4')
+        self.assertMax('^0.x', '0.3.0')
+        self.assertMax('^2.0.0-alpha', '2.4.1')
+
+    def test_comparators(self):
+        self.assertMax('>=1.0.0 <2.0.0', '1.10.1')
+        self.assertMax('>= 1.0.0 < 2', '1.10.1')
+        self.assertMax('<1.2.3', '1.0.0')
+        self.assertMax('<=1.2.3', '1.2.3')
+        self.assertMax('>2.4.1', None)
+        self.assertMax('<=1.2', '1.2.9')
+        self.assertMax('>1', '2.4.1')
+        self.assertMax('>=2.5.0 <1.0.0', None)
+
+    def test_hyphen(self):
+        self.assertMax('1.0.0 - 1.2.3', '1.2.3')
+        self.assertMax('1.0.0 - 1.3', '1.3.0')
+        self.assertMax('0.1 - 1', '1.10.1')
+
+    def test_or(self):
+        self.assertMax('0.1.x || 1.2.x', '1.2.9')
+        self.assertMax('^3.0.0 || ~1.2.0', '1.2.9')
+        self.assertMax('>=5 || <0.0.4', '0.0.3')
+
+    def test_prerelease(self):
+        self.assertMax('>=2.0.0-beta.2 <2.0.0', '2.0.0-beta.11')
+        self.assertMax('~2.0.0-alpha', '2.0.0')
+        self.assertMax('>1.2.9 <1.3.0', None)
+        self.assertMax('>=1.3.0-beta.1 <1.3.0', '1.3.0-beta.1')
+        self.assertMax('^3.0.0-rc.1', '3.0.0-rc.1')
+        self.assertMax('3.0.0-rc.1', '3.0.0-rc.1')
+        self.assertMax('>=2.4.1', '2.4.1')
+
+    def test_non_semver(self):
+        index = semver.VersionIndex(['*', 'latest'])
+        self.assertEqual(index.max_satisfying('*'), '*')
+        self.assertEqual(index.max_satisfying('1.0.0'), None)
+        self.assertEqual(self.index.max_satisfying('latest'), None)
+        self.assertEqual(self.index.max_satisfying('>=a'), None)
+
+    def test_satisfies(self):
+        self.assertTrue(semver.satisfies('1.2.3', '^1.0.0'))
+        self.assertFalse(semver.satisfies('2.0.0', '^1.0.0'))
+        self.assertFalse(semver.satisfies('1.3.0-beta.1', '^1.0.0'))
+        self.assertFalse(semver.satisfies('*', '*'))
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestSemver)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+
+import unittest
+import sys
+import json
+import os
+
+from env import ABSPATH
+from neuronjs.tree import CompiledTree, compile_tree
+from neuronjs.walker import Walker
+
+
+def read_json(filename):
+    filename = os.path.join(os.path.dirname(__file__), 'fixtures', filename)
+    content = open(filename).read()
+    return json.loads(content)
+
+
+class TestCompiledTree(unittest.TestCase):
+    def setUp(self):
+        self.tree = read_json('dependency.json')
+
+    def test_shared(self):
+        compiled = compile_tree(self.tree)
+        self.assertTrue(compile_tree(self.tree) is compiled)
+        self.assertTrue(compile_tree(compiled) is compiled)
+        self.assertTrue(Walker(self.tree)._compiled is compiled)
+        self.assertFalse(compile_tree(read_json('dependency.json')) is compiled)
+
+    def test_nodes(self):
+        compiled = CompiledTree(self.tree)
+        self.assertEqual(compiled.version, 1)
+        self.assertEqual(sorted(compiled.packages['c']), ['1.0.0', '2.0.0'])
+        self.assertTrue(compiled.node('c', '1.0.0') is not None)
+        self.assertTrue(compiled.node('c', '3.0.0') is None)
+        self.assertTrue('_version' not in compiled.packages)
+
+    def test_descendants(self):
+        compiled = CompiledTree(self.tree)
+        home = compiled.node('home', '*')
+        descendants = set([
+            (compiled.names[n], compiled.versions[n])
+            for n in compiled.descendants(home)
+        ])
+        self.assertEqual(descendants, set([
+            ('b', '1.0.0'), ('c', '1.0.0'), ('c', '2.0.0')
+        ]))
+        self.assertEqual(compiled.walk_order(home)[0], home)
+
+    def test_cyclic(self):
+        compiled = CompiledTree({
+            'a': {'*': {'dependencies': {'b@*': '*'}}},
+            'b': {'*': {'dependencies': {'a@*': '*'}}}
+        })
+        a = compiled.node('a', '*')
+        self.assertTrue(a in compiled.descendants(a))
+        self.assertEqual(len(compiled.walk_order(a)), 2)
+
+    def test_missing_dependency(self):
+        compiled = CompiledTree({
+            'a': {'*': {'dependencies': {'b@*': '1.0.0'}}}
+        })
+        self.assertTrue(compiled.node('b', '1.0.0') is not None)
+        self.assertTrue('b' not in compiled.packages)
+
+
+suite = unittest.TestLoader().loadTestsFromTestCase(TestCompiledTree)
+runner = unittest.TextTestRunner(verbosity=2).run(suite)
+
+exit_code = 0 if runner.wasSuccessful() else 1
+sys.exit(exit_code)
@@ -46,6 +46,77 @@ class TestWalker(unittest.TestCase):
         self.assertEqual(packages.get('b'), packages2.get('b'))
         self.assertEqual(packages.get('c'), packages2.get('c'))
 
+    def test_resolve_range(self):
+        packages, graph = get_result(['c', 'c@^1.0.0', 'c@~3.0.0'])
+        self.assertEqual(packages.get('c'), set([
+                ('2.0.0', ''), ('1.0.0', ''), ('~3.0.0', '')
+            ]))
+        self.assertEqual(graph['_'], {
+                'c@*': 0,
+                'c@^1.0.0': 1,
+                'c@~3.0.0': 2
+            })
+
+    def test_deep_dependencies(self):
+        depth = sys.getrecursionlimit() * 2
+        tree = {}
+        for i in range(depth):
+            tree['p%s' % i] = {
+                '1.0.0': {'dependencies': {'p%s@*' % (i + 1): '1.0.0'}}
+            }
+
+        walker = Walker(tree)
+        packages, graph = walker.look_up(['p0'])
+        self.assertEqual(len(packages), depth + 1)
+        self.assertEqual(walker.stats, {
+                'nodes': depth + 1,
+                'max_depth': depth
+            })
+
+    def test_stats(self):
+        walker = Walker(read_json('dependency.json'))
+        walker.look_up(['home', 'home2', 'a'])
+        self.assertEqual(walker.stats, {
+                'nodes': 6,
+                'max_depth': 2
+            })
+        self.assertEqual(walker.cycles, [])
+
+    def test_cycles(self):
+        walker = Walker({
+            'a': {'1.0.0': {'dependencies': {'b@*': '1.0.0'}}},
+            'b': {'1.0.0': {'dependencies': {'c@*': '1.0.0'}}},
+            'c': {'1.0.0': {'dependencies': {'a@^1.0.0': '1.0.0'}}}
+        })
+        packages, graph = walker.look_up(['a', 'b'])
+        self.assertEqual(walker.cycles, [('c@1.0.0', 'a@1.0.0')])
+        self.assertEqual(graph[2], ['1.0.0', {'a@^1.0.0': 0}])
+        self.assertEqual(walker.stats['nodes'], 3)
+
+    def test_extend(self):
+        walker = Walker(read_json('dependency.json'))
+        walker.look_up(['b'])
+        added = walker.extend(['home'])
+        added.sort()
+        self.assertEqual(added, [
+                ('c', '1.0.0', ''),
+                ('home', '*', '')
+            ])
+
+        packages, graph = get_result(['b', 'home'])
+        self.assertEqual(walker.selected, packages)
+        self.assertEqual(walker.graph, graph)
+
+    def test_graph(self):
+        packages, graph = get_result(['home'])
+        self.assertEqual(graph, {
+                '_': {'home@*': 0},
+                0: ['*', {'c@*': 1, 'b@*': 2}],
+                1: ['1.0.0'],
+                2: ['1.0.0', {'c@*': 3}],
+                3: ['2.0.0']
+            })
+
     def test_multiple_entries(self):
         packages, graph = get_result(['home/a.js', 'home/b.js'])
         self.assertEqual(len(packages.get('home')), 2)